@@ -0,0 +1,107 @@
+"""
+Fixed-capacity columnar ring buffer for API access logs.
+
+Each request becomes one row across a few NumPy columns, so appends are O(1)
+and window statistics are vectorized instead of walking a list of dicts.
+"""
+
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+# Routes past the limit share one id so the intern table stays bounded
+OVERFLOW_ROUTE = "OTHER"
+
+
+class AccessLogWindow(NamedTuple):
+    """Column slices for the rows in a time window, oldest first"""
+    timestamps: np.ndarray
+    latency: np.ndarray
+    status: np.ndarray
+    route_ids: np.ndarray
+
+
+class AccessLogBuffer:
+    """Ring buffer of access log rows with interned route ids
+
+    Timestamps are kept non-decreasing (a row that completes slightly earlier
+    than the previous one takes its timestamp), so every window lookup is a
+    binary search on the two sorted halves of the ring.
+    """
+
+    def __init__(self, capacity: int, max_routes: int = 5000):
+        self.capacity = capacity
+        self.max_routes = max_routes
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.latency = np.zeros(capacity, dtype=np.float32)
+        self.status = np.zeros(capacity, dtype=np.int16)
+        self.route_ids = np.zeros(capacity, dtype=np.int32)
+        self.routes: List[str] = []
+        self._route_index: Dict[str, int] = {}
+        self._next = 0
+        self._size = 0
+        self._last_timestamp = 0.0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def intern_route(self, route: str) -> int:
+        route_id = self._route_index.get(route)
+        if route_id is None:
+            if len(self.routes) >= self.max_routes:
+                route = OVERFLOW_ROUTE
+                route_id = self._route_index.get(route)
+            if route_id is None:
+                route_id = len(self.routes)
+                self.routes.append(route)
+                self._route_index[route] = route_id
+        return route_id
+
+    def append(self, timestamp: float, route: str, status: int, latency: float) -> int:
+        """Add one row, overwriting the oldest once the buffer is full; returns the route id"""
+        timestamp = max(timestamp, self._last_timestamp)
+        self._last_timestamp = timestamp
+        i = self._next
+        self.timestamps[i] = timestamp
+        self.latency[i] = latency
+        self.status[i] = status
+        self.route_ids[i] = route_id = self.intern_route(route)
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        return route_id
+
+    def _segments(self):
+        """(start, stop) index ranges of the stored rows, oldest first"""
+        if self._size < self.capacity:
+            return [(0, self._size)]
+        return [(self._next, self.capacity), (0, self._next)]
+
+    def count_since(self, since: float) -> int:
+        """Rows with timestamp >= since, in O(log n)"""
+        return sum(
+            stop - (start + int(np.searchsorted(self.timestamps[start:stop], since)))
+            for start, stop in self._segments()
+        )
+
+    def window(self, since: float) -> AccessLogWindow:
+        """Rows with timestamp >= since; views when they are contiguous in the ring"""
+        ranges = []
+        for start, stop in self._segments():
+            first = start + int(np.searchsorted(self.timestamps[start:stop], since))
+            if first < stop:
+                ranges.append((first, stop))
+
+        def column(values: np.ndarray) -> np.ndarray:
+            if len(ranges) == 1:
+                return values[ranges[0][0]:ranges[0][1]]
+            return np.concatenate([values[start:stop] for start, stop in ranges] or [values[:0]])
+
+        return AccessLogWindow(
+            column(self.timestamps), column(self.latency), column(self.status),
+            column(self.route_ids)
+        )
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
+        self._last_timestamp = 0.0
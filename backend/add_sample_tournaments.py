@@ -6,18 +6,12 @@ Script to add sample tournaments to the ClutchZone database
 import os
 import sys
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from models import Tournament, Base
-from database import DATABASE_URL
-
-# Create database engine
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from database import engine, SessionLocal
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -4,36 +4,111 @@ Tracks all API calls, user interactions, Discord notifications, and server metri
 """
 
 import asyncio
-import json
 import logging
+import os
 import time
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from collections import defaultdict, Counter
-from fastapi import Request, Response
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from fastapi import Request
 from sqlalchemy.orm import Session
 import redis
 import aioredis
 from prometheus_client import Counter as PrometheusCounter, Histogram, Gauge, generate_latest
-import psutil
+import numpy as np
 import platform
 
-# Prometheus metrics
+from auth import decode_token
+from log_streams import LogStream
+from loop_monitor import loop_monitor
+from profiler import track_request
+from request_sampling import RequestTrace, trace_request, keep_reason, SLOW_REQUEST_STORE_SIZE
+from sql_instrumentation import current_query_stats
+from unique_counter import UniqueUserCounter
+from resource_sampler import resource_sampler
+from metric_buckets import COUNT, ERRORS, LATENCY_SUM, HISTOGRAM, COLUMNS, histogram_percentile, route_summary
+from stats_backend import InProcessStatsBackend, RedisStatsBackend, SESSION_TTL_SECONDS, user_window_minutes
+
+# Latency buckets (seconds) for the per-route histograms, placed around the API SLOs:
+# interactive reads under 100ms, p95 under 250ms, nothing over 1s
+API_LATENCY_BUCKETS = tuple(
+    float(bound) for bound in os.getenv("ANALYTICS_LATENCY_BUCKETS", "0.025,0.05,0.1,0.25,0.5,1,2.5").split(",")
+)
+# Route label values beyond this many (method, route) pairs are reported as "other"
+ANALYTICS_MAX_ROUTE_LABELS = int(os.getenv("ANALYTICS_MAX_ROUTE_LABELS", "300"))
+
+# Prometheus metrics; `endpoint` is the matched route template, never the raw path
 API_REQUESTS = PrometheusCounter('api_requests_total', 'Total API requests', ['method', 'endpoint', 'status'])
-API_LATENCY = Histogram('api_request_duration_seconds', 'API request latency')
-ACTIVE_USERS = Gauge('active_users', 'Currently active users')
+API_LATENCY = Histogram(
+    'api_request_duration_seconds', 'API request latency per route', ['method', 'endpoint'],
+    buckets=API_LATENCY_BUCKETS
+)
+API_LABEL_OVERFLOW = PrometheusCounter(
+    'api_route_label_overflow_total', 'Requests reported under endpoint="other" by the route label limit'
+)
+ACTIVE_USERS = Gauge('active_users', 'Currently active users', multiprocess_mode='livemax')
 DISCORD_NOTIFICATIONS = PrometheusCounter('discord_notifications_total', 'Discord notifications sent', ['type'])
-SERVER_RESOURCES = Gauge('server_resources', 'Server resource usage', ['resource'])
+ANALYTICS_QUEUE_DEPTH = Gauge(
+    'analytics_queue_depth', 'Access log records waiting to be written', multiprocess_mode='livesum'
+)
+ANALYTICS_DROPPED = PrometheusCounter('analytics_records_dropped_total', 'Access log records dropped because the queue was full')
+ANALYTICS_FLUSH = Histogram(
+    'analytics_flush_seconds', 'Time to write one batch of access log records',
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+
+# Access log writer configuration
+ANALYTICS_QUEUE_SIZE = int(os.getenv("ANALYTICS_QUEUE_SIZE", "10000"))
+ANALYTICS_FLUSH_INTERVAL_MS = int(os.getenv("ANALYTICS_FLUSH_INTERVAL_MS", "250"))
+ANALYTICS_FLUSH_BATCH_SIZE = int(os.getenv("ANALYTICS_FLUSH_BATCH_SIZE", "500"))
+
+# Rows kept for in-memory stats (~18 bytes each)
+ANALYTICS_BUFFER_CAPACITY = int(os.getenv("ANALYTICS_BUFFER_CAPACITY", "1000000"))
+# Full log records: approximate caps of the Redis streams, and what is kept in memory without Redis
+ANALYTICS_API_STREAM_MAXLEN = int(os.getenv("ANALYTICS_API_STREAM_MAXLEN", "1000000"))
+ANALYTICS_DISCORD_STREAM_MAXLEN = int(os.getenv("ANALYTICS_DISCORD_STREAM_MAXLEN", "100000"))
+ANALYTICS_RECENT_LOGS = int(os.getenv("ANALYTICS_RECENT_LOGS", "1000"))
+# Per-minute route metrics are rolled up and kept this long for the analytics views
+ANALYTICS_ROLLUP_HOURS = int(os.getenv("ANALYTICS_ROLLUP_HOURS", "168"))
+
+# Request headers copied into access logs; credentials are never logged even if listed
+ANALYTICS_HEADER_ALLOWLIST = frozenset(
+    header.strip().lower()
+    for header in os.getenv("ANALYTICS_HEADER_ALLOWLIST", "user-agent,referer,content-type,accept-language").split(",")
+    if header.strip()
+) - {"authorization", "proxy-authorization", "cookie", "x-api-key"}
 
 logger = logging.getLogger(__name__)
 
+_HTTP_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+# Queued by close(): the writer flushes everything ahead of it, then exits
+_STOP_WRITER = object()
+_route_labels = set()
+
+
+def route_metric_labels(method: str, route: str):
+    """(method, endpoint) label values, bounded by ANALYTICS_MAX_ROUTE_LABELS"""
+    method = method if method in _HTTP_METHODS else "OTHER"
+    if (method, route) not in _route_labels:
+        if len(_route_labels) >= ANALYTICS_MAX_ROUTE_LABELS:
+            API_LABEL_OVERFLOW.inc()
+            return method, "other"
+        _route_labels.add((method, route))
+    return method, route
+
 class AnalyticsManager:
     def __init__(self, redis_url: str = "redis://localhost:6379"):
         self.redis_url = redis_url
         self.redis_client = None
-        self.access_logs = []
-        self.user_sessions = {}
-        self.api_stats = defaultdict(int)
+        self.api_log_stream = LogStream("analytics:api_logs", ANALYTICS_API_STREAM_MAXLEN, ANALYTICS_RECENT_LOGS)
+        self.discord_log_stream = LogStream(
+            "analytics:discord_logs", ANALYTICS_DISCORD_STREAM_MAXLEN, ANALYTICS_RECENT_LOGS
+        )
+        self.slow_request_stream = LogStream(
+            "analytics:slow_requests", SLOW_REQUEST_STORE_SIZE, SLOW_REQUEST_STORE_SIZE
+        )
+        # Replaced by the shared Redis backend once Redis is reachable
+        self.stats = InProcessStatsBackend(ANALYTICS_BUFFER_CAPACITY, ANALYTICS_ROLLUP_HOURS)
+        self.unique_users = UniqueUserCounter("analytics:users", ANALYTICS_ROLLUP_HOURS)
         self.real_time_metrics = {
             'online_users': 0,
             'active_tournaments': 0,
@@ -42,67 +117,187 @@ class AnalyticsManager:
             'discord_messages_sent': 0,
             'server_health': 'healthy'
         }
+        # Bounded hand-off between the request path and the batched writer
+        self.log_queue: asyncio.Queue = asyncio.Queue(maxsize=ANALYTICS_QUEUE_SIZE)
+        self.dropped_logs = 0
+        self._batch_ready = asyncio.Event()
+        self._writer_task = None
+        self._closing = False
         
     async def initialize(self):
         """Initialize Redis connection and start background tasks"""
+        # The writer also feeds the in-memory stats, so it runs with or without Redis
+        self._writer_task = asyncio.create_task(self._access_log_writer())
+        asyncio.create_task(self.cleanup_old_data())
+        resource_sampler.start()
+        loop_monitor.start()
         try:
             self.redis_client = await aioredis.from_url(self.redis_url, decode_responses=True)
             await self.redis_client.ping()
+            self.api_log_stream.bind(self.redis_client)
+            self.discord_log_stream.bind(self.redis_client)
+            self.slow_request_stream.bind(self.redis_client)
+            self.unique_users.bind(self.redis_client)
+            self.stats = RedisStatsBackend(self.redis_client, ANALYTICS_ROLLUP_HOURS)
             logger.info("Analytics Redis connection established")
             
             # Start background tasks
             asyncio.create_task(self.update_real_time_metrics())
-            asyncio.create_task(self.cleanup_old_data())
             
         except Exception as e:
             logger.error(f"Failed to initialize analytics Redis: {e}")
             # Fallback to in-memory storage
             self.redis_client = None
 
-    async def log_api_access(self, request: Request, response: Response, process_time: float):
-        """Log detailed API access information"""
-        timestamp = datetime.utcnow()
-        user_agent = request.headers.get("user-agent", "unknown")
-        ip_address = request.client.host if request.client else "unknown"
+    async def log_api_access(
+        self,
+        request: Request,
+        status_code: int,
+        process_time: float,
+        request_size: int = 0,
+        response_size: int = 0,
+        route: Optional[str] = None,
+        trace: Optional[RequestTrace] = None
+    ):
+        """Queue an access log record; the batched writer stores it off the request path
         
+        Every request is counted. Only sampled and slow requests (see
+        request_sampling) carry the full detail into the access log stream.
+        """
         # Extract user ID from JWT token if available
         user_id = await self._extract_user_id(request)
         
         access_log = {
-            'timestamp': timestamp.isoformat(),
+            'epoch': time.time(),
             'method': request.method,
-            'endpoint': str(request.url),
-            'path': request.url.path,
-            'status_code': response.status_code,
+            'route': route or 'unmatched',
+            'status_code': status_code,
             'process_time': process_time,
-            'ip_address': ip_address,
-            'user_agent': user_agent,
-            'user_id': user_id,
-            'request_size': len(await self._get_request_body(request)),
-            'response_size': self._get_response_size(response),
-            'query_params': dict(request.query_params),
-            'headers': dict(request.headers)
+            'user_id': user_id
         }
         
-        # Store in Redis with TTL
-        if self.redis_client:
-            key = f"api_log:{timestamp.timestamp()}"
-            await self.redis_client.setex(key, 86400 * 7, json.dumps(access_log))  # 7 days TTL
+        reason = keep_reason(process_time)
+        if reason:
+            access_log.update({
+                'timestamp': datetime.utcnow().isoformat(),
+                'kept': reason,
+                'endpoint': str(request.url),
+                'path': request.url.path,
+                'ip_address': request.client.host if request.client else "unknown",
+                'user_agent': request.headers.get("user-agent", "unknown"),
+                'request_size': request_size,
+                'response_size': response_size,
+                'query_params': dict(request.query_params),
+                'headers': {
+                    name: value for name, value in request.headers.items() if name in ANALYTICS_HEADER_ALLOWLIST
+                },
+                **(trace or RequestTrace()).detail(current_query_stats())
+            })
+        self.enqueue_access_log(access_log)
+    
+    def enqueue_access_log(self, access_log: Dict[str, Any]):
+        """Hand a record to the writer without waiting; drops it if the queue is full"""
+        try:
+            self.log_queue.put_nowait(access_log)
+        except asyncio.QueueFull:
+            self.dropped_logs += 1
+            ANALYTICS_DROPPED.inc()
+            return
+        if self.log_queue.qsize() >= ANALYTICS_FLUSH_BATCH_SIZE:
+            self._batch_ready.set()
+    
+    async def _access_log_writer(self):
+        """Background task: flush queued records every ANALYTICS_FLUSH_INTERVAL_MS or batch size"""
+        stopping = False
+        while not stopping:
+            access_log = await self.log_queue.get()
+            if access_log is _STOP_WRITER:
+                return
+            batch = [access_log]
+            if not self._closing:
+                try:
+                    await asyncio.wait_for(self._batch_ready.wait(), ANALYTICS_FLUSH_INTERVAL_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+                self._batch_ready.clear()
+            while len(batch) < ANALYTICS_FLUSH_BATCH_SIZE and not self.log_queue.empty():
+                access_log = self.log_queue.get_nowait()
+                if access_log is _STOP_WRITER:
+                    stopping = True
+                    break
+                batch.append(access_log)
+            ANALYTICS_QUEUE_DEPTH.set(self.log_queue.qsize())
+            
+            try:
+                with ANALYTICS_FLUSH.time():
+                    await self._write_access_logs(batch)
+            except Exception as e:
+                logger.error(f"Error writing {len(batch)} access logs: {e}")
+    
+    async def _write_access_logs(self, batch: List[Dict[str, Any]]):
+        """Store a batch of access logs in the stats backend, Prometheus and Redis
+        
+        Every record is counted; only the ones kept by sampling are stored in full.
+        """
+        rows, seen = self._record_metrics(batch)
+        await self.stats.record_requests(rows)
+        kept = [access_log for access_log in batch if access_log.get('kept')]
+        slow = [access_log for access_log in kept if access_log['kept'] == 'slow']
         
-        # Store in memory for immediate access
-        self.access_logs.append(access_log)
-        if len(self.access_logs) > 1000:  # Keep only last 1000 logs in memory
-            self.access_logs.pop(0)
+        # Full records and unique-user sketches go to Redis in one round trip per batch
+        if self.redis_client:
+            pipe = self.redis_client.pipeline(transaction=False)
+            self.api_log_stream.add_to_pipeline(pipe, kept)
+            self.slow_request_stream.add_to_pipeline(pipe, slow)
+            self.unique_users.add_to_pipeline(pipe, seen)
+            await pipe.execute()
+        else:
+            await self.api_log_stream.add(kept)
+            await self.slow_request_stream.add(slow)
         
-        # Update Prometheus metrics
-        API_REQUESTS.labels(method=request.method, endpoint=request.url.path, status=response.status_code).inc()
-        API_LATENCY.observe(process_time)
+        logger.debug(f"Wrote {len(batch)} API access logs")
+    
+    def _record_metrics(self, batch: List[Dict[str, Any]]):
+        """Update Prometheus and the local unique-user sketches
         
-        # Update API stats
-        endpoint_key = f"{request.method}:{request.url.path}"
-        self.api_stats[endpoint_key] += 1
+        Returns the batch as stats backend rows and its (epoch, user id) sightings.
+        """
+        rows = []
+        for access_log in batch:
+            route = access_log.get('route') or 'unmatched'
+            rows.append((
+                access_log['epoch'],
+                f"{access_log['method']}:{route}",
+                access_log['status_code'],
+                access_log['process_time'],
+                access_log['user_id']
+            ))
+            
+            # Update Prometheus metrics
+            method, endpoint = route_metric_labels(access_log['method'], route)
+            API_REQUESTS.labels(method=method, endpoint=endpoint, status=access_log['status_code']).inc()
+            API_LATENCY.labels(method=method, endpoint=endpoint).observe(access_log['process_time'])
         
-        logger.info(f"API Access: {request.method} {request.url.path} - {response.status_code} - {process_time:.3f}s - User: {user_id}")
+        seen = [(access_log['epoch'], access_log['user_id']) for access_log in batch if access_log['user_id']]
+        self.unique_users.add(seen)
+        return rows, seen
+    
+    async def close(self):
+        """Flush queued access logs and stop the writer, resource sampler and loop monitor"""
+        resource_sampler.stop()
+        loop_monitor.stop()
+        if self._writer_task and not self._writer_task.done():
+            # Let the writer finish the batch it holds rather than cancelling it mid-write
+            self._closing = True
+            await self.log_queue.put(_STOP_WRITER)
+            self._batch_ready.set()
+            await self._writer_task
+        # Records queued after the stop marker
+        batch = []
+        while not self.log_queue.empty():
+            batch.append(self.log_queue.get_nowait())
+        if batch:
+            await self._write_access_logs(batch)
         
     async def log_discord_activity(self, activity_type: str, data: Dict[str, Any]):
         """Log Discord webhook and bot activities"""
@@ -115,120 +310,126 @@ class AnalyticsManager:
             'success': data.get('success', False)
         }
         
-        if self.redis_client:
-            key = f"discord_log:{timestamp.timestamp()}"
-            await self.redis_client.setex(key, 86400 * 30, json.dumps(discord_log))  # 30 days TTL
+        await self.discord_log_stream.add([discord_log])
         
         # Update metrics
         DISCORD_NOTIFICATIONS.labels(type=activity_type).inc()
-        self.real_time_metrics['discord_messages_sent'] += 1
+        await self.stats.incr('counters', {'discord_messages_sent': 1})
         
         logger.info(f"Discord Activity: {activity_type} - {data}")
 
     async def track_user_session(self, user_id: str, action: str, data: Dict[str, Any] = None):
-        """Track user session activities"""
-        timestamp = datetime.utcnow()
-        
-        if user_id not in self.user_sessions:
-            self.user_sessions[user_id] = {
-                'first_seen': timestamp,
-                'last_activity': timestamp,
-                'actions': [],
-                'total_actions': 0
-            }
-        
-        session = self.user_sessions[user_id]
-        session['last_activity'] = timestamp
-        session['total_actions'] += 1
-        session['actions'].append({
-            'timestamp': timestamp.isoformat(),
+        """Track user session activities; sessions live in the stats backend, shared by all workers"""
+        now = time.time()
+        await self.unique_users.record([(now, user_id)])
+        await self.stats.record_session_action(user_id, {
+            'timestamp': datetime.utcfromtimestamp(now).isoformat(),
             'action': action,
             'data': data or {}
-        })
-        
-        # Keep only last 50 actions per user
-        if len(session['actions']) > 50:
-            session['actions'] = session['actions'][-50:]
-        
-        # Store in Redis
-        if self.redis_client:
-            key = f"user_session:{user_id}"
-            await self.redis_client.setex(key, 86400, json.dumps(session, default=str))  # 24 hours TTL
+        }, now)
+
+    async def get_user_session(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """A user's session with their last actions, None once it has expired"""
+        return await self.stats.user_session(user_id)
 
     async def get_real_time_stats(self) -> Dict[str, Any]:
         """Get current real-time statistics"""
-        # Update active users count
-        active_users = len([s for s in self.user_sessions.values() 
-                           if (datetime.utcnow() - s['last_activity']).seconds < 300])  # 5 minutes
+        # Update active users count: unique users seen in the last 5 minutes
+        active_users = await self.unique_users.count(300, time.time())
         
         ACTIVE_USERS.set(active_users)
         self.real_time_metrics['online_users'] = active_users
         
         # Calculate API calls per minute
-        current_time = time.time()
-        recent_logs = [log for log in self.access_logs 
-                      if current_time - datetime.fromisoformat(log['timestamp']).timestamp() < 60]
-        self.real_time_metrics['api_calls_per_minute'] = len(recent_logs)
+        self.real_time_metrics['api_calls_per_minute'] = await self.stats.calls_last_minute(time.time())
+        counters = await self.stats.counters('counters')
+        self.real_time_metrics['discord_messages_sent'] = counters.get('discord_messages_sent', 0)
         
         return self.real_time_metrics.copy()
 
     async def get_api_analytics(self, hours: int = 24) -> Dict[str, Any]:
-        """Get comprehensive API analytics"""
-        current_time = datetime.utcnow()
-        start_time = current_time - timedelta(hours=hours)
-        
-        # Filter logs by time period
-        filtered_logs = [log for log in self.access_logs 
-                        if datetime.fromisoformat(log['timestamp']) >= start_time]
-        
-        # Analyze data
-        total_requests = len(filtered_logs)
-        unique_users = len(set(log['user_id'] for log in filtered_logs if log['user_id']))
-        avg_response_time = sum(log['process_time'] for log in filtered_logs) / total_requests if total_requests > 0 else 0
+        """Get comprehensive API analytics
         
-        # Group by endpoint
-        endpoint_stats = Counter(f"{log['method']}:{log['path']}" for log in filtered_logs)
-        
-        # Group by status code
-        status_stats = Counter(log['status_code'] for log in filtered_logs)
-        
-        # Group by hour
-        hourly_stats = defaultdict(int)
-        for log in filtered_logs:
-            hour = datetime.fromisoformat(log['timestamp']).strftime('%Y-%m-%d %H:00')
-            hourly_stats[hour] += 1
+        Counts, latency and errors come from the stats backend's rolling buckets, so
+        the cost does not depend on traffic; windows are capped at ANALYTICS_ROLLUP_HOURS.
+        """
+        now = time.time()
+        merged = await self.stats.request_metrics(hours, now)
+        routes = merged['routes']
+        totals = sum(routes.values(), np.zeros(COLUMNS))
+        total_requests = int(totals[COUNT])
+        unique_users = await self.unique_users.count(hours * 3600, now)
+        top_routes = sorted(routes, key=lambda route: routes[route][COUNT], reverse=True)[:10]
+        top_users = await self.stats.top_users(hours, now)
+        user_minutes = user_window_minutes(hours, now, self.stats.retention_hours)
         
         return {
             'total_requests': total_requests,
             'unique_users': unique_users,
-            'average_response_time': avg_response_time,
-            'endpoint_stats': dict(endpoint_stats.most_common(10)),
-            'status_code_stats': dict(status_stats),
-            'hourly_stats': dict(hourly_stats),
-            'error_rate': status_stats.get(500, 0) / total_requests if total_requests > 0 else 0
+            'average_response_time': float(totals[LATENCY_SUM]) / total_requests if total_requests else 0,
+            'latency_percentiles': {
+                f'p{q}': histogram_percentile(totals[HISTOGRAM:], q) for q in (50, 95, 99)
+            },
+            'endpoint_stats': {route: int(routes[route][COUNT]) for route in top_routes},
+            'endpoint_details': {route: route_summary(routes[route]) for route in top_routes},
+            'status_code_stats': dict(sorted(merged['status_counts'].items())),
+            'hourly_stats': {
+                datetime.utcfromtimestamp(hour * 3600).strftime('%Y-%m-%d %H:00'): count
+                for hour, count in merged['hourly'].items()
+            },
+            'error_rate': float(totals[ERRORS]) / total_requests if total_requests else 0,
+            # Per-user figures cover the whole hours spanning the window
+            'top_users': [
+                {
+                    'user_id': user['user_id'],
+                    'requests': user['requests'],
+                    'requests_per_minute': user['requests'] / user_minutes,
+                    'error_rate': user['errors'] / user['requests'],
+                    'average_response_time': user['latency_sum'] / user['requests'],
+                    'endpoint_mix': dict(user['routes'].most_common(5))
+                }
+                for user in top_users
+            ]
         }
 
-    async def get_server_metrics(self) -> Dict[str, Any]:
-        """Get server performance metrics"""
-        cpu_percent = psutil.cpu_percent(interval=1)
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
-        
-        # Update Prometheus metrics
-        SERVER_RESOURCES.labels(resource='cpu_percent').set(cpu_percent)
-        SERVER_RESOURCES.labels(resource='memory_percent').set(memory.percent)
-        SERVER_RESOURCES.labels(resource='disk_percent').set(disk.percent)
+    async def get_slow_requests(
+        self,
+        limit: int = 50,
+        minutes: int = 60,
+        route: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Slowest requests of the last `minutes` from the bounded slow-request store"""
+        entries = await self.slow_request_stream.range(
+            start=time.time() - minutes * 60, count=SLOW_REQUEST_STORE_SIZE, newest_first=True
+        )
+        if route:
+            entries = [entry for entry in entries if entry['route'] == route]
+        return sorted(entries, key=lambda entry: entry['process_time'], reverse=True)[:limit]
+
+    async def get_server_metrics(self, include_history: bool = False) -> Dict[str, Any]:
+        """Get server performance metrics from the background sampler's latest snapshot"""
+        sample = resource_sampler.snapshot()
         
-        return {
-            'cpu_percent': cpu_percent,
-            'memory_percent': memory.percent,
-            'memory_available_gb': memory.available / (1024**3),
-            'disk_percent': disk.percent,
-            'disk_free_gb': disk.free / (1024**3),
+        metrics = {
+            'cpu_percent': sample['cpu_percent'],
+            'process_cpu_percent': sample['process_cpu_percent'],
+            'memory_percent': sample['memory_percent'],
+            'memory_available_gb': sample['memory_available_gb'],
+            'disk_percent': sample['disk_percent'],
+            'disk_free_gb': sample['disk_free_gb'],
+            'open_fds': sample['open_fds'],
+            'threads': sample['threads'],
+            'process_rss_mb': sample['process_rss_mb'],
+            'processes': sample['processes'],
+            'sampled_at': datetime.utcfromtimestamp(sample['timestamp']).isoformat(),
             'platform': platform.system(),
             'python_version': platform.python_version(),
-            'uptime_seconds': time.time() - psutil.boot_time()
+            'uptime_seconds': time.time() - resource_sampler.boot_time,
+            'event_loop': loop_monitor.snapshot()
         }
+        if include_history:
+            metrics['history'] = resource_sampler.history()
+        return metrics
 
     async def update_real_time_metrics(self):
         """Background task to update real-time metrics"""
@@ -245,19 +446,9 @@ class AnalyticsManager:
         """Background task to clean up old data"""
         while True:
             try:
-                # Clean up old access logs from memory
-                cutoff_time = datetime.utcnow() - timedelta(hours=24)
-                self.access_logs = [log for log in self.access_logs 
-                                   if datetime.fromisoformat(log['timestamp']) > cutoff_time]
-                
                 # Clean up old user sessions
-                active_cutoff = datetime.utcnow() - timedelta(hours=24)
-                inactive_users = [user_id for user_id, session in self.user_sessions.items()
-                                 if session['last_activity'] < active_cutoff]
-                for user_id in inactive_users:
-                    del self.user_sessions[user_id]
-                
-                logger.info(f"Cleaned up {len(inactive_users)} inactive user sessions")
+                expired = await self.stats.expire_sessions(time.time() - SESSION_TTL_SECONDS)
+                logger.info(f"Cleaned up {expired} inactive user sessions")
                 await asyncio.sleep(3600)  # Run every hour
                 
             except Exception as e:
@@ -265,44 +456,68 @@ class AnalyticsManager:
                 await asyncio.sleep(3600)
 
     async def _extract_user_id(self, request: Request) -> Optional[str]:
-        """Extract user ID from JWT token"""
+        """Extract user ID from the bearer token
+        
+        Goes through the auth module's decode cache, so a request the auth
+        dependency has already verified costs a hash and a dict lookup.
+        """
         try:
             auth_header = request.headers.get("authorization")
             if auth_header and auth_header.startswith("Bearer "):
-                # This would normally decode the JWT token
-                # For now, return a placeholder
-                return "user_from_token"
+                user_id = decode_token(auth_header[7:]).get("user_id")
+                return str(user_id) if user_id is not None else None
             return None
         except Exception:
             return None
 
-    async def _get_request_body(self, request: Request) -> bytes:
-        """Get request body size"""
-        try:
-            return await request.body()
-        except Exception:
-            return b""
-
-    def _get_response_size(self, response: Response) -> int:
-        """Get response body size"""
-        try:
-            if hasattr(response, 'body'):
-                return len(response.body)
-            return 0
-        except Exception:
-            return 0
-
 # Global analytics manager instance
 analytics_manager = AnalyticsManager()
 
-# Middleware function
-async def analytics_middleware(request: Request, call_next):
-    """FastAPI middleware to track all API calls"""
-    start_time = time.time()
-    
-    response = await call_next(request)
-    
-    process_time = time.time() - start_time
-    await analytics_manager.log_api_access(request, response, process_time)
-    
-    return response
+class AnalyticsMiddleware:
+    """ASGI middleware that times each HTTP request and counts body bytes as they stream
+
+    Bodies are never buffered: the request size comes from Content-Length
+    (or the chunks the app actually read) and the response size from the
+    chunks sent, so uploads and streaming responses cost no extra memory.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.time()
+        status_code = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status_code, response_bytes
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            with trace_request() as trace, track_request(scope):
+                await self.app(scope, counting_receive, counting_send)
+        finally:
+            request = Request(scope)
+            content_length = request.headers.get("content-length", "")
+            request_size = int(content_length) if content_length.isdigit() else request_bytes
+            # Routing stores the matched route in the scope; label by its template
+            route = getattr(scope.get("route"), "path", None)
+            await analytics_manager.log_api_access(
+                request, status_code, time.time() - start_time, request_size, response_bytes, route, trace
+            )
@@ -0,0 +1,293 @@
+"""
+Durable historical analytics.
+
+The stats backends keep per-minute metrics for ANALYTICS_ROLLUP_HOURS (in
+memory, or in Redis shared by all workers). This job compacts every closed
+hour into analytics_hourly / analytics_route_hourly and every closed day
+into analytics_daily / analytics_route_daily (adding DAU, new users and
+revenue), so months of history stay queryable with primary-key range reads.
+
+Compaction is incremental: each run continues after the newest hour and day
+already stored, and rows are written with INSERT ... ON CONFLICT DO NOTHING,
+so an overlapping run is harmless. With Redis a short lock lets one worker
+do the work. Without Redis each worker only sees its own requests, so the
+history is complete only with a single worker.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from analytics import analytics_manager, ANALYTICS_ROLLUP_HOURS
+from database import engine
+from metric_buckets import COUNT, ERRORS, LATENCY_SUM, HISTOGRAM, COLUMNS, histogram_percentile
+from models import AnalyticsHourly, AnalyticsRouteHourly, AnalyticsDaily, AnalyticsRouteDaily, Payment, User
+from partitioning import archive_aware
+
+ANALYTICS_HISTORY_INTERVAL_SECONDS = int(os.getenv("ANALYTICS_HISTORY_INTERVAL_SECONDS", "900"))
+ANALYTICS_HOURLY_RETENTION_DAYS = int(os.getenv("ANALYTICS_HOURLY_RETENTION_DAYS", "90"))
+ANALYTICS_DAILY_RETENTION_DAYS = int(os.getenv("ANALYTICS_DAILY_RETENTION_DAYS", "730"))
+
+logger = logging.getLogger(__name__)
+
+_DIALECT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _hour_start(hour: int) -> datetime:
+    return _EPOCH + timedelta(hours=hour)
+
+
+def _epoch_hour(moment: datetime) -> int:
+    return int((moment - _EPOCH).total_seconds() // 3600)
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day)
+
+
+def _insert_new(conn, model, rows: List[Dict[str, Any]]):
+    """Insert rows, skipping primary keys that are already stored"""
+    if rows:
+        conn.execute(_DIALECT_INSERTS[conn.dialect.name](model.__table__).on_conflict_do_nothing(), rows)
+
+
+def _stored_range() -> Tuple[Optional[datetime], Optional[datetime], Optional[date]]:
+    """(first hour, last hour, last day) already compacted"""
+    with engine.connect() as conn:
+        first_hour, last_hour = conn.execute(select(func.min(AnalyticsHourly.hour), func.max(AnalyticsHourly.hour))).one()
+        last_day = conn.execute(select(func.max(AnalyticsDaily.day))).scalar()
+    return first_hour, last_hour, last_day
+
+
+def _route_row(key: Dict[str, Any], stats: np.ndarray) -> Dict[str, Any]:
+    return {
+        **key,
+        "requests": int(stats[COUNT]),
+        "errors": int(stats[ERRORS]),
+        "latency_sum": float(stats[LATENCY_SUM]),
+        "latency_histogram": json.dumps([int(count) for count in stats[HISTOGRAM:]]),
+    }
+
+
+def _store_hours(hour_rows: List[Dict[str, Any]], route_rows: List[Dict[str, Any]]):
+    with engine.begin() as conn:
+        _insert_new(conn, AnalyticsRouteHourly, route_rows)
+        # Written last: analytics_hourly is the watermark the next run continues from
+        _insert_new(conn, AnalyticsHourly, hour_rows)
+
+
+def _store_day(day: date, active_users: Optional[int]):
+    """Compact one day's hourly rows and add its DAU, new users and revenue"""
+    start = _day_start(day)
+    end = start + timedelta(days=1)
+    payments = archive_aware(Payment, since=start)
+    with engine.begin() as conn:
+        requests, errors, latency_sum = conn.execute(
+            select(
+                func.coalesce(func.sum(AnalyticsHourly.requests), 0),
+                func.coalesce(func.sum(AnalyticsHourly.errors), 0),
+                func.coalesce(func.sum(AnalyticsHourly.latency_sum), 0.0),
+            ).where(AnalyticsHourly.hour >= start, AnalyticsHourly.hour < end)
+        ).one()
+
+        routes: Dict[str, np.ndarray] = {}
+        for route, route_requests, route_errors, route_latency, histogram in conn.execute(
+            select(
+                AnalyticsRouteHourly.route, AnalyticsRouteHourly.requests, AnalyticsRouteHourly.errors,
+                AnalyticsRouteHourly.latency_sum, AnalyticsRouteHourly.latency_histogram
+            ).where(AnalyticsRouteHourly.hour >= start, AnalyticsRouteHourly.hour < end)
+        ):
+            stats = routes.setdefault(route, np.zeros(COLUMNS))
+            stats[COUNT] += route_requests
+            stats[ERRORS] += route_errors
+            stats[LATENCY_SUM] += route_latency
+            stats[HISTOGRAM:] += json.loads(histogram)
+
+        new_users = conn.execute(
+            select(func.count(User.id)).where(User.joined_at >= start, User.joined_at < end)
+        ).scalar()
+        revenue = conn.execute(
+            select(func.coalesce(func.sum(payments.amount), 0.0)).where(
+                payments.status == "completed",
+                payments.type == "entry_fee",
+                payments.created_at >= start,
+                payments.created_at < end
+            )
+        ).scalar()
+
+        _insert_new(conn, AnalyticsRouteDaily, [_route_row({"day": day, "route": route}, stats) for route, stats in routes.items()])
+        _insert_new(conn, AnalyticsDaily, [{
+            "day": day,
+            "requests": requests,
+            "errors": errors,
+            "latency_sum": latency_sum,
+            "active_users": active_users,
+            "new_users": new_users,
+            "revenue": revenue,
+        }])
+
+
+def _apply_retention(now: datetime) -> Dict[str, int]:
+    hourly_cutoff = now - timedelta(days=ANALYTICS_HOURLY_RETENTION_DAYS)
+    daily_cutoff = (now - timedelta(days=ANALYTICS_DAILY_RETENTION_DAYS)).date()
+    with engine.begin() as conn:
+        return {
+            "hourly_removed": conn.execute(delete(AnalyticsHourly).where(AnalyticsHourly.hour < hourly_cutoff)).rowcount
+            + conn.execute(delete(AnalyticsRouteHourly).where(AnalyticsRouteHourly.hour < hourly_cutoff)).rowcount,
+            "daily_removed": conn.execute(delete(AnalyticsDaily).where(AnalyticsDaily.day < daily_cutoff)).rowcount
+            + conn.execute(delete(AnalyticsRouteDaily).where(AnalyticsRouteDaily.day < daily_cutoff)).rowcount,
+        }
+
+
+async def _acquire_run_lock() -> bool:
+    """With Redis, let one worker per interval do the compaction"""
+    if not analytics_manager.redis_client:
+        return True
+    return bool(await analytics_manager.redis_client.set(
+        "analytics:history:lock", os.getpid(), nx=True, ex=max(ANALYTICS_HISTORY_INTERVAL_SECONDS // 2, 1)
+    ))
+
+
+async def run_history_rollup(now: float = None) -> Dict[str, int]:
+    """Compact closed hours and days not stored yet, then apply retention"""
+    now = time.time() if now is None else now
+    if not await _acquire_run_lock():
+        return {}
+    current_hour = int(now // 3600)
+    # Oldest hour the stats backends still hold completely
+    oldest_hour = current_hour - ANALYTICS_ROLLUP_HOURS + 1
+    first_stored, last_stored, last_day = await asyncio.to_thread(_stored_range)
+
+    first_hour = oldest_hour if last_stored is None else max(_epoch_hour(last_stored) + 1, oldest_hour)
+    hour_rows, route_rows = [], []
+    for hour in range(first_hour, current_hour):
+        metrics = await analytics_manager.stats.hour_metrics(hour)
+        totals = sum(metrics["routes"].values(), np.zeros(COLUMNS))
+        moment = _hour_start(hour)
+        hour_rows.append({
+            "hour": moment,
+            "requests": int(totals[COUNT]),
+            "errors": int(totals[ERRORS]),
+            "latency_sum": float(totals[LATENCY_SUM]),
+            "active_users": await analytics_manager.unique_users.count_hours(hour, hour + 1),
+        })
+        route_rows.extend(_route_row({"hour": moment, "route": route}, stats) for route, stats in metrics["routes"].items())
+    await asyncio.to_thread(_store_hours, hour_rows, route_rows)
+
+    # Every hour before the current one is stored now, so every day before today is complete
+    today = _hour_start(current_hour).date()
+    if last_day is not None:
+        day = last_day + timedelta(days=1)
+    elif first_stored is not None or hour_rows:
+        day = (first_stored or hour_rows[0]["hour"]).date()
+    else:
+        day = today
+    days = 0
+    while day < today:
+        day_hour = _epoch_hour(_day_start(day))
+        # DAU needs the day's unique-user sketches, which expire with the stats retention
+        active_users = (
+            await analytics_manager.unique_users.count_hours(day_hour, day_hour + 24)
+            if day_hour >= oldest_hour else None
+        )
+        await asyncio.to_thread(_store_day, day, active_users)
+        day += timedelta(days=1)
+        days += 1
+
+    results = {"hours": len(hour_rows), "days": days}
+    results.update(await asyncio.to_thread(_apply_retention, _hour_start(current_hour)))
+    logger.info(f"Analytics history rollup finished: {results}")
+    return results
+
+
+async def history_rollup_loop():
+    """Background task: compact analytics into the history tables every ANALYTICS_HISTORY_INTERVAL_SECONDS"""
+    while True:
+        try:
+            await run_history_rollup()
+        except Exception as e:
+            logger.error(f"Error during analytics history rollup: {e}")
+        await asyncio.sleep(ANALYTICS_HISTORY_INTERVAL_SECONDS)
+
+
+def _summary(requests: int, errors: int, latency_sum: float) -> Dict[str, Any]:
+    return {
+        "requests": requests,
+        "errors": errors,
+        "error_rate": errors / requests if requests else 0,
+        "average_response_time": latency_sum / requests if requests else 0,
+    }
+
+
+async def get_history(db: AsyncSession, start: date, end: date, granularity: str = "day") -> List[Dict[str, Any]]:
+    """Totals per day (with DAU, new users, revenue) or per hour, for start..end inclusive"""
+    if granularity == "hour":
+        result = await db.execute(
+            select(AnalyticsHourly).where(
+                AnalyticsHourly.hour >= _day_start(start),
+                AnalyticsHourly.hour < _day_start(end) + timedelta(days=1)
+            ).order_by(AnalyticsHourly.hour)
+        )
+        return [
+            {"period": row.hour.isoformat(), "active_users": row.active_users,
+             **_summary(row.requests, row.errors, row.latency_sum)}
+            for row in result.scalars()
+        ]
+    result = await db.execute(
+        select(AnalyticsDaily).where(AnalyticsDaily.day >= start, AnalyticsDaily.day <= end).order_by(AnalyticsDaily.day)
+    )
+    return [
+        {"period": row.day.isoformat(), "active_users": row.active_users, "new_users": row.new_users,
+         "revenue": row.revenue, **_summary(row.requests, row.errors, row.latency_sum)}
+        for row in result.scalars()
+    ]
+
+
+async def get_route_history(
+    db: AsyncSession,
+    start: date,
+    end: date,
+    granularity: str = "day",
+    route: Optional[str] = None,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """One route's series (with p95 latency), or the busiest routes over the range"""
+    if granularity == "hour":
+        model, period = AnalyticsRouteHourly, AnalyticsRouteHourly.hour
+        low, high = _day_start(start), _day_start(end) + timedelta(days=1)
+    else:
+        model, period = AnalyticsRouteDaily, AnalyticsRouteDaily.day
+        low, high = start, end + timedelta(days=1)
+    in_range = (period >= low, period < high)
+
+    if route is not None:
+        result = await db.execute(select(model).where(model.route == route, *in_range).order_by(period))
+        return [
+            {
+                "period": getattr(row, period.key).isoformat(),
+                "p95_response_time": histogram_percentile(np.array(json.loads(row.latency_histogram)), 95),
+                **_summary(row.requests, row.errors, row.latency_sum)
+            }
+            for row in result.scalars()
+        ]
+
+    requests = func.sum(model.requests)
+    result = await db.execute(
+        select(model.route, requests, func.sum(model.errors), func.sum(model.latency_sum))
+        .where(*in_range).group_by(model.route).order_by(requests.desc()).limit(limit)
+    )
+    return [
+        {"route": name, **_summary(int(route_requests), int(errors), float(latency_sum))}
+        for name, route_requests, errors, latency_sum in result
+    ]
@@ -3,24 +3,33 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import hashlib
 import os
-from typing import Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
 
 from models import User
-from database import get_db
+from database import get_async_db
 from schemas import TokenData
 
 # Security configuration
 SECRET_KEY = os.getenv("JWT_SECRET", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30 * 24 * 60  # 30 days
+# Decoded token payloads kept in memory, keyed by token hash
+JWT_DECODE_CACHE_SIZE = int(os.getenv("JWT_DECODE_CACHE_SIZE", "10000"))
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 # Bearer token security
 security = HTTPBearer()
+# Same, for public routes that personalise the response when a token is sent
+optional_security = HTTPBearer(auto_error=False)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
@@ -42,10 +51,37 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+_decoded_tokens: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+_decoded_tokens_lock = threading.Lock()
+
+def decode_token(token: str) -> Dict[str, Any]:
+    """Decode and verify a JWT, raising JWTError if it is invalid or expired
+
+    Verified payloads are cached (LRU, JWT_DECODE_CACHE_SIZE entries) under the
+    SHA-256 of the token, so the auth dependency, analytics and WebSocket
+    handlers share one decode per token. Expiry is re-checked on every hit.
+    """
+    key = hashlib.sha256(token.encode()).digest()
+    with _decoded_tokens_lock:
+        payload = _decoded_tokens.get(key)
+        if payload is not None:
+            if payload.get("exp", float("inf")) > time.time():
+                _decoded_tokens.move_to_end(key)
+                return payload
+            del _decoded_tokens[key]
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    if JWT_DECODE_CACHE_SIZE > 0:
+        with _decoded_tokens_lock:
+            _decoded_tokens[key] = payload
+            if len(_decoded_tokens) > JWT_DECODE_CACHE_SIZE:
+                _decoded_tokens.popitem(last=False)
+    return payload
+
 def verify_token(token: str) -> TokenData:
     """Verify JWT token and return token data"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         email = payload.get("sub")
         user_id = payload.get("user_id")
         
@@ -67,14 +103,15 @@ def verify_token(token: str) -> TokenData:
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ) -> User:
     """Get current authenticated user"""
     try:
         token = credentials.credentials
         token_data = verify_token(token)
         
-        user = db.query(User).filter(User.email == token_data.email).first()
+        result = await db.execute(select(User).where(User.email == token_data.email))
+        user = result.scalar_one_or_none()
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -97,6 +134,18 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+async def get_optional_current_user(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+    db: AsyncSession = Depends(get_async_db)
+) -> Optional[User]:
+    """Get current user if a valid token was sent, None for anonymous visitors"""
+    if credentials is None:
+        return None
+    try:
+        return await get_current_user(credentials, db)
+    except HTTPException:
+        return None
+
 async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user"""
     if getattr(current_user, 'is_active', True) is False:
@@ -115,14 +164,16 @@ async def get_current_admin_user(current_user: User = Depends(get_current_user))
         )
     return current_user
 
-def authenticate_user(db: Session, username_or_email: str, password: str) -> Optional[User]:
+async def authenticate_user(db: AsyncSession, username_or_email: str, password: str) -> Optional[User]:
     """Authenticate user with username/email and password"""
     # Try to find user by email first
-    user = db.query(User).filter(User.email == username_or_email).first()
+    result = await db.execute(select(User).where(User.email == username_or_email))
+    user = result.scalar_one_or_none()
     
     # If not found by email, try by username
     if not user:
-        user = db.query(User).filter(User.username == username_or_email).first()
+        result = await db.execute(select(User).where(User.username == username_or_email))
+        user = result.scalar_one_or_none()
     
     if not user:
         return None
@@ -130,15 +181,15 @@ def authenticate_user(db: Session, username_or_email: str, password: str) -> Opt
         return None
     return user
 
-def check_username_availability(db: Session, username: str) -> bool:
+async def check_username_availability(db: AsyncSession, username: str) -> bool:
     """Check if username is available"""
-    user = db.query(User).filter(User.username == username).first()
-    return user is None
+    user_id = await db.scalar(select(User.id).where(User.username == username).limit(1))
+    return user_id is None
 
-def check_email_availability(db: Session, email: str) -> bool:
+async def check_email_availability(db: AsyncSession, email: str) -> bool:
     """Check if email is available"""
-    user = db.query(User).filter(User.email == email).first()
-    return user is None
+    user_id = await db.scalar(select(User.id).where(User.email == email).limit(1))
+    return user_id is None
 
 # Role-based access control
 def require_role(required_role: str):
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Compare in-memory access log stats: list of dict records vs AnalyticsManager.
+
+Fills both with the same synthetic traffic, checks they agree, and times
+ingest, the per-minute call count behind get_real_time_stats (ring buffer)
+and the 24h / 7d views behind get_api_analytics (rolling buckets and
+HyperLogLog unique users).
+
+Usage:
+    python benchmarks/bench_access_log_buffer.py --rows 1000000
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Access log buffer benchmark")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--span-hours", type=float, default=192, help="Time range the rows are spread over")
+    parser.add_argument("--repeat", type=int, default=20, help="Timed repetitions per query")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+
+def synthetic_logs(args):
+    rng = random.Random(args.seed)
+    routes = [("GET", f"/api/tournaments/{i}") for i in range(200)] + [
+        ("GET", "/api/players/leaderboard/global"), ("POST", "/api/auth/login"), ("GET", "/api/players/me"),
+    ]
+    statuses = [200] * 90 + [201] * 4 + [404] * 3 + [401] * 2 + [500]
+    now = time.time()
+    step = args.span_hours * 3600 / args.rows
+    for i in range(args.rows):
+        epoch = now - args.span_hours * 3600 + i * step
+        method, path = rng.choice(routes)
+        user = rng.randrange(5000)
+        yield {
+            "timestamp": datetime.utcfromtimestamp(epoch).isoformat(),
+            "epoch": epoch,
+            "method": method,
+            "path": path,
+            "route": path,
+            "status_code": rng.choice(statuses),
+            "process_time": rng.expovariate(1 / 0.02),
+            "user_id": str(user) if user else None,
+        }
+
+
+def list_api_analytics(logs, hours):
+    """The previous list-scanning implementation of get_api_analytics"""
+    start_time = datetime.utcnow() - timedelta(hours=hours)
+    filtered_logs = [log for log in logs if datetime.fromisoformat(log["timestamp"]) >= start_time]
+    total_requests = len(filtered_logs)
+    status_stats = Counter(log["status_code"] for log in filtered_logs)
+    hourly_stats = defaultdict(int)
+    for log in filtered_logs:
+        hourly_stats[datetime.fromisoformat(log["timestamp"]).strftime("%Y-%m-%d %H:00")] += 1
+    return {
+        "total_requests": total_requests,
+        "unique_users": len(set(log["user_id"] for log in filtered_logs if log["user_id"])),
+        "endpoint_stats": dict(Counter(f"{log['method']}:{log['path']}" for log in filtered_logs).most_common(10)),
+        "status_code_stats": dict(status_stats),
+    }
+
+
+def list_calls_per_minute(logs):
+    current_time = time.time()
+    return len([log for log in logs if current_time - datetime.fromisoformat(log["timestamp"]).timestamp() < 60])
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+async def run(args):
+    from analytics import AnalyticsManager, ANALYTICS_ROLLUP_HOURS
+    from stats_backend import InProcessStatsBackend
+
+    logs = list(synthetic_logs(args))
+    manager = AnalyticsManager()
+    manager.stats = InProcessStatsBackend(args.rows, ANALYTICS_ROLLUP_HOURS)
+
+    start = time.perf_counter()
+    for offset in range(0, len(logs), 500):
+        await manager._write_access_logs(logs[offset:offset + 500])
+    ingest_us = (time.perf_counter() - start) / len(logs) * 1e6
+
+    rows_per_hour = len(logs) / args.span_hours
+    for hours in (24, 168):
+        analytics = await manager.get_api_analytics(hours)
+        expected = list_api_analytics(logs, hours)
+        # Long windows start on an hour boundary, so they can hold up to an hour more
+        extra = analytics["total_requests"] - expected["total_requests"]
+        assert -2 <= extra <= rows_per_hour + 2, (hours, analytics["total_requests"], expected["total_requests"])
+        assert analytics["status_code_stats"].keys() == expected["status_code_stats"].keys()
+        # HyperLogLog estimate: ~1.6% standard error
+        assert abs(analytics["unique_users"] - expected["unique_users"]) <= 0.05 * expected["unique_users"] + 1
+
+    buffer_minute, _ = timed(lambda: manager.stats.log_buffer.count_since(time.time() - 60), args.repeat)
+    list_minute, _ = timed(lambda: list_calls_per_minute(logs), 1)
+
+    print(f"rows: {len(logs):,}  ingest: {ingest_us:.2f} µs/row (ring buffer, buckets, HyperLogLog and Prometheus)")
+    print(f"{'query':<26}{'list':>14}{'manager':>16}")
+    print(f"{'calls in last minute':<26}{list_minute * 1000:>11.1f} ms{buffer_minute * 1e6:>13.1f} µs")
+    for hours in (24, 168):
+        manager_time = min([await _time_async(manager.get_api_analytics, hours) for _ in range(args.repeat)])
+        list_time, _ = timed(lambda: list_api_analytics(logs, hours), 1)
+        print(f"{f'{hours}h api analytics':<26}{list_time * 1000:>11.1f} ms{manager_time * 1000:>13.2f} ms")
+
+
+async def _time_async(fn, *fn_args):
+    start = time.perf_counter()
+    await fn(*fn_args)
+    return time.perf_counter() - start
+
+
+def main():
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
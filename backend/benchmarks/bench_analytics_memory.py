@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Measure memory spent per logged request by the analytics middleware.
+
+Runs the same upload workload through three apps and compares them with
+tracemalloc:
+
+    none       no analytics middleware (baseline)
+    buffered   the previous middleware: reads the whole request body to take
+               its len() and keeps dict(request.headers) in every record
+    streaming  AnalyticsMiddleware: byte counting on the ASGI stream and an
+               allowlisted subset of headers
+
+Reported per request: extra peak memory while requests are in flight and
+retained memory per stored log record.
+
+Usage:
+    python benchmarks/bench_analytics_memory.py --requests 1000 --body-kb 256 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep every record in full, so retained memory is measured per complete record
+os.environ.setdefault("REQUEST_SAMPLE_RATE", "1")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Analytics middleware memory benchmark")
+    parser.add_argument("--requests", type=int, default=1000, help="Uploads per mode (records kept: up to 1000)")
+    parser.add_argument("--body-kb", type=int, default=256, help="Upload size in KiB")
+    parser.add_argument("--concurrency", type=int, default=50)
+    return parser.parse_args()
+
+
+def build_app(mode: str, records: list):
+    from fastapi import FastAPI, Request
+    from analytics import AnalyticsMiddleware
+
+    app = FastAPI()
+
+    @app.post("/api/uploads")
+    async def upload():
+        # Like most handlers that reject or forward uploads, the body is never read here
+        return {"accepted": True}
+
+    if mode == "buffered":
+        @app.middleware("http")
+        async def buffered_analytics(request: Request, call_next):
+            start_time = time.time()
+            response = await call_next(request)
+            records.append({
+                'timestamp': datetime.utcnow().isoformat(),
+                'method': request.method,
+                'endpoint': str(request.url),
+                'path': request.url.path,
+                'status_code': response.status_code,
+                'process_time': time.time() - start_time,
+                'request_size': len(await request.body()),
+                'query_params': dict(request.query_params),
+                'headers': dict(request.headers),
+            })
+            return response
+    elif mode == "streaming":
+        app.add_middleware(AnalyticsMiddleware)
+
+    return app
+
+
+async def measure(mode: str, args, body: bytes, headers: dict):
+    import httpx
+    from analytics import analytics_manager
+
+    records = []
+    analytics_manager.api_log_stream.clear()
+    analytics_manager.stats.log_buffer.clear()
+    app = build_app(mode, records)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm up imports and caches outside the measurement
+        await client.post("/api/uploads", content=body, headers=headers)
+        records.clear()
+        analytics_manager.api_log_stream.clear()
+        analytics_manager.stats.log_buffer.clear()
+        await asyncio.sleep(0.3)
+
+        remaining = iter(range(args.requests))
+
+        async def worker():
+            for _ in remaining:
+                await client.post("/api/uploads", content=body, headers=headers)
+
+        tracemalloc.start()
+        before, _ = tracemalloc.get_traced_memory()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        # Let the batched writer store the streaming records
+        await asyncio.sleep(0.5)
+        after, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    stored = len(records) or await analytics_manager.api_log_stream.length()
+    return {
+        "peak_per_inflight_request": (peak - before) / args.concurrency,
+        "retained_per_record": (after - before) / stored if stored else 0,
+        "records": stored,
+    }
+
+
+async def run(args):
+    from analytics import analytics_manager
+
+    await analytics_manager.initialize()
+    body = os.urandom(args.body_kb * 1024)
+    headers = {
+        "Authorization": "Bearer " + "x" * 180,
+        "User-Agent": "Mozilla/5.0 (bench) ClutchZone/2.0",
+        "Accept-Language": "en-US,en;q=0.9",
+        "Content-Type": "application/octet-stream",
+        "Cookie": "session=" + "y" * 120,
+    }
+
+    results = {}
+    for mode in ("none", "buffered", "streaming"):
+        results[mode] = await measure(mode, args, body, headers)
+    await analytics_manager.close()
+
+    print(f"{'mode':<12}{'peak KiB/request':>18}{'retained B/record':>20}{'records':>10}")
+    baseline = results["none"]
+    for mode, result in results.items():
+        extra_peak = result["peak_per_inflight_request"] - baseline["peak_per_inflight_request"]
+        print(f"{mode:<12}{extra_peak / 1024:>18.1f}{result['retained_per_record']:>20.0f}{result['records']:>10}")
+
+
+def main():
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
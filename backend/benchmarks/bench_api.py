@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+End-to-end HTTP benchmark suite with regression tracking.
+
+Seeds a temporary SQLite database with seed_data.py, mounts the API routers
+with the SQL instrumentation middleware in an in-process FastAPI app, and
+drives each scenario through httpx's ASGI transport. Throughput, latency
+percentiles and SQL statements per request are compared against a JSON
+baseline; the run exits non-zero when a scenario regresses past the threshold.
+
+Usage:
+    python benchmarks/bench_api.py                        # compare against benchmarks/baseline.json
+    python benchmarks/bench_api.py --update-baseline      # record a new baseline
+    python benchmarks/bench_api.py --scenarios tournament_list,leaderboard_global --requests 1000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+sys.path.append(BACKEND_DIR)
+
+from bench_async_db import percentile  # noqa: E402
+
+PASSWORD = "password123"
+ANCHOR_DATE = "2026-01-01"
+SCENARIOS = (
+    "login", "tournament_list", "tournament_detail", "tournament_register",
+    "leaderboard_global", "leaderboard_game", "profile_me", "profile_public", "admin_stats",
+)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ClutchZone end-to-end API benchmark")
+    parser.add_argument("--users", type=int, default=20_000, help="Users to seed")
+    parser.add_argument("--tournaments", type=int, default=2_000, help="Tournaments to seed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario (login uses a tenth)")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--scenarios", default=None, help="Comma-separated subset of scenarios to run")
+    parser.add_argument("--baseline", default=os.path.join(BENCH_DIR, "baseline.json"))
+    parser.add_argument("--output", default=None, help="Also write this run's results to a JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Write this run as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="Allowed relative drop in req/s or rise in p95 before failing")
+    parser.add_argument("--query-tolerance", type=float, default=0.5,
+                        help="Allowed rise in mean SQL statements per request before failing")
+    return parser.parse_args()
+
+
+def seed(args, database_url: str):
+    subprocess.run(
+        [
+            sys.executable, os.path.join(BACKEND_DIR, "seed_data.py"),
+            "--database-url", database_url,
+            "--users", str(args.users),
+            "--tournaments", str(args.tournaments),
+            "--seed", str(args.seed),
+            "--anchor-date", ANCHOR_DATE,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+    )
+
+
+def prepare_fixtures(args, registration_requests: int):
+    """Pick benchmark users, mint their tokens and create open tournaments for the registration scenario"""
+    from sqlalchemy import select, insert, func
+    from database import engine
+    from models import User, Tournament
+    import auth
+
+    with engine.begin() as conn:
+        users = conn.execute(
+            select(User.id, User.email, User.role).where(User.is_active == True).order_by(User.id).limit(200)
+        ).all()
+        admin = next(user for user in users if user.role == "admin")
+        players = [user for user in users if user.role == "player"]
+
+        # Fresh, effectively unlimited tournaments so every registration succeeds
+        first_id = (conn.scalar(select(func.max(Tournament.id))) or 0) + 1
+        needed = -(-registration_requests // len(players))
+        now = datetime.utcnow()
+        conn.execute(insert(Tournament), [
+            {
+                "id": first_id + offset,
+                "name": f"Benchmark Open #{offset + 1}",
+                "game": "Valorant",
+                "date": now + timedelta(days=30),
+                "registration_end": now + timedelta(days=29),
+                "max_participants": 1_000_000,
+                "entry_fee": 0.0,
+                "status": "upcoming",
+                "created_by": admin.id,
+            }
+            for offset in range(needed)
+        ])
+
+    def token(user):
+        return auth.create_access_token(data={"sub": user.email, "user_id": user.id}, expires_delta=timedelta(hours=6))
+
+    return {
+        "admin_token": token(admin),
+        "players": [(user.id, token(user)) for user in players],
+        "open_tournaments": list(range(first_id, first_id + needed)),
+    }
+
+
+def build_scenarios(args, fixtures):
+    """name -> callable(i) returning (method, path, token, json body)"""
+    rng = random.Random(args.seed)
+    players = fixtures["players"]
+    games = ["Valorant", "PUBG", "BGMI", "COD"]
+
+    def player(i):
+        return players[i % len(players)]
+
+    def registration(i):
+        user_id, token = player(i)
+        tournament_id = fixtures["open_tournaments"][i // len(players)]
+        return "POST", f"/api/tournaments/{tournament_id}/register", token, None
+
+    return {
+        "login": lambda i: ("POST", "/api/auth/login", None,
+                            {"username": f"player{player(i)[0]}", "password": PASSWORD}),
+        "tournament_list": lambda i: ("GET", "/api/tournaments/?limit=20", player(i)[1], None),
+        "tournament_detail": lambda i: (
+            "GET", f"/api/tournaments/{rng.randint(1, args.tournaments)}", player(i)[1], None
+        ),
+        "tournament_register": registration,
+        "leaderboard_global": lambda i: ("GET", "/api/players/leaderboard/global", player(i)[1], None),
+        "leaderboard_game": lambda i: (
+            "GET", f"/api/players/leaderboard/game/{games[i % len(games)]}", player(i)[1], None
+        ),
+        "profile_me": lambda i: ("GET", "/api/players/me", player(i)[1], None),
+        "profile_public": lambda i: ("GET", f"/api/players/{rng.choice(players)[0]}", player(i)[1], None),
+        "admin_stats": lambda i: ("GET", "/api/admin/stats", fixtures["admin_token"], None),
+    }
+
+
+def build_app():
+    """The API as main.py mounts it, minus services that need Redis or Discord"""
+    from fastapi import FastAPI
+    from routers import auth, tournaments, players, admin, notifications
+    from sql_instrumentation import SQLInstrumentationMiddleware
+
+    app = FastAPI()
+    app.add_middleware(SQLInstrumentationMiddleware)
+    app.include_router(auth.router, prefix="/api/auth")
+    app.include_router(tournaments.router, prefix="/api/tournaments")
+    app.include_router(players.router, prefix="/api/players")
+    app.include_router(notifications.router, prefix="/api/notifications")
+    app.include_router(admin.router, prefix="/api/admin")
+    return app
+
+
+async def run_scenario(client, make_request, total: int, concurrency: int):
+    latencies, query_counts = [], []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in remaining:
+            method, path, token, body = make_request(i)
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            start = time.perf_counter()
+            response = await client.request(method, path, headers=headers, json=body)
+            latencies.append(time.perf_counter() - start)
+            query_counts.append(int(response.headers.get("X-DB-Query-Count", 0)))
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "queries_per_request": round(sum(query_counts) / len(query_counts), 2),
+    }
+
+
+def request_count(args, name: str) -> int:
+    # bcrypt makes logins deliberately expensive
+    return max(args.concurrency, args.requests // 10) if name == "login" else args.requests
+
+
+async def run(args, selected):
+    import httpx
+    from database import async_engine
+
+    fixtures = prepare_fixtures(args, request_count(args, "tournament_register"))
+    scenarios = build_scenarios(args, fixtures)
+    # Server errors become 500 responses (counted as failures) instead of aborting the run
+    transport = httpx.ASGITransport(app=build_app(), raise_app_exceptions=False)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for name in selected:
+            make_request = scenarios[name]
+            if name != "tournament_register":
+                # Warm caches and pools; registrations are not repeatable
+                await run_scenario(client, make_request, args.concurrency, args.concurrency)
+            results[name] = await run_scenario(client, make_request, request_count(args, name), args.concurrency)
+            print_row(name, results[name])
+
+    await async_engine.dispose()
+    return results
+
+
+def print_row(name, result):
+    print(
+        f"{name:<22}{result['rps']:>9.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+        f"{result['p99_ms']:>10.2f}{result['queries_per_request']:>9.2f}{result['errors']:>8}"
+    )
+
+
+def compare(results, baseline, threshold: float, query_tolerance: float):
+    """Human-readable regressions of `results` against `baseline`"""
+    regressions = []
+    for name, result in results.items():
+        if result["errors"]:
+            regressions.append(f"{name}: {result['errors']} failed requests")
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result["rps"] < base["rps"] * (1 - threshold):
+            regressions.append(f"{name}: throughput {result['rps']} req/s vs baseline {base['rps']}")
+        if result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if result["queries_per_request"] > base["queries_per_request"] + query_tolerance:
+            regressions.append(
+                f"{name}: {result['queries_per_request']} queries/request vs baseline {base['queries_per_request']}"
+            )
+    return regressions
+
+
+def main():
+    args = parse_args()
+    temp_dir = tempfile.TemporaryDirectory()
+    database_url = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ["SQL_DEBUG_HEADERS"] = "true"
+    os.environ.pop("DATABASE_READ_URL", None)
+
+    try:
+        print(f"Seeding {args.users:,} users and {args.tournaments:,} tournaments (seed {args.seed})...")
+        seed(args, database_url)
+
+        selected = args.scenarios.split(",") if args.scenarios else list(SCENARIOS)
+        unknown = set(selected) - set(SCENARIOS)
+        if unknown:
+            sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))} (choose from {', '.join(SCENARIOS)})")
+
+        print(f"{'scenario':<22}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'q/req':>9}{'errors':>8}")
+        results = asyncio.run(run(args, selected))
+    finally:
+        temp_dir.cleanup()
+
+    report = {
+        "meta": {
+            "recorded_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "users": args.users,
+            "tournaments": args.tournaments,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                # Keep scenarios that were not part of this run
+                report["scenarios"] = {**json.load(f)["scenarios"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📝 Baseline written to {args.baseline}")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline["scenarios"], args.threshold, args.query_tolerance)
+    if regressions:
+        print("❌ Regressions against baseline:")
+        for regression in regressions:
+            print(f"  - {regression}")
+        sys.exit(1)
+    print("✅ No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
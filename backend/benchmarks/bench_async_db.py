@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Benchmark the synchronous Session path against the AsyncSession path.
+
+Both endpoints run the same tournament listing query (page of tournaments
+plus participant counts) inside an in-process FastAPI app driven through
+httpx's ASGI transport, so the numbers exclude network and server overhead.
+
+Usage:
+    python benchmarks/bench_async_db.py --requests 2000 --concurrency 50
+    python benchmarks/bench_async_db.py --database-url postgresql://...
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Sync vs async database path benchmark")
+    parser.add_argument("--database-url", default=None, help="Existing database to use (default: temporary SQLite file)")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per path")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent in-flight requests")
+    parser.add_argument("--tournaments", type=int, default=200, help="Tournaments to seed into the temporary database")
+    parser.add_argument("--page-size", type=int, default=20, help="Tournaments returned per request")
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of an unsorted list"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def seed_database(tournament_count: int):
+    """Populate a fresh database with tournaments and registrations"""
+    from sqlalchemy import insert
+    from database import engine, create_tables
+    from models import User, Tournament, Registration
+
+    create_tables()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {"email": f"bench{i}@clutchzone.test", "username": f"bench{i}", "password_hash": "x"}
+            for i in range(1, 101)
+        ])
+        conn.execute(insert(Tournament), [
+            {
+                "name": f"Bench Cup {i}",
+                "game": ["Valorant", "PUBG", "CS:GO", "COD"][i % 4],
+                "date": now + timedelta(days=i % 30),
+                "registration_end": now + timedelta(days=i % 30 - 1),
+                "created_by": 1,
+            }
+            for i in range(1, tournament_count + 1)
+        ])
+        conn.execute(insert(Registration), [
+            {"user_id": (i * 7) % 100 + 1, "tournament_id": i % tournament_count + 1}
+            for i in range(tournament_count * 10)
+        ])
+
+
+def build_app(page_size: int):
+    from fastapi import FastAPI, Depends
+    from sqlalchemy import select, func
+    from sqlalchemy.orm import Session
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from database import get_db, get_async_db
+    from models import Tournament, Registration
+
+    app = FastAPI()
+
+    @app.get("/sync/tournaments")
+    async def sync_tournaments(db: Session = Depends(get_db)):
+        tournaments = db.execute(select(Tournament).limit(page_size)).scalars().all()
+        return [
+            {
+                "id": t.id,
+                "name": t.name,
+                "participant_count": db.scalar(
+                    select(func.count(Registration.id)).where(Registration.tournament_id == t.id)
+                ),
+            }
+            for t in tournaments
+        ]
+
+    @app.get("/async/tournaments")
+    async def async_tournaments(db: AsyncSession = Depends(get_async_db)):
+        tournaments = (await db.execute(select(Tournament).limit(page_size))).scalars().all()
+        results = []
+        for t in tournaments:
+            results.append({
+                "id": t.id,
+                "name": t.name,
+                "participant_count": await db.scalar(
+                    select(func.count(Registration.id)).where(Registration.tournament_id == t.id)
+                ),
+            })
+        return results
+
+    return app
+
+
+async def drive(client, path: str, total: int, concurrency: int):
+    """Issue `total` GETs with at most `concurrency` in flight; return per-request latencies"""
+    latencies = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - start)
+            response.raise_for_status()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, time.perf_counter() - started
+
+
+async def run(args):
+    import httpx
+    from database import async_engine
+
+    app = build_app(args.page_size)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Warm both pools before measuring
+        await drive(client, "/sync/tournaments", args.concurrency, args.concurrency)
+        await drive(client, "/async/tournaments", args.concurrency, args.concurrency)
+
+        print(f"{'path':<8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for label, path in (("sync", "/sync/tournaments"), ("async", "/async/tournaments")):
+            latencies, elapsed = await drive(client, path, args.requests, args.concurrency)
+            print(
+                f"{label:<8}{len(latencies) / elapsed:>10.1f}"
+                f"{percentile(latencies, 50) * 1000:>10.2f}"
+                f"{percentile(latencies, 95) * 1000:>10.2f}"
+                f"{percentile(latencies, 99) * 1000:>10.2f}"
+                f"{max(latencies) * 1000:>10.2f}"
+            )
+
+    await async_engine.dispose()
+
+
+def main():
+    args = parse_args()
+    temp_dir = None
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        temp_dir = tempfile.TemporaryDirectory()
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(temp_dir.name, 'bench.db')}"
+        seed_database(args.tournaments)
+
+    try:
+        asyncio.run(run(args))
+    finally:
+        if temp_dir:
+            temp_dir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Broadcast latency of ConnectionManager to many local WebSocket connections.
+
+Connections are in-process fakes whose send_text yields to the loop once,
+like a write into a socket buffer with room to spare; --slow of them stall
+for --slow-delay seconds instead. The previous implementation (sequential
+awaits, json.dumps per recipient) is timed next to ConnectionManager.broadcast,
+which returns once the message is queued; its time runs until every
+non-stalling connection's writer task has sent it.
+
+Usage:
+    python benchmarks/bench_ws_broadcast.py --connections 10000 --slow 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="WebSocket broadcast benchmark")
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--slow", type=int, default=0, help="Connections whose sends stall")
+    parser.add_argument("--slow-delay", type=float, default=0.2, help="Seconds a slow connection's send takes")
+    parser.add_argument("--timeout", type=float, default=1.0, help="WS_SEND_TIMEOUT_SECONDS for the new path")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed broadcasts per implementation")
+    return parser.parse_args()
+
+
+class FakeWebSocket:
+    delivered = 0
+    target = 0
+    all_delivered: asyncio.Event = None
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.received = 0
+
+    async def send_text(self, text: str):
+        await asyncio.sleep(self.delay)
+        self.received += 1
+        if not self.delay:
+            FakeWebSocket.delivered += 1
+            if FakeWebSocket.delivered == FakeWebSocket.target:
+                FakeWebSocket.all_delivered.set()
+
+    async def close(self, code: int = 1000, reason: str = None):
+        pass
+
+
+def sample_message():
+    return {
+        "type": "tournament_update",
+        "tournament_id": 42,
+        "data": {"round": 3, "matches": [{"id": i, "score": [i % 7, i % 5], "status": "live"} for i in range(20)]},
+        "timestamp": "2024-01-01T00:00:00",
+    }
+
+
+async def sequential_broadcast(connections, message):
+    """The previous ConnectionManager.broadcast"""
+    for websocket in connections:
+        await websocket.send_text(json.dumps(message))
+
+
+async def queued_broadcast(manager, message, fast):
+    FakeWebSocket.delivered, FakeWebSocket.target = 0, fast
+    FakeWebSocket.all_delivered = asyncio.Event()
+    await manager.broadcast(message)
+    await FakeWebSocket.all_delivered.wait()
+
+
+async def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        times.append(time.perf_counter() - start)
+    return min(times), max(times)
+
+
+async def run(args):
+    os.environ["WS_SEND_TIMEOUT_SECONDS"] = str(args.timeout)
+    from websocket_routes import ConnectionManager
+
+    message = sample_message()
+    fast = [FakeWebSocket() for _ in range(args.connections - args.slow)]
+    slow = [FakeWebSocket(args.slow_delay) for _ in range(args.slow)]
+    connections = fast + slow
+
+    old_best, old_worst = await timed(lambda: sequential_broadcast(connections, message), args.repeat)
+
+    manager = ConnectionManager()
+    # Registered without connect(), which would broadcast a user count per join
+    for websocket in connections:
+        manager._register(websocket)
+    new_best, new_worst = await timed(lambda: queued_broadcast(manager, message, len(fast)), args.repeat)
+    assert all(websocket.received == 2 * args.repeat for websocket in fast)
+    queues = manager.queue_stats()
+    await asyncio.sleep(args.slow_delay * args.repeat + 0.1 if args.slow_delay < args.timeout else args.timeout + 0.1)
+    remaining = len(manager.active_connections)
+
+    print(f"connections: {len(connections):,} ({args.slow} stalling {args.slow_delay * 1000:.0f} ms)  "
+          f"message: {len(json.dumps(message))} bytes")
+    print(f"{'broadcast':<28}{'best':>12}{'worst':>12}")
+    print(f"{'sequential, encode per send':<28}{old_best * 1000:>9.1f} ms{old_worst * 1000:>9.1f} ms")
+    print(f"{'queued, encode once':<28}{new_best * 1000:>9.1f} ms{new_worst * 1000:>9.1f} ms")
+    print(f"queued after the last broadcast: {queues['queued_messages']} (deepest queue {queues['max_queue_depth']})")
+    if remaining < len(connections):
+        print(f"connections dropped after the {args.timeout:.1f}s send timeout: {len(connections) - remaining}")
+
+
+def main():
+    asyncio.run(run(parse_args()))
+
+
+if __name__ == "__main__":
+    main()
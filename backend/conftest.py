@@ -0,0 +1,13 @@
+"""
+pytest setup for the backend
+Points the app at a throwaway SQLite database before anything imports database.py
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+_test_db_dir = tempfile.mkdtemp(prefix="clutchzone-test-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_test_db_dir, 'test.db')}"
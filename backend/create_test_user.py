@@ -5,19 +5,13 @@ Script to create a test user for ClutchZone
 
 import os
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from passlib.context import CryptContext
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from models import User, Base
-from database import DATABASE_URL
-
-# Create database engine
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from database import SessionLocal
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -1,7 +1,15 @@
-from sqlalchemy import create_engine
+from fastapi import Depends, Request, Response
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from prometheus_client import Counter, Histogram, Gauge
+import hashlib
+import logging
 import os
+import time
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -10,34 +18,334 @@ load_dotenv()
 # Database configuration - SQLite for development
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./clutchzone.db")
 
-# Create engine
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL,
-        connect_args={"check_same_thread": False},
-        echo=False
-    )
-else:
-    # PostgreSQL configuration
-    engine = create_engine(
-        DATABASE_URL,
-        pool_pre_ping=True,
-        pool_recycle=300,
-        echo=False
-    )
+# Optional read replica for read-only routes (falls back to the primary when unset or down)
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL", "")
+READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+REPLICA_RETRY_SECONDS = int(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+READ_PRIMARY_COOKIE = "cz_read_primary"
+
+# Pool configuration (ignored for in-memory SQLite)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "15000"))
+
+# SQLite tuning
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Prometheus metrics
+DB_POOL_CHECKOUT_WAIT = Histogram(
+    'db_pool_checkout_wait_seconds',
+    'Time spent waiting for a pooled database connection',
+    ['engine'],
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+DB_POOL_IN_USE = Gauge(
+    'db_pool_connections_in_use', 'Pooled connections currently checked out', ['engine'], multiprocess_mode='livesum'
+)
+DB_POOL_SATURATION = Gauge(
+    'db_pool_saturation_ratio', 'Checked out connections / (pool_size + max_overflow)', ['engine'],
+    multiprocess_mode='livemax'
+)
+DB_READ_ROUTING = Counter('db_read_routing_total', 'Read-only sessions by target engine', ['target', 'reason'])
+
+logger = logging.getLogger(__name__)
+
+
+class _CheckoutTimingMixin:
+    """Reports how long each pool checkout waited for a connection"""
+
+    engine_name = "primary"
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.engine_name = self.engine_name
+        return pool
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_CHECKOUT_WAIT.labels(engine=self.engine_name).observe(time.perf_counter() - start)
+
+
+class InstrumentedQueuePool(_CheckoutTimingMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncQueuePool(_CheckoutTimingMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return is_sqlite(url) and (":memory:" in url or url.rstrip("/") in ("sqlite:", "sqlite+pysqlite:"))
+
+
+def to_async_url(url: str) -> str:
+    """Map a sync database URL onto its asyncio driver (aiosqlite / asyncpg)"""
+    scheme, sep, rest = url.partition("://")
+    if scheme in ("sqlite", "sqlite+pysqlite"):
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if scheme in ("postgres", "postgresql", "postgresql+psycopg2"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Apply per-connection SQLite tuning"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _track_pool_usage(engine, engine_name: str):
+    """Keep in-use and saturation gauges current on every checkout/checkin"""
+    capacity = max(DB_POOL_SIZE + DB_MAX_OVERFLOW, 1)
+
+    def update(*args):
+        pool = engine.pool
+        in_use = pool.checkedout() if hasattr(pool, "checkedout") else 0
+        DB_POOL_IN_USE.labels(engine=engine_name).set(in_use)
+        DB_POOL_SATURATION.labels(engine=engine_name).set(in_use / capacity)
+
+    event.listen(engine, "checkout", update)
+    event.listen(engine, "checkin", update)
+
+
+def create_db_engine(url: str = DATABASE_URL, engine_name: str = "primary", **overrides):
+    """Build a tuned engine; every engine in the process should come from here"""
+    options = {"echo": False, "pool_pre_ping": True}
+
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if not _is_sqlite_memory(url):
+            options.update(
+                poolclass=InstrumentedQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+    else:
+        # PostgreSQL configuration
+        options.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            connect_args={"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"},
+        )
+
+    options.update(overrides)
+    new_engine = create_engine(url, **options)
+    new_engine.pool.engine_name = engine_name
+
+    if is_sqlite(url):
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    _track_pool_usage(new_engine, engine_name)
+
+    return new_engine
+
+
+def create_async_db_engine(url: str = DATABASE_URL, engine_name: str = "primary_async", **overrides):
+    """Async twin of create_db_engine() with the same pool and timeout settings"""
+    url = to_async_url(url)
+    options = {"echo": False, "pool_pre_ping": True}
+
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if not _is_sqlite_memory(url):
+            options.update(
+                poolclass=InstrumentedAsyncQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+    else:
+        options.update(
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+            connect_args={"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}},
+        )
+
+    options.update(overrides)
+    new_engine = create_async_engine(url, **options)
+    new_engine.pool.engine_name = engine_name
+
+    if is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    _track_pool_usage(new_engine.sync_engine, engine_name)
+
+    return new_engine
+
+
+# Create engines
+engine = create_db_engine(DATABASE_URL)
+async_engine = create_async_db_engine(DATABASE_URL)
+read_engine = create_db_engine(DATABASE_READ_URL, engine_name="replica") if DATABASE_READ_URL else None
+async_read_engine = create_async_db_engine(DATABASE_READ_URL, engine_name="replica_async") if DATABASE_READ_URL else None
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine) if read_engine else None
+AsyncReadSessionLocal = (
+    async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+    if async_read_engine else None
+)
 Base = declarative_base()
 
+
+# Read-your-writes bookkeeping: clients that just wrote keep reading from the primary
+# for READ_YOUR_WRITES_SECONDS. Tracked per bearer token in-process and via a cookie
+# so the hint survives a hop to another worker.
+_recent_writers = {}
+_replica_down_until = 0.0
+
+
+def _client_key(request: Request):
+    authorization = request.headers.get("authorization")
+    if not authorization:
+        return None
+    return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+def _bind_write_tracking(db: Session, request: Request, response: Response):
+    db.info["track_writes"] = True
+    db.info["client_key"] = _client_key(request)
+    db.info["response"] = response
+
+
+@event.listens_for(Session, "after_flush")
+def _note_flush(session, flush_context):
+    if session.info.get("track_writes"):
+        session.info["wrote"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _note_bulk_write(orm_execute_state):
+    if orm_execute_state.session.info.get("track_writes") and (
+        orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert
+    ):
+        orm_execute_state.session.info["wrote"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_writer_to_primary(session):
+    if not session.info.pop("wrote", False):
+        return
+    client_key = session.info.get("client_key")
+    now = time.monotonic()
+    if client_key:
+        if len(_recent_writers) > 10000:
+            for key in [k for k, until in _recent_writers.items() if until < now]:
+                del _recent_writers[key]
+        _recent_writers[client_key] = now + READ_YOUR_WRITES_SECONDS
+    response = session.info.get("response")
+    if response is not None:
+        response.set_cookie(READ_PRIMARY_COOKIE, "1", max_age=READ_YOUR_WRITES_SECONDS, httponly=True, samesite="lax")
+
+
+def _read_target(request: Request) -> str:
+    """Decide where a read-only session goes; returns the reason when it must use the primary"""
+    if read_engine is None:
+        return "no_replica"
+    if time.monotonic() < _replica_down_until:
+        return "replica_down"
+    if request.cookies.get(READ_PRIMARY_COOKIE):
+        return "read_your_writes"
+    client_key = _client_key(request)
+    if client_key and _recent_writers.get(client_key, 0) > time.monotonic():
+        return "read_your_writes"
+    return "replica"
+
+
+def _mark_replica_down(error: Exception):
+    global _replica_down_until
+    _replica_down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+    logger.warning(f"Read replica unavailable, using primary for {REPLICA_RETRY_SECONDS}s: {error}")
+
+
 # Database helper functions
-def get_db():
+def get_db(request: Request, response: Response):
     """Get database session"""
     db = SessionLocal()
+    _bind_write_tracking(db, request, response)
     try:
         yield db
     finally:
         db.close()
 
+async def get_async_db(request: Request, response: Response):
+    """Get async database session (does not block the event loop)"""
+    async with AsyncSessionLocal() as db:
+        _bind_write_tracking(db.sync_session, request, response)
+        yield db
+
+def get_read_db(request: Request, response: Response, primary: Session = Depends(get_db)):
+    """Get database session for read-only routes (replica when healthy)
+
+    On the primary this is the request's cached get_db session, shared with
+    every other dependency of the request (auth included). Sessions only
+    take a pool connection on first use, so the unused one costs nothing
+    when the replica serves the reads.
+    """
+    reason = _read_target(request)
+    if reason == "replica":
+        db = ReadSessionLocal()
+        try:
+            db.connection()
+        except (DBAPIError, OSError) as e:
+            db.close()
+            _mark_replica_down(e)
+            reason = "replica_down"
+        else:
+            DB_READ_ROUTING.labels(target="replica", reason=reason).inc()
+            try:
+                yield db
+            finally:
+                db.close()
+            return
+
+    DB_READ_ROUTING.labels(target="primary", reason=reason).inc()
+    yield primary
+
+async def get_async_read_db(request: Request, response: Response, primary: AsyncSession = Depends(get_async_db)):
+    """Get async database session for read-only routes (replica when healthy); see get_read_db"""
+    reason = _read_target(request)
+    if reason == "replica":
+        db = AsyncReadSessionLocal()
+        try:
+            await db.connection()
+        except (DBAPIError, OSError) as e:
+            await db.close()
+            _mark_replica_down(e)
+            reason = "replica_down"
+        else:
+            DB_READ_ROUTING.labels(target="replica", reason=reason).inc()
+            try:
+                yield db
+            finally:
+                await db.close()
+            return
+
+    DB_READ_ROUTING.labels(target="primary", reason=reason).inc()
+    yield primary
+
 def create_tables():
     """Create all database tables"""
+    import models  # noqa: F401 - registers the models on Base.metadata
+    import partitioning  # noqa: F401 - registers the archive tables and partition DDL
     Base.metadata.create_all(bind=engine)
@@ -0,0 +1,107 @@
+"""
+Capped, time-ordered log streams backed by Redis Streams.
+
+Entries are appended with XADD MAXLEN ~ (usually through the caller's batched
+pipeline) and read back by time range with XRANGE / XREVRANGE. Entry ids are
+Redis stream ids (`<epoch ms>-<seq>`), so a time range is simply an id range.
+When Redis is unavailable the same interface is served from a bounded deque.
+"""
+
+import bisect
+import json
+import time
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+TimeBound = Union[datetime, float, None]
+
+
+def _milliseconds(bound: TimeBound) -> Optional[int]:
+    """Epoch milliseconds for a datetime (naive = UTC) or epoch seconds"""
+    if bound is None:
+        return None
+    if isinstance(bound, datetime):
+        bound = (bound - datetime(1970, 1, 1, tzinfo=bound.tzinfo)).total_seconds()
+    return int(bound * 1000)
+
+
+class LogStream:
+    """Append-only capped log with time-range reads"""
+
+    def __init__(self, key: str, maxlen: int, fallback_maxlen: int):
+        self.key = key
+        self.maxlen = maxlen
+        self.redis_client = None
+        self._fallback = deque(maxlen=fallback_maxlen)
+        self._fallback_ids = deque(maxlen=fallback_maxlen)  # (ms, seq), ascending
+        self._last_ms = 0
+        self._seq = 0
+
+    def bind(self, redis_client):
+        """Use Redis from now on; None switches back to the in-memory fallback"""
+        self.redis_client = redis_client
+
+    def _next_id(self):
+        milliseconds = int(time.time() * 1000)
+        if milliseconds <= self._last_ms:
+            milliseconds, self._seq = self._last_ms, self._seq + 1
+        else:
+            self._seq = 0
+        self._last_ms = milliseconds
+        return milliseconds, self._seq
+
+    def add_to_pipeline(self, pipe, entries: Iterable[Dict[str, Any]]):
+        """Queue XADDs on a caller-owned Redis pipeline"""
+        for entry in entries:
+            pipe.xadd(self.key, {"data": json.dumps(entry, default=str)}, maxlen=self.maxlen, approximate=True)
+
+    async def add(self, entries: Iterable[Dict[str, Any]], pipe=None):
+        """Append entries: to Redis in one round trip, or to the in-memory fallback"""
+        if self.redis_client is None:
+            for entry in entries:
+                self._fallback_ids.append(self._next_id())
+                self._fallback.append(entry)
+            return
+        if pipe is not None:
+            self.add_to_pipeline(pipe, entries)
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        self.add_to_pipeline(pipe, entries)
+        await pipe.execute()
+
+    async def range(
+        self,
+        start: TimeBound = None,
+        end: TimeBound = None,
+        count: int = 100,
+        newest_first: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Entries between two times (inclusive), each with its stream `id`"""
+        low, high = _milliseconds(start), _milliseconds(end)
+        if self.redis_client is not None:
+            # A bare "<ms>" end bound matches every sequence number within that millisecond
+            low = "-" if low is None else f"{low}-0"
+            high = "+" if high is None else str(high)
+            if newest_first:
+                rows = await self.redis_client.xrevrange(self.key, max=high, min=low, count=count)
+            else:
+                rows = await self.redis_client.xrange(self.key, min=low, max=high, count=count)
+            return [{"id": entry_id, **json.loads(fields["data"])} for entry_id, fields in rows]
+
+        ids, entries = list(self._fallback_ids), list(self._fallback)
+        first = 0 if low is None else bisect.bisect_left(ids, (low, 0))
+        last = len(ids) if high is None else bisect.bisect_left(ids, (high + 1, 0))
+        selected = range(last - 1, first - 1, -1) if newest_first else range(first, last)
+        return [{"id": f"{ids[i][0]}-{ids[i][1]}", **entries[i]} for i in selected[:count]]
+
+    async def length(self) -> int:
+        if self.redis_client is not None:
+            return await self.redis_client.xlen(self.key)
+        return len(self._fallback)
+
+    def clear(self):
+        """Drop the in-memory fallback entries"""
+        self._fallback.clear()
+        self._fallback_ids.clear()
+
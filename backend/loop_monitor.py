@@ -0,0 +1,139 @@
+"""
+Event loop lag and blocking-call monitor.
+
+A probe coroutine sleeps for LOOP_LAG_PROBE_INTERVAL_MS and records how late
+it wakes up: the time every other coroutine also waited for the loop. A
+watchdog thread notices when the probe is overdue by more than
+LOOP_BLOCK_THRESHOLD_MS, i.e. the loop is stuck in one step (a synchronous
+DB call, bcrypt, a blocking client inside `async def`), and logs the loop
+thread's stack at that moment together with the task and route being run.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter as PrometheusCounter, Histogram
+
+from profiler import current_route
+
+LOOP_LAG_PROBE_INTERVAL_MS = float(os.getenv("LOOP_LAG_PROBE_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "250"))
+
+LOOP_LAG = Histogram(
+    'event_loop_lag_seconds', 'Delay of the event loop lag probe past its scheduled wake-up',
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_BLOCKS = PrometheusCounter('event_loop_blocked_total', 'Loop steps that blocked longer than LOOP_BLOCK_THRESHOLD_MS')
+
+logger = logging.getLogger(__name__)
+
+_STACK_LIMIT = 15
+
+
+class LoopMonitor:
+    """Lag probe on the loop plus a watchdog thread watching the probe"""
+
+    def __init__(
+        self,
+        interval_ms: float = LOOP_LAG_PROBE_INTERVAL_MS,
+        threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS,
+        history: int = 600
+    ):
+        self.interval = interval_ms / 1000
+        self.threshold = threshold_ms / 1000
+        self.blocks_total = 0
+        self._lags = deque(maxlen=history)
+        self._blocks = deque(maxlen=50)
+        self._due: Optional[float] = None
+        self._blocked_due: Optional[float] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._probe_task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start the probe on the running loop and the watchdog thread"""
+        if self._probe_task and not self._probe_task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._probe_task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._probe_task:
+            self._probe_task.cancel()
+
+    async def _probe(self):
+        while True:
+            due = self._due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(time.monotonic() - due, 0.0)
+            self._lags.append(lag)
+            LOOP_LAG.observe(lag)
+            if due == self._blocked_due:
+                # The stall the watchdog reported is over: record its full length
+                self._blocks[-1]['blocked_ms'] = round(lag * 1000, 1)
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            due = self._due
+            if due is None:
+                continue
+            overdue = time.monotonic() - due
+            if overdue >= self.threshold and due != self._blocked_due:
+                self._record_block(overdue)
+                self._blocked_due = due
+
+    def _record_block(self, overdue: float):
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = [
+            f"{'/'.join(entry.filename.split(os.sep)[-2:])}:{entry.lineno} {entry.name}: {entry.line}"
+            for entry in traceback.extract_stack(frame, limit=_STACK_LIMIT)
+        ] if frame is not None else []
+        task = asyncio.current_task(self._loop)
+        block = {
+            'detected_at': datetime.utcnow().isoformat(),
+            'blocked_ms': round(overdue * 1000, 1),
+            'task': task.get_coro().__qualname__ if task is not None else None,
+            'route': current_route(self._loop),
+            'stack': stack,
+        }
+        self._blocks.append(block)
+        self.blocks_total += 1
+        LOOP_BLOCKS.inc()
+        logger.warning(
+            f"Event loop blocked for {block['blocked_ms']:.0f}ms so far in {block['task']} ({block['route']}):\n"
+            + "\n".join(stack[-5:])
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Recent lag figures and blocking episodes"""
+        lags: List[float] = sorted(self._lags)
+        return {
+            'lag_ms': {
+                'last': round(self._lags[-1] * 1000, 2) if lags else None,
+                'p50': round(lags[len(lags) // 2] * 1000, 2) if lags else None,
+                'p99': round(lags[int(len(lags) * 0.99)] * 1000, 2) if lags else None,
+                'max': round(lags[-1] * 1000, 2) if lags else None,
+            },
+            'probe_interval_ms': self.interval * 1000,
+            'block_threshold_ms': self.threshold * 1000,
+            'blocks_total': self.blocks_total,
+            'recent_blocks': list(self._blocks)[::-1],
+        }
+
+# Global event loop monitor instance
+loop_monitor = LoopMonitor()
@@ -2,19 +2,27 @@ from fastapi import FastAPI, HTTPException, Depends, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.staticfiles import StaticFiles
-from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, multiprocess
 import uvicorn
 import os
 import asyncio
 from pathlib import Path
 
 # Import routers
-from routers import auth, tournaments, players, admin, ai
+from routers import auth, tournaments, players, admin, ai, notifications
 from routers.enhanced_admin import router as enhanced_admin_router
 from database import create_tables, get_db
-from analytics import analytics_manager, analytics_middleware
+from analytics import analytics_manager, AnalyticsMiddleware
+from sql_instrumentation import SQLInstrumentationMiddleware
+from partitioning import archival_loop
+from analytics_history import history_rollup_loop
+from services.notification_service import notification_service
 from discord_integration import discord_integration
-from websocket_routes import router as websocket_router
+from websocket_routes import router as websocket_router, start_pubsub, stop_pubsub
+
+# Set (to an empty, writable directory) when running several workers so /api/metrics
+# reports all of them; prometheus_client reads it at import time
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
 
 app = FastAPI(
     title="ClutchZone API",
@@ -34,7 +42,10 @@ app.add_middleware(
 )
 
 # Add analytics middleware
-app.middleware("http")(analytics_middleware)
+app.add_middleware(AnalyticsMiddleware)
+
+# Per-request SQL counting and N+1 detection (outermost so analytics can read the stats)
+app.add_middleware(SQLInstrumentationMiddleware)
 
 # Security
 security = HTTPBearer()
@@ -48,6 +59,7 @@ if frontend_path.exists():
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(tournaments.router, prefix="/api/tournaments", tags=["Tournaments"])
 app.include_router(players.router, prefix="/api/players", tags=["Players"])
+app.include_router(notifications.router, prefix="/api/notifications", tags=["Notifications"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(enhanced_admin_router, prefix="/api/admin/enhanced", tags=["Enhanced Admin"])
 app.include_router(ai.router, prefix="/api/ai", tags=["AI Assistant"])
@@ -61,9 +73,18 @@ async def startup_event():
     # Initialize analytics
     await analytics_manager.initialize()
     
+    # Relay WebSocket room and user messages between workers
+    await start_pubsub(analytics_manager.redis_client)
+    
     # Initialize Discord integration
     asyncio.create_task(discord_integration.initialize())
     
+    # Roll partitions forward and move cold rows into the archive tables
+    asyncio.create_task(archival_loop())
+    asyncio.create_task(notification_service.purge_loop())
+    # Compact analytics into the hourly/daily history tables
+    asyncio.create_task(history_rollup_loop())
+    
     print("🎮 ClutchZone API Server Started!")
     print("📊 Analytics system initialized")
     print("🤖 Discord integration ready")
@@ -72,6 +93,11 @@ async def startup_event():
 async def shutdown_event():
     """Clean up resources on shutdown"""
     await discord_integration.close()
+    await stop_pubsub()
+    await analytics_manager.close()
+    if PROMETHEUS_MULTIPROC_DIR:
+        # Drop this worker's live gauges from the aggregated scrape
+        multiprocess.mark_process_dead(os.getpid())
     print("👋 ClutchZone API Server Shutdown")
 
 @app.get("/")
@@ -95,7 +121,11 @@ async def health_check():
 
 @app.get("/api/metrics")
 async def get_metrics():
-    """Prometheus metrics endpoint"""
+    """Prometheus metrics endpoint, aggregated across workers in multiprocess mode"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 @app.get("/api/stats/realtime")
@@ -0,0 +1,155 @@
+"""
+Rolling time-bucketed API metrics.
+
+Each route gets a request count, 5xx count, latency sum and latency histogram
+per minute, plus per-status-code counts. Minute buckets are rolled up into hour
+buckets as they are written, so a 24h or 7d query merges a fixed number of
+slots however much traffic there was.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+
+# Upper bounds (seconds) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BOUNDS = np.array([0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0])
+
+COUNT, ERRORS, LATENCY_SUM, HISTOGRAM = 0, 1, 2, 3
+COLUMNS = HISTOGRAM + len(LATENCY_BOUNDS) + 1
+_STATUS_CODES = 600
+MINUTE_SLOTS = 120
+
+
+class _Tier:
+    """Ring of fixed-width time slots; a slot is zeroed when a newer period reuses it"""
+
+    def __init__(self, slots: int, width: int, routes: int):
+        self.width = width
+        self.stamps = np.full(slots, -1, dtype=np.int64)
+        self.route_stats = np.zeros((slots, routes, COLUMNS), dtype=np.float64)
+        self.status_counts = np.zeros((slots, _STATUS_CODES), dtype=np.int64)
+
+    def grow(self, routes: int):
+        extra = routes - self.route_stats.shape[1]
+        self.route_stats = np.pad(self.route_stats, ((0, 0), (0, extra), (0, 0)))
+
+    def add(self, epochs, route_ids, statuses, latencies, buckets):
+        periods = (epochs // self.width).astype(np.int64)
+        slots = periods % len(self.stamps)
+        for period in np.unique(periods):
+            slot = period % len(self.stamps)
+            if self.stamps[slot] < period:
+                self.stamps[slot] = period
+                self.route_stats[slot] = 0
+                self.status_counts[slot] = 0
+        # Rows older than what their slot now holds have aged out of this tier
+        keep = self.stamps[slots] == periods
+        slots, route_ids = slots[keep], route_ids[keep]
+        np.add.at(self.route_stats, (slots, route_ids, COUNT), 1)
+        np.add.at(self.route_stats, (slots, route_ids, ERRORS), statuses[keep] >= 500)
+        np.add.at(self.route_stats, (slots, route_ids, LATENCY_SUM), latencies[keep])
+        np.add.at(self.route_stats, (slots, route_ids, HISTOGRAM + buckets[keep]), 1)
+        np.add.at(self.status_counts, (slots, np.clip(statuses[keep], 0, _STATUS_CODES - 1)), 1)
+
+
+class MetricBuckets:
+    """Per-minute route metrics kept for `retention_hours` via minute and hour tiers"""
+
+    def __init__(self, retention_hours: int = 168, routes: int = 64):
+        self.retention_hours = retention_hours
+        self.minutes = _Tier(MINUTE_SLOTS, 60, routes)
+        self.hours = _Tier(retention_hours + 1, 3600, routes)
+
+    def add_batch(self, epochs, route_ids, statuses, latencies):
+        """Record a batch of requests; arrays are aligned per request"""
+        epochs = np.asarray(epochs, dtype=np.float64)
+        route_ids = np.asarray(route_ids, dtype=np.int64)
+        statuses = np.asarray(statuses, dtype=np.int64)
+        latencies = np.asarray(latencies, dtype=np.float64)
+        if not len(epochs):
+            return
+        needed = int(route_ids.max()) + 1
+        if needed > self.minutes.route_stats.shape[1]:
+            routes = max(needed, 2 * self.minutes.route_stats.shape[1])
+            self.minutes.grow(routes)
+            self.hours.grow(routes)
+        buckets = np.searchsorted(LATENCY_BOUNDS, latencies, side="left")
+        for tier in (self.minutes, self.hours):
+            tier.add(epochs, route_ids, statuses, latencies, buckets)
+
+    def query(self, hours: float, now: float) -> Dict[str, object]:
+        """Merged metrics for the last `hours` (whole minutes, capped at the retention)
+
+        Whole hours inside the window come from the hour tier and partial hours
+        from the minute tier. A window reaching past the minute tier starts at
+        the beginning of its first hour instead.
+        """
+        hours = min(hours, self.retention_hours)
+        last_minute = int(now // 60)
+        first_minute = last_minute - int(hours * 60) + 1
+        if first_minute <= last_minute - MINUTE_SLOTS:
+            first_minute -= first_minute % 60
+        first_hour = -(-first_minute // 60)
+        end_hour = max((last_minute + 1) // 60, first_hour)
+
+        hour_mask = (self.hours.stamps >= first_hour) & (self.hours.stamps < end_hour)
+        minute_stamps = self.minutes.stamps
+        minute_mask = (
+            (minute_stamps >= first_minute) & (minute_stamps <= last_minute)
+            & ~((minute_stamps >= first_hour * 60) & (minute_stamps < end_hour * 60))
+        )
+
+        route_stats = (
+            self.hours.route_stats[hour_mask].sum(axis=0) + self.minutes.route_stats[minute_mask].sum(axis=0)
+        )
+        status_counts = (
+            self.hours.status_counts[hour_mask].sum(axis=0) + self.minutes.status_counts[minute_mask].sum(axis=0)
+        )
+
+        hourly: Dict[int, int] = {}
+        for stamp, count in zip(self.hours.stamps[hour_mask], self.hours.route_stats[hour_mask, :, COUNT].sum(axis=1)):
+            hourly[int(stamp)] = int(count)
+        for stamp, count in zip(minute_stamps[minute_mask], self.minutes.route_stats[minute_mask, :, COUNT].sum(axis=1)):
+            hourly[int(stamp) // 60] = hourly.get(int(stamp) // 60, 0) + int(count)
+
+        return {
+            "route_stats": route_stats,
+            "status_counts": status_counts,
+            "hourly": {hour: count for hour, count in sorted(hourly.items()) if count},
+        }
+
+    def hour(self, hour: int) -> Optional[Dict[str, np.ndarray]]:
+        """Metrics of one hour period (epoch // 3600), or None once it left the hour tier"""
+        slot = hour % len(self.hours.stamps)
+        if self.hours.stamps[slot] != hour:
+            return None
+        return {"route_stats": self.hours.route_stats[slot], "status_counts": self.hours.status_counts[slot]}
+
+
+def histogram_percentile(histogram: np.ndarray, q: float) -> Optional[float]:
+    """Estimate the q-th percentile (0-100) from bucket counts, interpolating inside the bucket"""
+    total = histogram.sum()
+    if not total:
+        return None
+    cumulative = np.cumsum(histogram)
+    index = int(np.searchsorted(cumulative, total * q / 100, side="left"))
+    if index >= len(LATENCY_BOUNDS):
+        return float(LATENCY_BOUNDS[-1])
+    lower = float(LATENCY_BOUNDS[index - 1]) if index else 0.0
+    upper = float(LATENCY_BOUNDS[index])
+    before = cumulative[index - 1] if index else 0
+    fraction = (total * q / 100 - before) / histogram[index] if histogram[index] else 1.0
+    return lower + (upper - lower) * float(fraction)
+
+
+def route_summary(stats: np.ndarray) -> Dict[str, object]:
+    """Requests, errors, mean and tail latency for one route's merged row"""
+    count = int(stats[COUNT])
+    histogram = stats[HISTOGRAM:]
+    return {
+        "requests": count,
+        "errors": int(stats[ERRORS]),
+        "average_response_time": float(stats[LATENCY_SUM]) / count if count else 0,
+        "p95_response_time": histogram_percentile(histogram, 95),
+    }
+
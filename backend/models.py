@@ -1,22 +1,10 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker, relationship
+from sqlalchemy import Column, Integer, String, Date, DateTime, Boolean, Float, Text, ForeignKey, Index
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from datetime import datetime
-import os
 
-# Database configuration
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./clutchzone.db")
-
-# For PostgreSQL production
-if DATABASE_URL.startswith("postgresql"):
-    engine = create_engine(DATABASE_URL)
-else:
-    # SQLite for development
-    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
+# Engine, session factory and declarative base are shared with database.py
+from database import Base, engine, SessionLocal, get_db, create_tables
 
 # Database Models
 class User(Base):
@@ -98,6 +86,9 @@ class MatchResult(Base):
     submitted_at = Column(DateTime, default=func.now())
     verified_at = Column(DateTime, nullable=True)
     
+    # Archived rows keep their id, so SQLite must never hand out the highest id again
+    __table_args__ = {"sqlite_autoincrement": True}
+    
     # Relationships
     user = relationship("User", back_populates="match_results")
     tournament = relationship("Tournament", back_populates="match_results")
@@ -113,9 +104,19 @@ class Notification(Base):
     read = Column(Boolean, default=False)
     created_at = Column(DateTime, default=func.now())
     
+    # Inbox pages walk a user's notifications newest-first by id; ids are never reused (see MatchResult)
+    __table_args__ = (Index("ix_notifications_user_id_id", "user_id", "id"), {"sqlite_autoincrement": True})
+    
     # Relationships
     user = relationship("User", back_populates="notifications")
 
+class NotificationCounter(Base):
+    __tablename__ = "notification_counters"
+    
+    # One row per user, kept in step with notifications.read so unread counts are a key lookup
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    unread = Column(Integer, nullable=False, default=0)
+
 class Payment(Base):
     __tablename__ = "payments"
     
@@ -131,22 +132,59 @@ class Payment(Base):
     created_at = Column(DateTime, default=func.now())
     updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
     
+    # Ids are never reused once rows move to the archive (see MatchResult)
+    __table_args__ = {"sqlite_autoincrement": True}
+    
     # Relationships
     user = relationship("User", back_populates="payments")
     tournament = relationship("Tournament", back_populates="payments")
 
-# Database helper functions
-def get_db():
-    """Get database session"""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Historical analytics, compacted from the in-memory / Redis metrics by analytics_history.
+# Times are UTC; latency_histogram is a JSON list of bucket counts (metric_buckets.LATENCY_BOUNDS).
+class AnalyticsHourly(Base):
+    __tablename__ = "analytics_hourly"
+    
+    hour = Column(DateTime, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)
+    active_users = Column(Integer, nullable=True)
+
+class AnalyticsRouteHourly(Base):
+    __tablename__ = "analytics_route_hourly"
+    
+    hour = Column(DateTime, primary_key=True)
+    route = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)
+    latency_histogram = Column(Text, nullable=False, default="[]")
+    
+    # One route's history is a range read on (route, hour)
+    __table_args__ = (Index("ix_analytics_route_hourly_route_hour", "route", "hour"),)
+
+class AnalyticsDaily(Base):
+    __tablename__ = "analytics_daily"
+    
+    day = Column(Date, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)
+    active_users = Column(Integer, nullable=True)  # DAU; null when the unique-user sketches had expired
+    new_users = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
 
-def create_tables():
-    """Create all database tables"""
-    Base.metadata.create_all(bind=engine)
+class AnalyticsRouteDaily(Base):
+    __tablename__ = "analytics_route_daily"
+    
+    day = Column(Date, primary_key=True)
+    route = Column(String, primary_key=True)
+    requests = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    latency_sum = Column(Float, nullable=False, default=0.0)
+    latency_histogram = Column(Text, nullable=False, default="[]")
+    
+    __table_args__ = (Index("ix_analytics_route_daily_route_day", "route", "day"),)
 
 # Utility functions for XP and levels
 def calculate_level_from_xp(xp: int) -> int:
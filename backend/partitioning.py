@@ -0,0 +1,348 @@
+"""
+Time partitioning and archival for ClutchZone's append-heavy tables
+match_results, notifications and payments keep only recent rows in their hot
+tables. PostgreSQL gets native monthly range partitions; other databases
+(SQLite in development) get a rolling <table>_archive table. A chunked
+archival job moves cold rows out and archive_aware() keeps historical
+queries working across both.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import Column, Index, Table, column, event, select, insert, delete, table, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import aliased
+from sqlalchemy.schema import CreateTable
+
+from database import Base, engine
+
+logger = logging.getLogger(__name__)
+
+# Hot table -> time column it is partitioned on
+PARTITIONED_TABLES: Dict[str, str] = {
+    "match_results": "submitted_at",
+    "notifications": "created_at",
+    "payments": "created_at",
+}
+
+# Rows older than this many days leave the hot table
+HOT_RETENTION_DAYS: Dict[str, int] = {
+    "match_results": int(os.getenv("MATCH_RESULTS_HOT_DAYS", "180")),
+    "notifications": int(os.getenv("NOTIFICATIONS_HOT_DAYS", "30")),
+    "payments": int(os.getenv("PAYMENTS_HOT_DAYS", "365")),
+}
+
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "2000"))
+ARCHIVE_BATCH_PAUSE_SECONDS = float(os.getenv("ARCHIVE_BATCH_PAUSE_SECONDS", "0.05"))
+ARCHIVE_INTERVAL_SECONDS = int(os.getenv("ARCHIVE_INTERVAL_SECONDS", str(6 * 3600)))
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "2"))
+# Moving a partition locks the hot table; give up (and retry next run) rather than queue writers behind it
+ARCHIVE_LOCK_TIMEOUT_MS = int(os.getenv("ARCHIVE_LOCK_TIMEOUT_MS", "5000"))
+
+# Arbitrary constant for pg_try_advisory_lock so only one worker archives at a time
+_ARCHIVE_LOCK_KEY = 7_302_026
+
+
+def _archive_table(table: Table) -> Table:
+    """Cold copy of a hot table: same columns, no FKs, only the indexes history queries need"""
+    name = f"{table.name}_archive"
+    time_column = PARTITIONED_TABLES[table.name]
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, autoincrement=False) for c in table.columns]
+    indexes = [Index(f"ix_{name}_{time_column}", time_column)]
+    for column_name in ("user_id", "tournament_id"):
+        if column_name in table.c:
+            indexes.append(Index(f"ix_{name}_{column_name}", column_name))
+    return Table(name, Base.metadata, *columns, *indexes)
+
+
+def _hot_tables() -> Dict[str, Table]:
+    import models  # noqa: F401 - make sure the hot tables are registered
+    return {name: Base.metadata.tables[name] for name in PARTITIONED_TABLES}
+
+
+HOT_TABLES: Dict[str, Table] = _hot_tables()
+ARCHIVE_TABLES: Dict[str, Table] = {name: _archive_table(table) for name, table in HOT_TABLES.items()}
+_PARTITION_KEYS = {
+    **PARTITIONED_TABLES,
+    **{f"{name}_archive": column for name, column in PARTITIONED_TABLES.items()},
+}
+
+
+@compiles(CreateTable, "postgresql")
+def _create_partitioned_table(create, compiler, **kw):
+    """On PostgreSQL, declare hot and archive tables as PARTITION BY RANGE on their time column"""
+    ddl = compiler.visit_create_table(create, **kw)
+    time_column = _PARTITION_KEYS.get(create.element.name)
+    if not time_column:
+        return ddl
+    # The partition key has to be part of the primary key
+    ddl = ddl.replace("PRIMARY KEY (id)", f"PRIMARY KEY (id, {time_column})")
+    return ddl.rstrip().rstrip(";") + f" PARTITION BY RANGE ({time_column})\n\n"
+
+
+def _month_start(moment: datetime) -> datetime:
+    return datetime(moment.year, moment.month, 1)
+
+
+def _next_month(moment: datetime) -> datetime:
+    return datetime(moment.year + moment.month // 12, moment.month % 12 + 1, 1)
+
+
+def _partition_name(table_name: str, month: datetime) -> str:
+    return f"{table_name}_p{month.year}{month.month:02d}"
+
+
+def _partition_month(partition_name: str) -> Optional[datetime]:
+    suffix = partition_name.rsplit("_p", 1)[-1]
+    if len(suffix) != 6 or not suffix.isdigit():
+        return None
+    return datetime(int(suffix[:4]), int(suffix[4:]), 1)
+
+
+def _ensure_default_partition(conn, table_name: str):
+    conn.execute(text(f"CREATE TABLE IF NOT EXISTS {table_name}_default PARTITION OF {table_name} DEFAULT"))
+
+
+def ensure_partitions(conn, table_name: str, months_ahead: int = PARTITION_MONTHS_AHEAD):
+    """Create the current and upcoming monthly partitions plus a DEFAULT catch-all (PostgreSQL)"""
+    month = _month_start(datetime.utcnow())
+    for _ in range(months_ahead + 1):
+        upper = _next_month(month)
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {_partition_name(table_name, month)} PARTITION OF {table_name} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+        ))
+        month = upper
+    _ensure_default_partition(conn, table_name)
+
+
+def _create_initial_partitions(target, connection, **kw):
+    if connection.dialect.name == "postgresql":
+        ensure_partitions(connection, target.name, months_ahead=PARTITION_MONTHS_AHEAD)
+
+
+def _create_archive_default_partition(target, connection, **kw):
+    # Archive tables only get a catch-all: their monthly partitions are the hot ones, attached
+    # by the archival job, and a pre-created month would overlap them
+    if connection.dialect.name == "postgresql":
+        _ensure_default_partition(connection, target.name)
+
+
+for _table in HOT_TABLES.values():
+    event.listen(_table, "after_create", _create_initial_partitions)
+for _table in ARCHIVE_TABLES.values():
+    event.listen(_table, "after_create", _create_archive_default_partition)
+
+
+def hot_cutoff(table_name: str, now: datetime = None) -> datetime:
+    """Rows newer than this are guaranteed to still be in the hot table"""
+    return (now or datetime.utcnow()) - timedelta(days=HOT_RETENTION_DAYS[table_name])
+
+
+def archive_aware(model, since: Optional[datetime] = None):
+    """Entity to query in place of `model` that also sees archived rows
+
+    When the query window starts inside the hot retention period the hot
+    model is returned unchanged, so recent-data queries never touch the archive.
+    """
+    table = model.__table__
+    if since is not None and since >= hot_cutoff(table.name):
+        return model
+    archive = ARCHIVE_TABLES[table.name]
+    history = select(*table.c).union_all(
+        select(*[archive.c[column.name] for column in table.c])
+    ).subquery(f"{table.name}_history")
+    return aliased(model, history, adapt_on_names=True)
+
+
+def _is_partitioned(conn, table_name: str) -> bool:
+    return bool(conn.execute(
+        text("SELECT c.relkind = 'p' FROM pg_class c WHERE c.relname = :name"), {"name": table_name}
+    ).scalar())
+
+
+def _attached_partitions(conn, parent: str) -> List[str]:
+    return list(conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = :parent"
+    ), {"parent": parent}).scalars())
+
+
+def _add_bound_check(conn, partition: str, time_column: str, month: datetime, upper: datetime) -> str:
+    """Validated CHECK matching the partition bounds, so ATTACH can skip scanning the partition
+
+    NOT VALID plus VALIDATE only takes a SHARE UPDATE EXCLUSIVE lock, so
+    writes continue while the rows are checked.
+    """
+    constraint = f"{partition}_bounds"
+    conn.execute(text(f"ALTER TABLE {partition} DROP CONSTRAINT IF EXISTS {constraint}"))
+    conn.execute(text(
+        f"ALTER TABLE {partition} ADD CONSTRAINT {constraint} CHECK ({time_column} IS NOT NULL AND "
+        f"{time_column} >= '{month:%Y-%m-%d}' AND {time_column} < '{upper:%Y-%m-%d}') NOT VALID"
+    ))
+    conn.execute(text(f"ALTER TABLE {partition} VALIDATE CONSTRAINT {constraint}"))
+    return constraint
+
+
+def _absorb_archived_rows(conn, archive_name: str, partition: str, time_column: str, month: datetime, upper: datetime):
+    """Move rows the archive already holds for this month into the partition, or ATTACH fails on the overlap
+
+    Earlier versions of this job row-copied cold rows of partly cold months
+    into the archive's DEFAULT partition and pre-created monthly archive
+    partitions.
+    """
+    bounds = {"lower": month, "upper": upper}
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {archive_name}_default "
+        f"WHERE {time_column} >= :lower AND {time_column} < :upper RETURNING *) "
+        f"INSERT INTO {partition} SELECT * FROM moved"
+    ), bounds)
+    stale = _partition_name(archive_name, month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": stale}).scalar() is not None:
+        conn.execute(text(f"INSERT INTO {partition} SELECT * FROM {stale}"))
+        conn.execute(text(f"DROP TABLE {stale}"))
+
+
+def _archive_partitions(table_name: str, cutoff: datetime) -> int:
+    """Move whole monthly partitions that ended before the cutoff into the archive (metadata only)
+
+    DETACH and ATTACH run in one transaction, so a partition that cannot be
+    attached stays in the hot table instead of vanishing from both.
+    DETACH ... CONCURRENTLY is not usable: it cannot run in a transaction
+    and PostgreSQL refuses it while the table has a DEFAULT partition.
+    """
+    archive_name = f"{table_name}_archive"
+    time_column = PARTITIONED_TABLES[table_name]
+    moved = 0
+    with engine.connect() as conn:
+        partitions = _attached_partitions(conn, table_name)
+    for partition in partitions:
+        month = _partition_month(partition)
+        if month is None or _next_month(month) > cutoff:
+            continue
+        upper = _next_month(month)
+        try:
+            with engine.connect() as conn:
+                constraint = _add_bound_check(
+                    conn.execution_options(isolation_level="AUTOCOMMIT"), partition, time_column, month, upper
+                )
+            with engine.begin() as conn:
+                conn.execute(text(f"SET LOCAL lock_timeout = '{ARCHIVE_LOCK_TIMEOUT_MS}ms'"))
+                conn.execute(text(f"ALTER TABLE {table_name} DETACH PARTITION {partition}"))
+                _absorb_archived_rows(conn, archive_name, partition, time_column, month, upper)
+                conn.execute(text(
+                    f"ALTER TABLE {archive_name} ATTACH PARTITION {partition} "
+                    f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"
+                ))
+                conn.execute(text(f"ALTER TABLE {partition} DROP CONSTRAINT {constraint}"))
+        except DBAPIError as e:
+            logger.error(f"Could not archive partition {partition}; it stays in {table_name}: {e}")
+            continue
+        moved += 1
+        logger.info(f"Archived partition {partition}")
+    with engine.begin() as conn:
+        ensure_partitions(conn, table_name)
+        _ensure_default_partition(conn, archive_name)
+    return moved
+
+
+def _archive_rows(
+    table_name: str,
+    cutoff: datetime,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    source_name: Optional[str] = None
+) -> int:
+    """Copy-then-delete cold rows in short, separate transactions so writers are never blocked for long
+
+    `source_name` restricts the move to one partition of the hot table.
+    """
+    hot = HOT_TABLES[table_name]
+    archive = ARCHIVE_TABLES[table_name]
+    source = table(source_name, *[column(c.name) for c in hot.c]) if source_name else hot
+    time_column = source.c[PARTITIONED_TABLES[table_name]]
+    moved = 0
+    while True:
+        with engine.begin() as conn:
+            ids = list(conn.execute(
+                select(source.c.id).where(time_column < cutoff).order_by(source.c.id).limit(batch_size)
+            ).scalars())
+            if not ids:
+                break
+            conn.execute(insert(archive).from_select(
+                [c.name for c in hot.c],
+                select(*source.c).where(source.c.id.in_(ids))
+            ))
+            conn.execute(delete(source).where(source.c.id.in_(ids)))
+        moved += len(ids)
+        if len(ids) < batch_size:
+            break
+        time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+    return moved
+
+
+def run_archival(now: datetime = None) -> Dict[str, int]:
+    """Move cold rows of every partitioned table into its archive; returns rows (or partitions) moved"""
+    results = {}
+    with engine.connect() as lock_conn:
+        if lock_conn.dialect.name == "postgresql":
+            if not lock_conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _ARCHIVE_LOCK_KEY}).scalar():
+                logger.info("Archival already running in another worker")
+                return results
+        try:
+            for table_name in PARTITIONED_TABLES:
+                cutoff = hot_cutoff(table_name, now)
+                if lock_conn.dialect.name == "postgresql" and _is_partitioned(lock_conn, table_name):
+                    results[f"{table_name}_partitions"] = _archive_partitions(table_name, cutoff)
+                    # Rows outside the monthly partitions; partly cold months wait to move as a whole
+                    results[table_name] = _archive_rows(table_name, cutoff, source_name=f"{table_name}_default")
+                else:
+                    results[table_name] = _archive_rows(table_name, cutoff)
+        finally:
+            if lock_conn.dialect.name == "postgresql":
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _ARCHIVE_LOCK_KEY})
+    logger.info(f"Archival finished: {results}")
+    return results
+
+
+def purge_archive(table_name: str, older_than: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """Permanently drop archived rows older than `older_than`; returns rows (or partitions) removed"""
+    archive = ARCHIVE_TABLES[table_name]
+    time_column = archive.c[PARTITIONED_TABLES[table_name]]
+    removed = 0
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conn:
+            conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+            if _is_partitioned(conn, archive.name):
+                for partition in _attached_partitions(conn, archive.name):
+                    month = _partition_month(partition)
+                    if month is not None and _next_month(month) <= older_than:
+                        conn.execute(text(f"DROP TABLE {partition}"))
+                        removed += 1
+    while True:
+        with engine.begin() as conn:
+            ids = list(conn.execute(
+                select(archive.c.id).where(time_column < older_than).limit(batch_size)
+            ).scalars())
+            if ids:
+                conn.execute(delete(archive).where(archive.c.id.in_(ids)))
+        removed += len(ids)
+        if len(ids) < batch_size:
+            return removed
+        time.sleep(ARCHIVE_BATCH_PAUSE_SECONDS)
+
+
+async def archival_loop():
+    """Background task: roll partitions forward and archive cold rows off the event loop"""
+    while True:
+        try:
+            await asyncio.to_thread(run_archival)
+        except Exception as e:
+            logger.error(f"Error during archival: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
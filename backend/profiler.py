@@ -0,0 +1,135 @@
+"""
+On-demand statistical profiler for a running worker.
+
+A daemon thread samples every thread's stack (sys._current_frames) at a
+fixed rate for a bounded time and counts collapsed stacks, the
+`frame;frame;frame count` format flamegraph.pl, speedscope and inferno read.
+Nothing is traced in between samples, so the cost is one stack walk per
+thread per sample.
+
+Samples taken on the event loop thread are attributed to the request being
+run at that moment: AnalyticsMiddleware registers each request's task with
+track_request, and the sampler looks up the loop's current task.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+PROFILER_MAX_SECONDS = int(os.getenv("PROFILER_MAX_SECONDS", "60"))
+
+_MAX_DEPTH = 128
+
+# Request handling task -> ASGI scope; the matched route appears in the scope once routing ran
+_active_scopes: Dict[asyncio.Task, Dict[str, Any]] = {}
+
+
+@contextmanager
+def track_request(scope: Dict[str, Any]):
+    """Make the current task's request visible to the profiler"""
+    task = asyncio.current_task()
+    if task is not None:
+        _active_scopes[task] = scope
+    try:
+        yield
+    finally:
+        if task is not None:
+            _active_scopes.pop(task, None)
+
+
+def _frame_name(frame) -> str:
+    path = frame.f_code.co_filename
+    return f"{'/'.join(path.split(os.sep)[-2:])}:{frame.f_code.co_name}".replace(";", ":").replace(" ", "_")
+
+
+def _collapse(frame) -> list:
+    names = []
+    while frame is not None and len(names) < _MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return names
+
+
+def current_route(loop: asyncio.AbstractEventLoop) -> Optional[str]:
+    """Method and route template of the request the loop is running now, if any; safe from any thread"""
+    task = asyncio.current_task(loop)
+    scope = _active_scopes.get(task) if task is not None else None
+    if scope is None:
+        return None
+    route = getattr(scope.get("route"), "path", None) or "unmatched"
+    return f"{scope.get('method', '')} {route}"
+
+
+class SamplingProfiler:
+    """One time-boxed profile at a time per worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    async def profile(self, seconds: float, hz: int, attribute_routes: bool = True) -> Dict[str, Any]:
+        """Sample all threads for `seconds` at `hz`; raises RuntimeError if a profile is running"""
+        seconds = min(seconds, PROFILER_MAX_SECONDS)
+        stacks: Counter = Counter()
+        routes: Counter = Counter()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.running:
+                raise RuntimeError("A profile is already running in this worker")
+            self._thread = threading.Thread(
+                target=self._sample,
+                args=(stacks, routes, time.monotonic() + seconds, 1 / hz, loop if attribute_routes else None,
+                      threading.get_ident()),
+                name="sampling-profiler",
+                daemon=True
+            )
+            self._thread.start()
+        await asyncio.sleep(seconds)
+        await asyncio.to_thread(self._thread.join)
+
+        functions: Counter = Counter()
+        for stack, count in stacks.items():
+            functions[stack.rpartition(";")[2]] += count
+        return {
+            'pid': os.getpid(),
+            'seconds': seconds,
+            'hz': hz,
+            'samples': sum(stacks.values()),
+            'routes': dict(routes.most_common(20)),
+            'top_functions': dict(functions.most_common(20)),
+            'collapsed': "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+        }
+
+    @staticmethod
+    def _sample(stacks: Counter, routes: Counter, deadline: float, interval: float, loop, loop_thread_id: int):
+        own_id = threading.get_ident()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        next_sample = time.monotonic()
+        while next_sample < deadline:
+            route = current_route(loop) if loop is not None else None
+            if route:
+                routes[route] += 1
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                if thread_id not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                root = [names.get(thread_id, str(thread_id)).replace(" ", "_")]
+                if route and thread_id == loop_thread_id:
+                    root.append(f"route:{route}".replace(";", ":").replace(" ", "_"))
+                stacks[";".join(root + _collapse(frame))] += 1
+            next_sample += interval
+            time.sleep(max(0.0, next_sample - time.monotonic()))
+
+# Global profiler instance
+sampling_profiler = SamplingProfiler()
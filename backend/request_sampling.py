@@ -0,0 +1,146 @@
+"""
+Tail-based sampling of request detail.
+
+Every request feeds the cheap aggregates (Prometheus, the stats backend).
+Full detail — route, SQL count and time, outbound calls and, for slow
+requests, a stack summary — is kept only for a random REQUEST_SAMPLE_RATE
+share of requests and for every request slower than SLOW_REQUEST_THRESHOLD_MS.
+The decision is taken when the request finishes, so no slow request is missed.
+
+While a request runs, its RequestTrace collects outbound calls. If the
+request is still running at the threshold, a loop timer records the await
+chain it is suspended in: the line the time is being spent on.
+"""
+
+import asyncio
+import os
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from prometheus_client import Counter as PrometheusCounter, Histogram
+
+REQUEST_SAMPLE_RATE = float(os.getenv("REQUEST_SAMPLE_RATE", "0.01"))
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv("SLOW_REQUEST_THRESHOLD_MS", "500"))
+SLOW_REQUEST_STORE_SIZE = int(os.getenv("SLOW_REQUEST_STORE_SIZE", "1000"))
+
+REQUESTS_KEPT = PrometheusCounter('requests_detail_kept_total', 'Requests whose full detail was kept', ['reason'])
+OUTBOUND_CALL_DURATION = Histogram(
+    'outbound_call_duration_seconds', 'Calls to external services', ['service'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+_MAX_OUTBOUND_CALLS = 50
+_MAX_STACK_FRAMES = 20
+
+
+def _await_chain(coro) -> List[str]:
+    """`file:line function` for the innermost coroutines of an await chain, outermost first
+
+    Task.get_stack() only reports the task's own coroutine; following
+    cr_await reaches the frame that is actually waiting.
+    """
+    frames = []
+    while coro is not None and len(frames) < 200:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        path = frame.f_code.co_filename
+        frames.append(f"{os.sep.join(path.split(os.sep)[-2:])}:{frame.f_lineno} {frame.f_code.co_name}")
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return frames[-_MAX_STACK_FRAMES:]
+
+
+class RequestTrace:
+    """Detail collected while one request runs"""
+
+    __slots__ = ("outbound_calls", "stack", "_timer")
+
+    def __init__(self):
+        self.outbound_calls: List[Dict[str, Any]] = []
+        self.stack: Optional[List[str]] = None
+        self._timer = None
+
+    def _capture_stack(self, task: asyncio.Task):
+        if not task.done():
+            self.stack = _await_chain(task.get_coro())
+
+    def detail(self, query_stats=None) -> Dict[str, Any]:
+        """The trace plus the request's SQL stats, ready to log"""
+        detail = {'outbound_calls': self.outbound_calls, 'stack': self.stack}
+        if query_stats is not None:
+            detail['sql_count'] = query_stats.count
+            detail['sql_time_ms'] = round(query_stats.total_time * 1000, 2)
+            detail['sql_top'] = [
+                {'count': count, 'statement': shape[:200]} for shape, count in query_stats.shapes.most_common(3)
+            ]
+        return detail
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("request_trace", default=None)
+
+
+def current_trace() -> Optional[RequestTrace]:
+    """Trace of the request being handled, if any"""
+    return _current_trace.get()
+
+
+@contextmanager
+def trace_request():
+    """Collect a RequestTrace for the wrapped request handling"""
+    trace = RequestTrace()
+    token = _current_trace.set(trace)
+    task = asyncio.current_task()
+    if task is not None and SLOW_REQUEST_THRESHOLD_MS > 0:
+        trace._timer = asyncio.get_running_loop().call_later(
+            SLOW_REQUEST_THRESHOLD_MS / 1000, trace._capture_stack, task
+        )
+    try:
+        yield trace
+    finally:
+        if trace._timer is not None:
+            trace._timer.cancel()
+        _current_trace.reset(token)
+
+
+@contextmanager
+def outbound_call(service: str, operation: str = ""):
+    """Time a call to an external service and attach it to the current request's trace
+
+    Usage:
+        with outbound_call("discord", "webhook"):
+            async with session.post(url, json=payload) as response:
+                ...
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        OUTBOUND_CALL_DURATION.labels(service=service).observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None and len(trace.outbound_calls) < _MAX_OUTBOUND_CALLS:
+            trace.outbound_calls.append({
+                'service': service,
+                'operation': operation,
+                'duration_ms': round(elapsed * 1000, 2),
+                'error': error
+            })
+
+
+def keep_reason(process_time: float) -> Optional[str]:
+    """Whether a finished request keeps its full detail: "slow", "sampled" or None"""
+    if process_time * 1000 >= SLOW_REQUEST_THRESHOLD_MS:
+        reason = "slow"
+    elif random.random() < REQUEST_SAMPLE_RATE:
+        reason = "sampled"
+    else:
+        return None
+    REQUESTS_KEPT.labels(reason=reason).inc()
+    return reason
@@ -0,0 +1,114 @@
+"""
+Background sampler for server resource usage.
+
+psutil calls such as cpu_percent(interval=1) block for their whole interval.
+A daemon thread takes the samples instead and keeps the latest snapshot plus
+a short history, so request handlers and background tasks read cached values.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import psutil
+from prometheus_client import Gauge
+
+SERVER_SAMPLE_INTERVAL_SECONDS = float(os.getenv("SERVER_SAMPLE_INTERVAL_SECONDS", "5"))
+SERVER_SAMPLE_HISTORY = int(os.getenv("SERVER_SAMPLE_HISTORY", "120"))
+
+# Per worker (pid label) under Prometheus multiprocess mode
+SERVER_RESOURCES = Gauge('server_resources', 'Server resource usage', ['resource'], multiprocess_mode='liveall')
+
+logger = logging.getLogger(__name__)
+
+
+class ResourceSampler:
+    """Samples CPU, memory, disk, file descriptors and process RSS on a daemon thread"""
+
+    def __init__(self, interval: float = SERVER_SAMPLE_INTERVAL_SECONDS, history: int = SERVER_SAMPLE_HISTORY):
+        self.interval = interval
+        self.boot_time = psutil.boot_time()
+        self._process = psutil.Process()
+        self._history = deque(maxlen=history)
+        self._latest: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Take a first sample and start the thread; safe to call more than once"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            # Prime the CPU counters: the first cpu_percent(None) call always returns 0.0
+            psutil.cpu_percent(interval=None)
+            self._process.cpu_percent(interval=None)
+            self._record(self._sample())
+            self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self._record(self._sample())
+            except Exception as e:
+                logger.error(f"Error sampling server resources: {e}")
+
+    def _sample(self) -> Dict[str, Any]:
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        processes = [self._process] + self._process.children(recursive=True)
+        process_rss = []
+        for process in processes:
+            try:
+                process_rss.append({'pid': process.pid, 'rss_mb': process.memory_info().rss / (1024**2)})
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        try:
+            open_fds = self._process.num_fds()
+        except AttributeError:  # Windows
+            open_fds = self._process.num_handles()
+
+        return {
+            'timestamp': time.time(),
+            # Non-blocking: utilisation since the previous sample
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'process_cpu_percent': self._process.cpu_percent(interval=None),
+            'memory_percent': memory.percent,
+            'memory_available_gb': memory.available / (1024**3),
+            'disk_percent': disk.percent,
+            'disk_free_gb': disk.free / (1024**3),
+            'open_fds': open_fds,
+            'threads': self._process.num_threads(),
+            'process_rss_mb': process_rss[0]['rss_mb'] if process_rss else 0,
+            'processes': process_rss,
+        }
+
+    def _record(self, sample: Dict[str, Any]):
+        self._latest = sample
+        self._history.append(sample)
+        SERVER_RESOURCES.labels(resource='cpu_percent').set(sample['cpu_percent'])
+        SERVER_RESOURCES.labels(resource='memory_percent').set(sample['memory_percent'])
+        SERVER_RESOURCES.labels(resource='disk_percent').set(sample['disk_percent'])
+        SERVER_RESOURCES.labels(resource='open_fds').set(sample['open_fds'])
+        SERVER_RESOURCES.labels(resource='process_rss_mb').set(sample['process_rss_mb'])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest sample; starts the sampler on first use"""
+        if self._latest is None:
+            self.start()
+        return self._latest
+
+    def history(self) -> List[Dict[str, Any]]:
+        """Recent samples, oldest first (SERVER_SAMPLE_HISTORY x SERVER_SAMPLE_INTERVAL_SECONDS)"""
+        return list(self._history)
+
+# Global resource sampler instance
+resource_sampler = ResourceSampler()
@@ -7,8 +7,9 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db
+from database import get_db, get_read_db
 from models import User, Tournament, Registration, MatchResult, Payment
+from partitioning import archive_aware
 from schemas import (
     TournamentCreate, TournamentResponse, AdminTournamentUpdate,
     AdminUserUpdate, AdminStats, SuccessResponse
@@ -17,9 +18,13 @@ import auth
 
 router = APIRouter()
 
+# Revenue and results are all-time figures, so include rows the archival job has moved out
+MatchResultHistory = archive_aware(MatchResult)
+PaymentHistory = archive_aware(Payment)
+
 @router.get("/stats", response_model=AdminStats)
 async def get_admin_stats(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get admin dashboard statistics"""
@@ -39,16 +44,17 @@ async def get_admin_stats(
     total_registrations = db.query(Registration).count()
     
     # Get total revenue
-    total_revenue = db.query(func.sum(Payment.amount)).filter(
-        Payment.status == "completed",
-        Payment.type == "entry_fee"
+    total_revenue = db.query(func.sum(PaymentHistory.amount)).filter(
+        PaymentHistory.status == "completed",
+        PaymentHistory.type == "entry_fee"
     ).scalar() or 0.0
     
     # Calculate average participants per tournament
-    avg_participants = db.query(func.avg(
-        func.count(Registration.id)
-    )).select_from(Registration).group_by(
-        Registration.tournament_id
+    participants_per_tournament = db.query(
+        func.count(Registration.id).label("participants")
+    ).group_by(Registration.tournament_id).subquery()
+    avg_participants = db.query(
+        func.avg(participants_per_tournament.c.participants)
     ).scalar() or 0.0
     
     return AdminStats(
@@ -64,7 +70,7 @@ async def get_admin_stats(
 async def get_all_tournaments(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get all tournaments for admin"""
@@ -181,7 +187,7 @@ async def get_all_users(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get all users for admin"""
@@ -203,9 +209,9 @@ async def get_all_users(
             Registration.user_id == user.id
         ).count()
         
-        total_wins = db.query(MatchResult).filter(
-            MatchResult.user_id == user.id,
-            MatchResult.rank == 1
+        total_wins = db.query(MatchResultHistory).filter(
+            MatchResultHistory.user_id == user.id,
+            MatchResultHistory.rank == 1
         ).count()
         
         user_dict = user.__dict__.copy()
@@ -273,7 +279,7 @@ async def deactivate_user(
 @router.get("/tournaments/{tournament_id}/results", response_model=List[dict])
 async def get_tournament_results(
     tournament_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get tournament results"""
@@ -285,11 +291,11 @@ async def get_tournament_results(
             detail="Tournament not found"
         )
     
-    results = db.query(MatchResult, User).join(
-        User, MatchResult.user_id == User.id
+    results = db.query(MatchResultHistory, User).join(
+        User, MatchResultHistory.user_id == User.id
     ).filter(
-        MatchResult.tournament_id == tournament_id
-    ).order_by(MatchResult.rank).all()
+        MatchResultHistory.tournament_id == tournament_id
+    ).order_by(MatchResultHistory.rank).all()
     
     result_list = []
     for result, user in results:
@@ -337,7 +343,7 @@ async def verify_result(
 async def get_all_payments(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get all payments for admin"""
@@ -1,5 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime, timedelta
 from typing import List
 
@@ -7,7 +9,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db
+from database import get_db, get_async_db
 from models import User, calculate_level_from_xp
 from schemas import (
     UserCreate, UserLogin, UserResponse, Token, UsernameCheck,
@@ -20,18 +22,18 @@ from services.discord_service import discord_service
 router = APIRouter()
 
 @router.post("/register", response_model=Token)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     
     # Check if username is available
-    if not auth.check_username_availability(db, user.username):
+    if not await auth.check_username_availability(db, user.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username is already taken"
         )
     
     # Check if email is available
-    if not auth.check_email_availability(db, user.email):
+    if not await auth.check_email_availability(db, user.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email is already registered"
@@ -57,8 +59,8 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Send welcome email - convert to string values
     try:
@@ -95,11 +97,11 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
     }
 
 @router.post("/login", response_model=Token)
-async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user"""
     
     # Authenticate user
-    user = auth.authenticate_user(db, user_credentials.username, user_credentials.password)
+    user = await auth.authenticate_user(db, user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -124,15 +126,15 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     level_up = new_level > current_level
     
     # Update user data using SQLAlchemy update
-    db.query(User).filter(User.id == user.id).update({
+    await db.execute(update(User).where(User.id == user.id).values({
         User.xp: new_xp,
         User.level: new_level,
         User.last_login: datetime.utcnow()
-    })
-    db.commit()
+    }))
+    await db.commit()
     
     # Refresh the user object to get updated values
-    db.refresh(user)
+    await db.refresh(user)
     
     # Create access token
     token_expires = timedelta(minutes=30 * 24 * 60) if user_credentials.remember_me else timedelta(minutes=60)
@@ -151,7 +153,7 @@ async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     }
 
 @router.post("/check-username", response_model=UsernameCheckResponse)
-async def check_username(username_data: UsernameCheck, db: Session = Depends(get_db)):
+async def check_username(username_data: UsernameCheck, db: AsyncSession = Depends(get_async_db)):
     """Check if username is available"""
     
     if len(username_data.username) < 3:
@@ -166,7 +168,7 @@ async def check_username(username_data: UsernameCheck, db: Session = Depends(get
             message="Username can only contain letters, numbers, and underscores"
         )
     
-    available = auth.check_username_availability(db, username_data.username)
+    available = await auth.check_username_availability(db, username_data.username)
     
     return UsernameCheckResponse(
         available=available,
@@ -174,7 +176,7 @@ async def check_username(username_data: UsernameCheck, db: Session = Depends(get
     )
 
 @router.post("/check-email", response_model=UsernameCheckResponse)
-async def check_email(email_data: dict, db: Session = Depends(get_db)):
+async def check_email(email_data: dict, db: AsyncSession = Depends(get_async_db)):
     """Check if email is available"""
     
     email = email_data.get("email")
@@ -184,7 +186,7 @@ async def check_email(email_data: dict, db: Session = Depends(get_db)):
             message="Email is required"
         )
     
-    available = auth.check_email_availability(db, email)
+    available = await auth.check_email_availability(db, email)
     
     return UsernameCheckResponse(
         available=available,
@@ -3,32 +3,44 @@ Enhanced Admin API Routes for ClutchZone
 Comprehensive admin panel with tournament management, analytics, and feature controls
 """
 
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
+from fastapi.responses import PlainTextResponse
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import func, desc, and_, or_
 from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 import json
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db
+from database import get_db, get_read_db, get_async_db, get_async_read_db
 from models import User, Tournament, Registration, MatchResult, Payment
+from partitioning import archive_aware
+from profiler import sampling_profiler, PROFILER_MAX_SECONDS
 from schemas import (
     TournamentCreate, TournamentResponse, AdminTournamentUpdate,
     AdminUserUpdate, AdminStats, SuccessResponse
 )
 import auth
-from analytics import analytics_manager
+from analytics import analytics_manager, ANALYTICS_ROLLUP_HOURS
+from analytics_history import get_history, get_route_history
 from discord_integration import discord_integration
+from services.notification_service import notification_service
 
 router = APIRouter()
 
+# Revenue and winnings are all-time figures, so include archived payments
+PaymentHistory = archive_aware(Payment)
+
+# Announcement target_audience -> user role (None means everyone)
+ANNOUNCEMENT_AUDIENCES = {"all": None, "players": "player", "moderators": "moderator", "admins": "admin"}
+
 @router.get("/dashboard", response_model=Dict[str, Any])
 async def get_admin_dashboard(
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get comprehensive admin dashboard data"""
@@ -49,9 +61,9 @@ async def get_admin_dashboard(
     total_registrations = db.query(Registration).count()
     
     # Revenue stats
-    total_revenue = db.query(func.sum(Payment.amount)).filter(
-        Payment.status == "completed",
-        Payment.type == "entry_fee"
+    total_revenue = db.query(func.sum(PaymentHistory.amount)).filter(
+        PaymentHistory.status == "completed",
+        PaymentHistory.type == "entry_fee"
     ).scalar() or 0.0
     
     # Recent activity
@@ -225,7 +237,7 @@ async def get_all_tournaments(
     limit: int = 100,
     status_filter: Optional[str] = None,
     game_filter: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get all tournaments with filters"""
@@ -248,7 +260,7 @@ async def get_all_users(
     limit: int = 100,
     search: Optional[str] = None,
     active_only: bool = True,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Get all users with search and filters"""
@@ -272,10 +284,10 @@ async def get_all_users(
     user_data = []
     for user in users:
         tournament_count = db.query(Registration).filter(Registration.user_id == user.id).count()
-        total_winnings = db.query(func.sum(Payment.amount)).filter(
-            Payment.user_id == user.id,
-            Payment.type == "prize_payout",
-            Payment.status == "completed"
+        total_winnings = db.query(func.sum(PaymentHistory.amount)).filter(
+            PaymentHistory.user_id == user.id,
+            PaymentHistory.type == "prize_payout",
+            PaymentHistory.status == "completed"
         ).scalar() or 0.0
         
         user_data.append({
@@ -330,10 +342,10 @@ async def update_user(
 
 @router.get("/analytics/api")
 async def get_api_analytics(
-    hours: int = 24,
+    hours: int = Query(24, ge=1, le=ANALYTICS_ROLLUP_HOURS),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
-    """Get detailed API analytics"""
+    """Get detailed API analytics for the last `hours` (up to 7 days by default)"""
     return await analytics_manager.get_api_analytics(hours)
 
 @router.get("/analytics/realtime")
@@ -345,10 +357,50 @@ async def get_realtime_analytics(
 
 @router.get("/analytics/server")
 async def get_server_analytics(
+    history: bool = False,
+    current_user: User = Depends(auth.get_current_admin_user)
+):
+    """Get server performance metrics; `history=true` adds the recent samples"""
+    return await analytics_manager.get_server_metrics(include_history=history)
+
+def _history_range(start: Optional[date], end: Optional[date], granularity: str):
+    """Default to the last 30 days; hourly reads are limited to 31 days"""
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=30)
+    if start > end:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="start must not be after end")
+    if granularity == "hour" and (end - start).days > 31:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Hourly history is limited to 31 days")
+    return start, end
+
+@router.get("/analytics/history")
+async def get_analytics_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|hour)$"),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
-    """Get server performance metrics"""
-    return await analytics_manager.get_server_metrics()
+    """Long-term totals per day (DAU, new users, revenue) or per hour, from the history tables"""
+    start, end = _history_range(start, end, granularity)
+    return {"granularity": granularity, "history": await get_history(db, start, end, granularity)}
+
+@router.get("/analytics/history/routes")
+async def get_analytics_route_history(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    granularity: str = Query("day", pattern="^(day|hour)$"),
+    route: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(auth.get_current_admin_user)
+):
+    """Busiest routes over the range, or one route's series when `route` (e.g. `GET:/api/tournaments/`) is given"""
+    start, end = _history_range(start, end, granularity)
+    return {
+        "granularity": granularity,
+        "routes": await get_route_history(db, start, end, granularity, route, limit)
+    }
 
 @router.post("/features/toggle")
 async def toggle_feature(
@@ -373,19 +425,34 @@ async def toggle_feature(
 async def create_announcement(
     title: str,
     message: str,
+    background_tasks: BackgroundTasks,
     priority: str = "normal",
     target_audience: str = "all",
-    background_tasks: BackgroundTasks,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Create a platform-wide announcement"""
     
+    if target_audience not in ANNOUNCEMENT_AUDIENCES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"target_audience must be one of: {', '.join(ANNOUNCEMENT_AUDIENCES)}"
+        )
+    
+    # One INSERT ... SELECT into every recipient's inbox
+    recipients = await notification_service.fan_out(
+        db, title, message,
+        type="warning" if priority == "high" else "info",
+        role=ANNOUNCEMENT_AUDIENCES[target_audience]
+    )
+    await db.commit()
+    
     announcement_data = {
         "title": title,
         "message": message,
         "priority": priority,
         "target_audience": target_audience,
+        "recipients": recipients,
         "created_by": current_user.username,
         "created_at": datetime.utcnow().isoformat()
     }
@@ -402,20 +469,63 @@ async def create_announcement(
 
 @router.get("/logs/recent")
 async def get_recent_logs(
-    count: int = 100,
+    count: int = Query(100, ge=1, le=1000),
     log_type: Optional[str] = None,
+    source: str = Query("api", pattern="^(api|discord)$"),
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
     current_user: User = Depends(auth.get_current_admin_user)
 ):
-    """Get recent system logs"""
-    
-    # This would return recent logs from the analytics system
-    logs = analytics_manager.access_logs[-count:] if analytics_manager.access_logs else []
+    """Get recent API access or Discord activity logs, newest first
+
+    API logs hold the sampled and slow requests (full detail is tail-sampled).
+    `start` and `end` (UTC) limit the results to a time range.
+    """
+    stream = analytics_manager.api_log_stream if source == "api" else analytics_manager.discord_log_stream
+    logs = await stream.range(start=start, end=end, count=count, newest_first=True)
     
     if log_type:
         logs = [log for log in logs if log.get('type') == log_type]
     
     return {"logs": logs, "total": len(logs)}
 
+@router.get("/requests/slow")
+async def get_slow_requests(
+    limit: int = Query(50, ge=1, le=500),
+    minutes: int = Query(60, ge=1, le=7 * 24 * 60),
+    route: Optional[str] = None,
+    current_user: User = Depends(auth.get_current_admin_user)
+):
+    """Slowest recent requests with their SQL, outbound calls and stack summary
+
+    `route` filters by route template, e.g. `/api/tournaments/{tournament_id}`.
+    """
+    requests = await analytics_manager.get_slow_requests(limit=limit, minutes=minutes, route=route)
+    return {"requests": requests, "total": len(requests)}
+
+@router.post("/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILER_MAX_SECONDS),
+    hz: int = Query(100, ge=1, le=1000),
+    attribute_routes: bool = True,
+    format: str = Query("json", pattern="^(json|collapsed)$"),
+    current_user: User = Depends(auth.get_current_admin_user)
+):
+    """Sample the stacks of the worker serving this request for `seconds` at `hz`
+
+    `format=collapsed` returns plain collapsed stacks for flamegraph.pl or
+    speedscope. With `attribute_routes`, event loop samples are grouped under
+    the route being handled. Only the worker that receives the call (`pid`)
+    is profiled, one profile at a time.
+    """
+    try:
+        profile = await sampling_profiler.profile(seconds, hz, attribute_routes)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    if format == "collapsed":
+        return PlainTextResponse(profile["collapsed"])
+    return profile
+
 @router.post("/tournaments/{tournament_id}/start")
 async def start_tournament(
     tournament_id: int,
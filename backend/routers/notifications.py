@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_async_db, get_async_read_db
+from models import User
+from schemas import NotificationPage, NotificationMarkRead
+from services.notification_service import notification_service
+import auth
+
+router = APIRouter()
+
+@router.get("/", response_model=NotificationPage)
+async def get_my_notifications(
+    limit: int = Query(20, ge=1, le=100),
+    before: Optional[int] = None,
+    unread_only: bool = False,
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(auth.get_current_active_user)
+):
+    """Get a page of the current user's notifications, newest first
+
+    Pass the returned `next_cursor` as `before` to fetch the next page.
+    """
+
+    items, next_cursor = await notification_service.inbox(
+        db, current_user.id, limit=limit, before_id=before, unread_only=unread_only
+    )
+    unread_count = await notification_service.unread_count(db, current_user.id)
+
+    return {"items": items, "next_cursor": next_cursor, "unread_count": unread_count}
+
+@router.get("/unread-count")
+async def get_unread_count(
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: User = Depends(auth.get_current_active_user)
+):
+    """Get the current user's unread notification count"""
+
+    return {"unread_count": await notification_service.unread_count(db, current_user.id)}
+
+@router.post("/read")
+async def mark_notifications_read(
+    request: NotificationMarkRead,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(auth.get_current_active_user)
+):
+    """Mark notifications as read
+
+    Send `ids` for specific notifications, `up_to_id` for everything up to a
+    notification, or an empty body to mark the whole inbox read.
+    """
+
+    updated = await notification_service.mark_read(
+        db, current_user.id, ids=request.ids, up_to_id=request.up_to_id
+    )
+    await db.commit()
+
+    return {
+        "updated": updated,
+        "unread_count": await notification_service.unread_count(db, current_user.id)
+    }
@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import select, func, desc
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db
+from database import get_async_db, get_async_read_db
 from models import User, MatchResult, Tournament, Registration
+from partitioning import archive_aware
 from schemas import (
     UserProfile, LeaderboardResponse, LeaderboardEntry, 
     UserResponse, SuccessResponse
@@ -17,33 +18,38 @@ import auth
 
 router = APIRouter()
 
+# Player stats are all-time, so they read match results from the hot table and its archive
+MatchResultHistory = archive_aware(MatchResult)
+
 @router.get("/me", response_model=UserProfile)
 async def get_my_profile(
     current_user: User = Depends(auth.get_current_active_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     """Get current user's profile with stats"""
     
     # Get tournament stats
-    total_tournaments = db.query(Registration).filter(
-        Registration.user_id == current_user.id
-    ).count()
+    total_tournaments = await db.scalar(
+        select(func.count(Registration.id)).where(Registration.user_id == current_user.id)
+    )
     
     # Get wins (rank 1 results)
-    total_wins = db.query(MatchResult).filter(
-        MatchResult.user_id == current_user.id,
-        MatchResult.rank == 1
-    ).count()
+    total_wins = await db.scalar(
+        select(func.count(MatchResultHistory.id)).where(
+            MatchResultHistory.user_id == current_user.id,
+            MatchResultHistory.rank == 1
+        )
+    )
     
     # Get total kills
-    total_kills = db.query(func.sum(MatchResult.kills)).filter(
-        MatchResult.user_id == current_user.id
-    ).scalar() or 0
+    total_kills = await db.scalar(
+        select(func.sum(MatchResultHistory.kills)).where(MatchResultHistory.user_id == current_user.id)
+    ) or 0
     
     # Get best rank
-    best_rank = db.query(func.min(MatchResult.rank)).filter(
-        MatchResult.user_id == current_user.id
-    ).scalar() or 0
+    best_rank = await db.scalar(
+        select(func.min(MatchResultHistory.rank)).where(MatchResultHistory.user_id == current_user.id)
+    ) or 0
     
     # Calculate win rate
     win_rate = (total_wins / total_tournaments * 100) if total_tournaments > 0 else 0
@@ -62,12 +68,12 @@ async def get_my_profile(
 @router.get("/{user_id}", response_model=UserProfile)
 async def get_user_profile(
     user_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get user profile by ID"""
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -81,25 +87,27 @@ async def get_user_profile(
         )
     
     # Get tournament stats
-    total_tournaments = db.query(Registration).filter(
-        Registration.user_id == user.id
-    ).count()
+    total_tournaments = await db.scalar(
+        select(func.count(Registration.id)).where(Registration.user_id == user.id)
+    )
     
     # Get wins (rank 1 results)
-    total_wins = db.query(MatchResult).filter(
-        MatchResult.user_id == user.id,
-        MatchResult.rank == 1
-    ).count()
+    total_wins = await db.scalar(
+        select(func.count(MatchResultHistory.id)).where(
+            MatchResultHistory.user_id == user.id,
+            MatchResultHistory.rank == 1
+        )
+    )
     
     # Get total kills
-    total_kills = db.query(func.sum(MatchResult.kills)).filter(
-        MatchResult.user_id == user.id
-    ).scalar() or 0
+    total_kills = await db.scalar(
+        select(func.sum(MatchResultHistory.kills)).where(MatchResultHistory.user_id == user.id)
+    ) or 0
     
     # Get best rank
-    best_rank = db.query(func.min(MatchResult.rank)).filter(
-        MatchResult.user_id == user.id
-    ).scalar() or 0
+    best_rank = await db.scalar(
+        select(func.min(MatchResultHistory.rank)).where(MatchResultHistory.user_id == user.id)
+    ) or 0
     
     # Calculate win rate
     win_rate = (total_wins / total_tournaments * 100) if total_tournaments > 0 else 0
@@ -120,45 +128,49 @@ async def get_players(
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get list of players"""
     
-    query = db.query(User).filter(User.is_active == True)
+    query = select(User).where(User.is_active == True)
     
     if search:
-        query = query.filter(
+        query = query.where(
             User.username.ilike(f"%{search}%")
         )
     
-    players = query.offset(skip).limit(limit).all()
+    players = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     return players
 
 @router.get("/leaderboard/global", response_model=LeaderboardResponse)
 async def get_global_leaderboard(
     limit: int = 50,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get global leaderboard"""
     
     # Get top players by XP
-    top_players = db.query(User).filter(
-        User.is_active == True
-    ).order_by(desc(User.xp)).limit(limit).all()
+    top_players = (await db.execute(
+        select(User).where(
+            User.is_active == True
+        ).order_by(desc(User.xp)).limit(limit)
+    )).scalars().all()
     
     leaderboard_entries = []
     for rank, player in enumerate(top_players, 1):
         # Get player stats
-        total_tournaments = db.query(Registration).filter(
-            Registration.user_id == player.id
-        ).count()
+        total_tournaments = await db.scalar(
+            select(func.count(Registration.id)).where(Registration.user_id == player.id)
+        )
         
-        total_wins = db.query(MatchResult).filter(
-            MatchResult.user_id == player.id,
-            MatchResult.rank == 1
-        ).count()
+        total_wins = await db.scalar(
+            select(func.count(MatchResultHistory.id)).where(
+                MatchResultHistory.user_id == player.id,
+                MatchResultHistory.rank == 1
+            )
+        )
         
         win_rate = (total_wins / total_tournaments * 100) if total_tournaments > 0 else 0
         
@@ -176,16 +188,18 @@ async def get_global_leaderboard(
     
     # Get current user's rank
     user_rank = None
-    all_users = db.query(User).filter(
-        User.is_active == True
-    ).order_by(desc(User.xp)).all()
-    
-    for rank, user in enumerate(all_users, 1):
-        if getattr(user, 'id', None) == getattr(current_user, 'id', None):
+    all_user_ids = (await db.execute(
+        select(User.id).where(
+            User.is_active == True
+        ).order_by(desc(User.xp))
+    )).scalars().all()
+    
+    for rank, user_id in enumerate(all_user_ids, 1):
+        if user_id == getattr(current_user, 'id', None):
             user_rank = rank
             break
     
-    total_players = db.query(User).filter(User.is_active == True).count()
+    total_players = await db.scalar(select(func.count(User.id)).where(User.is_active == True))
     
     return LeaderboardResponse(
         entries=leaderboard_entries,
@@ -197,36 +211,40 @@ async def get_global_leaderboard(
 async def get_game_leaderboard(
     game: str,
     limit: int = 50,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get leaderboard for specific game"""
     
     # Get players who play this game
-    players_query = db.query(User).filter(
+    players_query = select(User).where(
         User.is_active == True,
         User.favorite_game == game
     ).order_by(desc(User.xp)).limit(limit)
     
-    top_players = players_query.all()
+    top_players = (await db.execute(players_query)).scalars().all()
     
     leaderboard_entries = []
     for rank, player in enumerate(top_players, 1):
         # Get player stats for this game
-        total_tournaments = db.query(Registration).join(
-            Tournament, Registration.tournament_id == Tournament.id
-        ).filter(
-            Registration.user_id == player.id,
-            Tournament.game == game
-        ).count()
+        total_tournaments = await db.scalar(
+            select(func.count(Registration.id)).join(
+                Tournament, Registration.tournament_id == Tournament.id
+            ).where(
+                Registration.user_id == player.id,
+                Tournament.game == game
+            )
+        )
         
-        total_wins = db.query(MatchResult).join(
-            Tournament, MatchResult.tournament_id == Tournament.id
-        ).filter(
-            MatchResult.user_id == player.id,
-            MatchResult.rank == 1,
-            Tournament.game == game
-        ).count()
+        total_wins = await db.scalar(
+            select(func.count(MatchResultHistory.id)).join(
+                Tournament, MatchResultHistory.tournament_id == Tournament.id
+            ).where(
+                MatchResultHistory.user_id == player.id,
+                MatchResultHistory.rank == 1,
+                Tournament.game == game
+            )
+        )
         
         win_rate = (total_wins / total_tournaments * 100) if total_tournaments > 0 else 0
         
@@ -244,20 +262,24 @@ async def get_game_leaderboard(
     
     # Get current user's rank in this game
     user_rank = None
-    all_users = db.query(User).filter(
-        User.is_active == True,
-        User.favorite_game == game
-    ).order_by(desc(User.xp)).all()
-    
-    for rank, user in enumerate(all_users, 1):
-        if getattr(user, 'id', None) == getattr(current_user, 'id', None):
+    all_user_ids = (await db.execute(
+        select(User.id).where(
+            User.is_active == True,
+            User.favorite_game == game
+        ).order_by(desc(User.xp))
+    )).scalars().all()
+    
+    for rank, user_id in enumerate(all_user_ids, 1):
+        if user_id == getattr(current_user, 'id', None):
             user_rank = rank
             break
     
-    total_players = db.query(User).filter(
-        User.is_active == True,
-        User.favorite_game == game
-    ).count()
+    total_players = await db.scalar(
+        select(func.count(User.id)).where(
+            User.is_active == True,
+            User.favorite_game == game
+        )
+    )
     
     return LeaderboardResponse(
         entries=leaderboard_entries,
@@ -268,7 +290,7 @@ async def get_game_leaderboard(
 @router.put("/me", response_model=UserResponse)
 async def update_my_profile(
     profile_data: dict,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Update current user's profile"""
@@ -280,29 +302,33 @@ async def update_my_profile(
         if field in allowed_fields and hasattr(current_user, field):
             setattr(current_user, field, value)
     
-    db.commit()
-    db.refresh(current_user)
+    await db.commit()
+    await db.refresh(current_user)
     
     return current_user
 
 @router.get("/me/tournaments", response_model=List[dict])
 async def get_my_tournaments(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get current user's tournament history"""
     
-    registrations = db.query(Registration, Tournament).join(
-        Tournament, Registration.tournament_id == Tournament.id
-    ).filter(Registration.user_id == current_user.id).all()
+    registrations = (await db.execute(
+        select(Registration, Tournament).join(
+            Tournament, Registration.tournament_id == Tournament.id
+        ).where(Registration.user_id == current_user.id)
+    )).all()
     
     tournament_history = []
     for registration, tournament in registrations:
         # Get match result if exists
-        match_result = db.query(MatchResult).filter(
-            MatchResult.user_id == current_user.id,
-            MatchResult.tournament_id == tournament.id
-        ).first()
+        match_result = (await db.execute(
+            select(MatchResultHistory).where(
+                MatchResultHistory.user_id == current_user.id,
+                MatchResultHistory.tournament_id == tournament.id
+            )
+        )).scalars().first()
         
         tournament_info = {
             "tournament_id": tournament.id,
@@ -324,49 +350,53 @@ async def get_my_tournaments(
 
 @router.get("/me/stats", response_model=dict)
 async def get_my_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get current user's detailed statistics"""
     
     # Basic stats
-    total_tournaments = db.query(Registration).filter(
-        Registration.user_id == current_user.id
-    ).count()
+    total_tournaments = await db.scalar(
+        select(func.count(Registration.id)).where(Registration.user_id == current_user.id)
+    )
     
-    total_wins = db.query(MatchResult).filter(
-        MatchResult.user_id == current_user.id,
-        MatchResult.rank == 1
-    ).count()
+    total_wins = await db.scalar(
+        select(func.count(MatchResultHistory.id)).where(
+            MatchResultHistory.user_id == current_user.id,
+            MatchResultHistory.rank == 1
+        )
+    )
     
-    total_kills = db.query(func.sum(MatchResult.kills)).filter(
-        MatchResult.user_id == current_user.id
-    ).scalar() or 0
+    total_kills = await db.scalar(
+        select(func.sum(MatchResultHistory.kills)).where(MatchResultHistory.user_id == current_user.id)
+    ) or 0
     
-    best_rank = db.query(func.min(MatchResult.rank)).filter(
-        MatchResult.user_id == current_user.id
-    ).scalar() or 0
+    best_rank = await db.scalar(
+        select(func.min(MatchResultHistory.rank)).where(MatchResultHistory.user_id == current_user.id)
+    ) or 0
     
-    avg_rank = db.query(func.avg(MatchResult.rank)).filter(
-        MatchResult.user_id == current_user.id
-    ).scalar() or 0
+    avg_rank = await db.scalar(
+        select(func.avg(MatchResultHistory.rank)).where(MatchResultHistory.user_id == current_user.id)
+    ) or 0
     
     # Game-specific stats
-    game_stats = db.query(
-        Tournament.game,
-        func.count(Registration.id).label('tournaments'),
-        func.count(MatchResult.id).label('completed'),
-        func.sum(MatchResult.kills).label('kills'),
-        func.avg(MatchResult.rank).label('avg_rank')
-    ).select_from(Registration).join(
-        Tournament, Registration.tournament_id == Tournament.id
-    ).outerjoin(
-        MatchResult, 
-        (MatchResult.user_id == Registration.user_id) & 
-        (MatchResult.tournament_id == Registration.tournament_id)
-    ).filter(
-        Registration.user_id == current_user.id
-    ).group_by(Tournament.game).all()
+    game_stats = (await db.execute(
+        select(
+            Tournament.game,
+            func.count(Registration.id).label('tournaments'),
+            func.count(MatchResultHistory.id).label('completed'),
+            func.sum(MatchResultHistory.kills).label('kills'),
+            func.avg(MatchResultHistory.rank).label('avg_rank')
+        ).select_from(Registration).join(
+            Tournament, Registration.tournament_id == Tournament.id
+        ).outerjoin(
+            MatchResultHistory, 
+            (MatchResultHistory.user_id == Registration.user_id) & 
+            (MatchResultHistory.tournament_id == Registration.tournament_id)
+        ).where(
+            Registration.user_id == current_user.id
+        ).group_by(Tournament.game)
+    )).all()
     
     game_breakdown = []
     for game, tournaments, completed, kills, avg_rank in game_stats:
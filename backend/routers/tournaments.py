@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from typing import List, Optional
 
@@ -7,7 +8,7 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from database import get_db
+from database import get_async_db, get_async_read_db
 from models import Tournament, Registration, User
 from schemas import (
     TournamentCreate, TournamentResponse, TournamentUpdate,
@@ -23,29 +24,32 @@ async def get_tournaments(
     limit: int = 100,
     status: Optional[str] = None,
     game: Optional[str] = None,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_read_db),
+    current_user: Optional[User] = Depends(auth.get_optional_current_user)
 ):
-    """Get list of tournaments"""
-    query = db.query(Tournament)
+    """Get list of tournaments (public; is_registered is only set for signed-in users)"""
+    query = select(Tournament)
     
     if status:
-        query = query.filter(Tournament.status == status)
+        query = query.where(Tournament.status == status)
     if game:
-        query = query.filter(Tournament.game == game)
+        query = query.where(Tournament.game == game)
     
-    tournaments = query.offset(skip).limit(limit).all()
+    tournaments = (await db.execute(query.offset(skip).limit(limit))).scalars().all()
     
     # Add participant count and registration status
     tournament_responses = []
     for tournament in tournaments:
-        participant_count = db.query(Registration).filter(
-            Registration.tournament_id == tournament.id
-        ).count()
+        participant_count = await db.scalar(
+            select(func.count(Registration.id)).where(Registration.tournament_id == tournament.id)
+        )
         
-        is_registered = db.query(Registration).filter(
-            Registration.tournament_id == tournament.id,
-            Registration.user_id == current_user.id
-        ).first() is not None
+        is_registered = current_user is not None and await db.scalar(
+            select(Registration.id).where(
+                Registration.tournament_id == tournament.id,
+                Registration.user_id == current_user.id
+            ).limit(1)
+        ) is not None
         
         tournament_dict = tournament.__dict__.copy()
         tournament_dict['participant_count'] = participant_count
@@ -57,11 +61,11 @@ async def get_tournaments(
 @router.get("/{tournament_id}", response_model=TournamentResponse)
 async def get_tournament(
     tournament_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get specific tournament"""
-    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    tournament = await db.get(Tournament, tournament_id)
     if not tournament:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -69,14 +73,16 @@ async def get_tournament(
         )
     
     # Add participant count and registration status
-    participant_count = db.query(Registration).filter(
-        Registration.tournament_id == tournament.id
-    ).count()
+    participant_count = await db.scalar(
+        select(func.count(Registration.id)).where(Registration.tournament_id == tournament.id)
+    )
     
-    is_registered = db.query(Registration).filter(
-        Registration.tournament_id == tournament.id,
-        Registration.user_id == current_user.id
-    ).first() is not None
+    is_registered = await db.scalar(
+        select(Registration.id).where(
+            Registration.tournament_id == tournament.id,
+            Registration.user_id == current_user.id
+        ).limit(1)
+    ) is not None
     
     tournament_dict = tournament.__dict__.copy()
     tournament_dict['participant_count'] = participant_count
@@ -87,7 +93,7 @@ async def get_tournament(
 @router.post("/", response_model=TournamentResponse)
 async def create_tournament(
     tournament: TournamentCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Create new tournament (Admin only)"""
@@ -105,8 +111,8 @@ async def create_tournament(
     )
     
     db.add(db_tournament)
-    db.commit()
-    db.refresh(db_tournament)
+    await db.commit()
+    await db.refresh(db_tournament)
     
     tournament_dict = db_tournament.__dict__.copy()
     tournament_dict['participant_count'] = 0
@@ -118,11 +124,11 @@ async def create_tournament(
 async def update_tournament(
     tournament_id: int,
     tournament_update: TournamentUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Update tournament (Admin only)"""
-    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    tournament = await db.get(Tournament, tournament_id)
     if not tournament:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -135,15 +141,15 @@ async def update_tournament(
         setattr(tournament, field, value)
     
     # Update the timestamp using query update
-    db.query(Tournament).filter(Tournament.id == tournament_id).update({
+    await db.execute(update(Tournament).where(Tournament.id == tournament_id).values({
         Tournament.updated_at: datetime.utcnow()
-    })
-    db.commit()
-    db.refresh(tournament)
+    }))
+    await db.commit()
+    await db.refresh(tournament)
     
-    participant_count = db.query(Registration).filter(
-        Registration.tournament_id == tournament.id
-    ).count()
+    participant_count = await db.scalar(
+        select(func.count(Registration.id)).where(Registration.tournament_id == tournament.id)
+    )
     
     tournament_dict = tournament.__dict__.copy()
     tournament_dict['participant_count'] = participant_count
@@ -154,30 +160,30 @@ async def update_tournament(
 @router.delete("/{tournament_id}", response_model=SuccessResponse)
 async def delete_tournament(
     tournament_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_admin_user)
 ):
     """Delete tournament (Admin only)"""
-    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    tournament = await db.get(Tournament, tournament_id)
     if not tournament:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tournament not found"
         )
     
-    db.delete(tournament)
-    db.commit()
+    await db.delete(tournament)
+    await db.commit()
     
     return SuccessResponse(message="Tournament deleted successfully")
 
 @router.post("/{tournament_id}/register", response_model=RegistrationResponse)
 async def register_for_tournament(
     tournament_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Register for tournament"""
-    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    tournament = await db.get(Tournament, tournament_id)
     if not tournament:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -185,10 +191,12 @@ async def register_for_tournament(
         )
     
     # Check if already registered
-    existing_registration = db.query(Registration).filter(
-        Registration.tournament_id == tournament_id,
-        Registration.user_id == current_user.id
-    ).first()
+    existing_registration = (await db.execute(
+        select(Registration).where(
+            Registration.tournament_id == tournament_id,
+            Registration.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if existing_registration:
         raise HTTPException(
@@ -197,9 +205,9 @@ async def register_for_tournament(
         )
     
     # Check if tournament is full
-    participant_count = db.query(Registration).filter(
-        Registration.tournament_id == tournament_id
-    ).count()
+    participant_count = await db.scalar(
+        select(func.count(Registration.id)).where(Registration.tournament_id == tournament_id)
+    )
     
     max_participants = getattr(tournament, 'max_participants', 0)
     if participant_count >= max_participants:
@@ -225,22 +233,24 @@ async def register_for_tournament(
     )
     
     db.add(registration)
-    db.commit()
-    db.refresh(registration)
+    await db.commit()
+    await db.refresh(registration)
     
     return registration
 
 @router.delete("/{tournament_id}/register", response_model=SuccessResponse)
 async def unregister_from_tournament(
     tournament_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Unregister from tournament"""
-    registration = db.query(Registration).filter(
-        Registration.tournament_id == tournament_id,
-        Registration.user_id == current_user.id
-    ).first()
+    registration = (await db.execute(
+        select(Registration).where(
+            Registration.tournament_id == tournament_id,
+            Registration.user_id == current_user.id
+        )
+    )).scalars().first()
     
     if not registration:
         raise HTTPException(
@@ -248,28 +258,30 @@ async def unregister_from_tournament(
             detail="Registration not found"
         )
     
-    db.delete(registration)
-    db.commit()
+    await db.delete(registration)
+    await db.commit()
     
     return SuccessResponse(message="Unregistered successfully")
 
 @router.get("/{tournament_id}/participants", response_model=List[dict])
 async def get_tournament_participants(
     tournament_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(auth.get_current_active_user)
 ):
     """Get tournament participants"""
-    tournament = db.query(Tournament).filter(Tournament.id == tournament_id).first()
+    tournament = await db.get(Tournament, tournament_id)
     if not tournament:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tournament not found"
         )
     
-    participants = db.query(Registration, User).join(
-        User, Registration.user_id == User.id
-    ).filter(Registration.tournament_id == tournament_id).all()
+    participants = (await db.execute(
+        select(Registration, User).join(
+            User, Registration.user_id == User.id
+        ).where(Registration.tournament_id == tournament_id)
+    )).all()
     
     participant_list = []
     for registration, user in participants:
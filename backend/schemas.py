@@ -100,7 +100,7 @@ class UserResponse(BaseModel):
     last_login: Optional[datetime]
     
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 class UserProfile(UserResponse):
     total_tournaments: int
@@ -162,7 +162,7 @@ class TournamentResponse(BaseModel):
     is_registered: bool = False
     
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 # Registration Schemas
 class RegistrationCreate(BaseModel):
@@ -176,7 +176,7 @@ class RegistrationResponse(BaseModel):
     payment_status: str
     
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 # Match Result Schemas
 class MatchResultCreate(BaseModel):
@@ -201,7 +201,7 @@ class MatchResultResponse(BaseModel):
     verified_at: Optional[datetime]
     
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 # Notification Schemas
 class NotificationCreate(BaseModel):
@@ -219,7 +219,16 @@ class NotificationResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        orm_mode = True
+        from_attributes = True
+
+class NotificationPage(BaseModel):
+    items: List[NotificationResponse]
+    next_cursor: Optional[int] = None
+    unread_count: int
+
+class NotificationMarkRead(BaseModel):
+    ids: Optional[List[int]] = None
+    up_to_id: Optional[int] = None
 
 # Payment Schemas
 class PaymentCreate(BaseModel):
@@ -240,7 +249,7 @@ class PaymentResponse(BaseModel):
     created_at: datetime
     
     class Config:
-        orm_mode = True
+        from_attributes = True
 
 # Authentication Schemas
 class Token(BaseModel):
@@ -3,6 +3,8 @@ import json
 from typing import Dict, Any
 import os
 
+from request_sampling import outbound_call
+
 class DiscordService:
     def __init__(self):
         # You'll need to set this webhook URL in your environment
@@ -49,13 +51,14 @@ class DiscordService:
                 "embeds": [embed]
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.webhook_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    return response.status == 204
+            with outbound_call("discord", "webhook"):
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                        self.webhook_url,
+                        json=payload,
+                        headers={'Content-Type': 'application/json'}
+                    ) as response:
+                        return response.status == 204
                     
         except Exception as e:
             print(f"Error sending Discord message: {e}")
@@ -110,13 +113,14 @@ class DiscordService:
                 "embeds": [embed]
             }
             
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.webhook_url,
-                    json=payload,
-                    headers={'Content-Type': 'application/json'}
-                ) as response:
-                    return response.status == 204
+            with outbound_call("discord", "webhook"):
+                async with aiohttp.ClientSession() as session:
+                    async with session.post(
+                        self.webhook_url,
+                        json=payload,
+                        headers={'Content-Type': 'application/json'}
+                    ) as response:
+                        return response.status == 204
                     
         except Exception as e:
             print(f"Error sending Discord tournament notification: {e}")
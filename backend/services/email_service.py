@@ -8,6 +8,8 @@ from typing import Optional
 import asyncio
 from datetime import datetime
 
+from request_sampling import outbound_call
+
 # Brevo (Sendinblue) SMTP Configuration
 BREVO_SMTP_HOST = "smtp-relay.brevo.com"
 BREVO_SMTP_PORT = 587
@@ -61,7 +63,8 @@ class EmailService:
 
         # Run in thread to avoid blocking
         loop = asyncio.get_event_loop()
-        await loop.run_in_executor(None, send_email_sync)
+        with outbound_call("smtp", "send_message"):
+            await loop.run_in_executor(None, send_email_sync)
 
 # Initialize email service
 email_service = EmailService()
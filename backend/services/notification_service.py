@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, update, insert, func, literal
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import engine
+from models import User, Notification, NotificationCounter
+from partitioning import purge_archive
+
+# Notifications leave the inbox after NOTIFICATIONS_HOT_DAYS (archival job) and are
+# deleted for good after NOTIFICATION_TTL_DAYS
+NOTIFICATION_TTL_DAYS = int(os.getenv("NOTIFICATION_TTL_DAYS", "90"))
+NOTIFICATION_PURGE_INTERVAL_SECONDS = int(os.getenv("NOTIFICATION_PURGE_INTERVAL_SECONDS", "3600"))
+FANOUT_BATCH_SIZE = int(os.getenv("NOTIFICATION_FANOUT_BATCH_SIZE", "1000"))
+
+logger = logging.getLogger(__name__)
+
+_DIALECT_INSERTS = {"postgresql": postgresql_insert, "sqlite": sqlite_insert}
+
+
+def _increment_counters(dialect_name: str, rows=None, from_select=None):
+    """INSERT ... ON CONFLICT DO UPDATE that adds to users' unread counters"""
+    stmt = _DIALECT_INSERTS[dialect_name](NotificationCounter)
+    if from_select is not None:
+        stmt = stmt.from_select(["user_id", "unread"], from_select)
+    else:
+        stmt = stmt.values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[NotificationCounter.user_id],
+        set_={"unread": NotificationCounter.unread + stmt.excluded.unread}
+    )
+
+
+class NotificationService:
+    """Inbox, unread counters and fan-out for user notifications
+
+    Methods take the caller's session and leave committing to the caller, so a
+    notification and the change that caused it land in the same transaction.
+    """
+
+    async def inbox(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        limit: int = 20,
+        before_id: Optional[int] = None,
+        unread_only: bool = False
+    ) -> Tuple[List[Notification], Optional[int]]:
+        """Newest-first page of a user's notifications and the cursor for the next page"""
+        stmt = select(Notification).where(Notification.user_id == user_id)
+        if before_id is not None:
+            stmt = stmt.where(Notification.id < before_id)
+        if unread_only:
+            stmt = stmt.where(Notification.read == False)
+        rows = (await db.execute(stmt.order_by(Notification.id.desc()).limit(limit + 1))).scalars().all()
+        next_cursor = rows[limit - 1].id if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    async def unread_count(self, db: AsyncSession, user_id: int) -> int:
+        """Unread notifications for a user, read from the counter row"""
+        return await db.scalar(
+            select(NotificationCounter.unread).where(NotificationCounter.user_id == user_id)
+        ) or 0
+
+    async def notify(self, db: AsyncSession, user_id: int, title: str, message: str, type: str = "info"):
+        """Create a single notification"""
+        await db.execute(insert(Notification).values(user_id=user_id, title=title, message=message, type=type, read=False))
+        await db.execute(_increment_counters(db.get_bind().dialect.name, rows=[{"user_id": user_id, "unread": 1}]))
+
+    async def fan_out(
+        self,
+        db: AsyncSession,
+        title: str,
+        message: str,
+        type: str = "info",
+        user_ids: Optional[Iterable[int]] = None,
+        role: Optional[str] = None
+    ) -> int:
+        """Notify many users with bulk statements; returns notifications created
+
+        Without `user_ids` every active user with notifications enabled (optionally
+        of one role) is targeted entirely in SQL with INSERT ... SELECT.
+        """
+        dialect_name = db.get_bind().dialect.name
+        if user_ids is None:
+            recipients = [User.is_active == True, User.notifications_enabled == True]
+            if role:
+                recipients.append(User.role == role)
+            result = await db.execute(insert(Notification).from_select(
+                ["user_id", "title", "message", "type", "read", "created_at"],
+                select(User.id, literal(title), literal(message), literal(type), literal(False), func.now()).where(*recipients)
+            ))
+            await db.execute(_increment_counters(
+                dialect_name, from_select=select(User.id, literal(1)).where(*recipients)
+            ))
+            return result.rowcount
+
+        user_ids = list(dict.fromkeys(user_ids))
+        for start in range(0, len(user_ids), FANOUT_BATCH_SIZE):
+            batch = user_ids[start:start + FANOUT_BATCH_SIZE]
+            await db.execute(insert(Notification), [
+                {"user_id": user_id, "title": title, "message": message, "type": type, "read": False}
+                for user_id in batch
+            ])
+            await db.execute(_increment_counters(
+                dialect_name, rows=[{"user_id": user_id, "unread": 1} for user_id in batch]
+            ))
+        return len(user_ids)
+
+    async def mark_read(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        ids: Optional[List[int]] = None,
+        up_to_id: Optional[int] = None
+    ) -> int:
+        """Mark a user's notifications read in one UPDATE; returns how many changed
+
+        With neither `ids` nor `up_to_id` the whole inbox is marked read.
+        """
+        stmt = update(Notification).where(Notification.user_id == user_id, Notification.read == False)
+        if ids is not None:
+            stmt = stmt.where(Notification.id.in_(ids))
+        if up_to_id is not None:
+            stmt = stmt.where(Notification.id <= up_to_id)
+        result = await db.execute(
+            stmt.values(read=True).execution_options(synchronize_session=False)
+        )
+        changed = result.rowcount
+        if changed:
+            await db.execute(
+                update(NotificationCounter)
+                .where(NotificationCounter.user_id == user_id)
+                .values(unread=NotificationCounter.unread - changed)
+            )
+        return changed
+
+    def reconcile_unread_counts(self) -> int:
+        """Rewrite counters that drifted from the inbox, e.g. after unread rows were archived"""
+        actual = select(func.count(Notification.id)).where(
+            Notification.user_id == NotificationCounter.user_id,
+            Notification.read == False
+        ).scalar_subquery()
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(NotificationCounter).where(NotificationCounter.unread != actual).values(unread=actual)
+            )
+        return result.rowcount
+
+    def purge_expired(self) -> dict:
+        """Delete notifications past their TTL and correct the unread counters"""
+        cutoff = datetime.utcnow() - timedelta(days=NOTIFICATION_TTL_DAYS)
+        results = {
+            "purged": purge_archive("notifications", cutoff),
+            "counters_corrected": self.reconcile_unread_counts(),
+        }
+        logger.info(f"Notification purge finished: {results}")
+        return results
+
+    async def purge_loop(self):
+        """Background task running the TTL purge off the event loop"""
+        while True:
+            try:
+                await asyncio.to_thread(self.purge_expired)
+            except Exception as e:
+                logger.error(f"Error purging notifications: {e}")
+            await asyncio.sleep(NOTIFICATION_PURGE_INTERVAL_SECONDS)
+
+# Global notification service instance
+notification_service = NotificationService()
@@ -0,0 +1,180 @@
+"""
+Per-request SQL instrumentation for ClutchZone
+Counts statements and database time per request, flags N+1 query patterns,
+and provides a test helper that asserts a maximum query count
+"""
+
+import logging
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from prometheus_client import Counter as PrometheusCounter, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+# Configuration
+SQL_DEBUG_HEADERS = os.getenv("SQL_DEBUG_HEADERS", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+
+# Prometheus metrics
+DB_QUERIES_PER_REQUEST = Histogram(
+    'db_queries_per_request', 'SQL statements executed per request', ['route'],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'db_time_per_request_seconds', 'Time spent in SQL statements per request', ['route'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+DB_N_PLUS_ONE = PrometheusCounter('db_n_plus_one_total', 'Requests flagged with an N+1 query pattern', ['route'])
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_LIST = re.compile(r"\(\s*(?:\?|%\(\w+\)s|\$\d+|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|\$\d+|:\w+))*\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=2048)
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so the same query with different IN-list sizes shares a shape"""
+    return _WHITESPACE.sub(" ", _PLACEHOLDER_LIST.sub("(?)", statement)).strip()
+
+
+class QueryStats:
+    """SQL statements seen while this collector was active"""
+
+    __slots__ = ("count", "total_time", "shapes", "parent")
+
+    def __init__(self, parent: "QueryStats" = None):
+        self.count = 0
+        self.total_time = 0.0
+        self.shapes = Counter()
+        self.parent = parent
+
+    def record(self, statement: str, elapsed: float):
+        shape = statement_shape(statement)
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.total_time += elapsed
+            stats.shapes[shape] += 1
+            stats = stats.parent
+
+    def n_plus_one(self, threshold: int = None) -> List[Tuple[str, int]]:
+        """Statement shapes repeated at least `threshold` times"""
+        threshold = threshold or N_PLUS_ONE_THRESHOLD
+        flagged = []
+        for shape, count in self.shapes.most_common():
+            if count < threshold:
+                break
+            flagged.append((shape, count))
+        return flagged
+
+    def summary(self, limit: int = 5) -> str:
+        lines = [f"{self.count} queries in {self.total_time * 1000:.1f}ms"]
+        for shape, count in self.shapes.most_common(limit):
+            lines.append(f"  {count}x {shape[:200]}")
+        return "\n".join(lines)
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar("sql_query_stats", default=None)
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    """Stats for the request being handled, if any"""
+    return _current_stats.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_stats.get() is not None:
+        conn.info["query_start_time"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current_stats.get()
+    if stats is None:
+        return
+    started = conn.info.pop("query_start_time", None)
+    stats.record(statement, time.perf_counter() - started if started else 0.0)
+
+
+_reported_n_plus_one = set()
+
+
+class SQLInstrumentationMiddleware:
+    """ASGI middleware that measures SQL per request and flags N+1 patterns
+
+    The collector stays active until the app returns, so statements run while
+    a streaming body is sent or a `yield` dependency is torn down are counted
+    too. The debug headers go out with the response start and only count what
+    ran before it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(parent=_current_stats.get())
+        token = _current_stats.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["X-DB-Query-Count"] = str(stats.count)
+                headers["X-DB-Query-Time-Ms"] = f"{stats.total_time * 1000:.2f}"
+                headers["X-DB-N-Plus-One"] = str(len(stats.n_plus_one()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers if SQL_DEBUG_HEADERS else send)
+        finally:
+            _current_stats.reset(token)
+            self._report(scope, stats)
+
+    @staticmethod
+    def _report(scope, stats: QueryStats):
+        # Routing stores the matched route in the scope; label by its template
+        route = getattr(scope.get("route"), "path", None) or "unmatched"
+        DB_QUERIES_PER_REQUEST.labels(route=route).observe(stats.count)
+        DB_TIME_PER_REQUEST.labels(route=route).observe(stats.total_time)
+
+        flagged = stats.n_plus_one()
+        if flagged:
+            DB_N_PLUS_ONE.labels(route=route).inc()
+            shape, count = flagged[0]
+            if (route, shape) not in _reported_n_plus_one and len(_reported_n_plus_one) < 1000:
+                _reported_n_plus_one.add((route, shape))
+                logger.warning(f"N+1 query pattern on {scope['method']} {route}: {count}x {shape[:200]}")
+
+
+@contextmanager
+def assert_max_queries(limit: int, allow_n_plus_one: bool = True):
+    """Fail if the wrapped block (e.g. one test client call) runs more than `limit` statements
+
+    Usage:
+        with assert_max_queries(4):
+            client.get("/api/tournaments/")
+    """
+    stats = QueryStats(parent=_current_stats.get())
+    token = _current_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _current_stats.reset(token)
+
+    if stats.count > limit:
+        raise AssertionError(f"Expected at most {limit} queries, got {stats.summary()}")
+    if not allow_n_plus_one and stats.n_plus_one():
+        raise AssertionError(f"N+1 query pattern detected: {stats.summary()}")
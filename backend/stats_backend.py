@@ -0,0 +1,409 @@
+"""
+Aggregation backends for the analytics real-time stats.
+
+Every uvicorn worker records the requests it served and reads stats back
+through the same interface:
+
+    RedisStatsBackend      shared by all workers, so every worker reports
+                           cluster-wide figures
+    InProcessStatsBackend  this process only, built on the access log ring
+                           buffer and rolling buckets; used without Redis
+                           (single worker, local development, tests)
+
+Request rows are (epoch, route key, status code, latency seconds, user id or None).
+
+Per-user figures are kept per hour, so they cover whole hours: a request
+count per user, and per user errors (5xx), latency (sum) and r:<route>
+counts. Only the busiest users' details are read back.
+
+User sessions (admin activity) hold first seen, last activity, an action
+count and the last SESSION_ACTIONS actions; a session ends
+SESSION_TTL_SECONDS after its last action.
+"""
+
+import json
+import math
+from collections import Counter, defaultdict, deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from access_log_buffer import AccessLogBuffer
+from metric_buckets import MetricBuckets, LATENCY_BOUNDS, COUNT, ERRORS, LATENCY_SUM, HISTOGRAM, COLUMNS, MINUTE_SLOTS
+
+RequestRow = Tuple[float, str, int, float, Optional[str]]
+
+# Width of the Redis request-rate counters; calls per minute sums the last 60s of them
+_RATE_BUCKET_SECONDS = 5
+
+SESSION_TTL_SECONDS = 24 * 3600
+SESSION_ACTIONS = 50
+
+
+def user_fields(rows: List[RequestRow]) -> Dict[int, Tuple[Counter, Dict[str, Counter]]]:
+    """Per hour: (requests per user, {user: detail field increments})"""
+    hours: Dict[int, Tuple[Counter, Dict[str, Counter]]] = {}
+    for epoch, route, status, latency, user_id in rows:
+        if not user_id:
+            continue
+        hour = int(epoch // 3600)
+        if hour not in hours:
+            hours[hour] = (Counter(), defaultdict(Counter))
+        requests, details = hours[hour]
+        requests[user_id] += 1
+        fields = details[user_id]
+        if status >= 500:
+            fields["errors"] += 1
+        fields["latency"] += latency
+        fields[f"r:{route}"] += 1
+    return hours
+
+
+def user_summary(user_id: str, requests: int, detail_hashes) -> Dict[str, object]:
+    """One user's totals from their per-hour detail fields"""
+    summary = {"user_id": user_id, "requests": requests, "errors": 0, "latency_sum": 0.0, "routes": Counter()}
+    for fields in detail_hashes:
+        for field, value in fields.items():
+            if field == "errors":
+                summary["errors"] += int(value)
+            elif field == "latency":
+                summary["latency_sum"] += float(value)
+            else:
+                summary["routes"][field[2:]] += int(value)
+    return summary
+
+
+def _hour_range(hours: float, now: float, retention_hours: int) -> range:
+    """Hour periods covering the last `hours`, current hour included"""
+    last_hour = int(now // 3600)
+    return range(last_hour - max(math.ceil(min(hours, retention_hours)), 1) + 1, last_hour + 1)
+
+
+def user_window_minutes(hours: float, now: float, retention_hours: int) -> float:
+    """Minutes the per-user figures of top_users cover: the past whole hours plus the current one up to now"""
+    periods = _hour_range(hours, now, retention_hours)
+    return max((len(periods) - 1) * 60 + (now % 3600) / 60, 1.0)
+
+
+class InProcessStatsBackend:
+    """Stats for this process only"""
+
+    def __init__(self, buffer_capacity: int, retention_hours: int):
+        self.log_buffer = AccessLogBuffer(buffer_capacity)
+        self.metric_buckets = MetricBuckets(retention_hours)
+        self.retention_hours = retention_hours
+        self._user_hours: Dict[int, Tuple[Counter, Dict[str, Counter]]] = {}
+        self._counters: Dict[str, Counter] = defaultdict(Counter)
+        self._sessions: Dict[str, Dict[str, object]] = {}
+
+    async def record_requests(self, rows: List[RequestRow]):
+        route_ids = [
+            self.log_buffer.append(epoch, route, status, latency) for epoch, route, status, latency, _ in rows
+        ]
+        self.metric_buckets.add_batch(
+            [row[0] for row in rows], route_ids, [row[2] for row in rows], [row[3] for row in rows]
+        )
+        for hour, (requests, details) in user_fields(rows).items():
+            if hour not in self._user_hours:
+                self._user_hours[hour] = (Counter(), defaultdict(Counter))
+            self._user_hours[hour][0].update(requests)
+            for user_id, fields in details.items():
+                self._user_hours[hour][1][user_id].update(fields)
+        if rows:
+            oldest = int(rows[-1][0] // 3600) - self.retention_hours
+            for hour in [hour for hour in self._user_hours if hour < oldest]:
+                del self._user_hours[hour]
+
+    async def calls_last_minute(self, now: float) -> int:
+        return self.log_buffer.count_since(now - 60)
+
+    async def request_metrics(self, hours: float, now: float) -> Dict[str, object]:
+        """Merged window: {"routes": {route: stats row}, "status_counts": {...}, "hourly": {hour: n}}"""
+        merged = self.metric_buckets.query(hours, now)
+        route_stats = merged["route_stats"]
+        status_counts = merged["status_counts"]
+        return {
+            "routes": {
+                self.log_buffer.routes[route_id]: route_stats[route_id]
+                for route_id in np.flatnonzero(route_stats[:, COUNT])
+            },
+            "status_counts": {int(code): int(status_counts[code]) for code in np.flatnonzero(status_counts)},
+            "hourly": merged["hourly"],
+        }
+
+    async def hour_metrics(self, hour: int) -> Dict[str, object]:
+        """Like request_metrics, for exactly one hour period (epoch // 3600)"""
+        merged = self.metric_buckets.hour(hour)
+        if merged is None:
+            return {"routes": {}, "status_counts": {}, "hourly": {}}
+        route_stats, status_counts = merged["route_stats"], merged["status_counts"]
+        routes = {
+            self.log_buffer.routes[route_id]: route_stats[route_id].copy()
+            for route_id in np.flatnonzero(route_stats[:, COUNT])
+        }
+        return {
+            "routes": routes,
+            "status_counts": {int(code): int(status_counts[code]) for code in np.flatnonzero(status_counts)},
+            "hourly": {hour: int(route_stats[:, COUNT].sum())} if routes else {},
+        }
+
+    async def top_users(self, hours: float, now: float, limit: int = 10) -> List[Dict[str, object]]:
+        """The `limit` busiest users over the whole hours covering the window, busiest first"""
+        periods = [self._user_hours[hour] for hour in _hour_range(hours, now, self.retention_hours) if hour in self._user_hours]
+        requests = Counter()
+        for hour_requests, _ in periods:
+            requests.update(hour_requests)
+        return [
+            user_summary(user_id, count, [details[user_id] for _, details in periods if user_id in details])
+            for user_id, count in requests.most_common(limit)
+        ]
+
+    async def incr(self, name: str, amounts: Dict[str, int]):
+        self._counters[name].update(amounts)
+
+    async def counters(self, name: str) -> Dict[str, int]:
+        return dict(self._counters[name])
+
+    async def record_session_action(self, user_id: str, action: Dict[str, object], now: float):
+        session = self._sessions.get(user_id)
+        if session is None:
+            session = self._sessions[user_id] = {
+                "first_seen": now, "total_actions": 0, "actions": deque(maxlen=SESSION_ACTIONS)
+            }
+        session["last_activity"] = now
+        session["total_actions"] += 1
+        session["actions"].append(action)
+
+    async def user_session(self, user_id: str) -> Optional[Dict[str, object]]:
+        """{"user_id", "first_seen", "last_activity", "total_actions", "actions" (oldest first)} or None"""
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        return {**session, "user_id": user_id, "actions": list(session["actions"])}
+
+    async def expire_sessions(self, cutoff: float) -> int:
+        """Drop sessions whose last action is older than `cutoff`; returns how many"""
+        expired = [user_id for user_id, session in self._sessions.items() if session["last_activity"] < cutoff]
+        for user_id in expired:
+            del self._sessions[user_id]
+        return len(expired)
+
+
+class RedisStatsBackend:
+    """Stats shared by every worker through Redis hashes and counters
+
+    Request metrics live in one hash per minute (kept 2 hours) and per hour
+    (kept `retention_hours`). Fields are c:, e: and l:<route> for count, 5xx
+    and latency sum, h:<route>|<bucket> for the latency histogram and
+    s:<code> for status codes. Per-user counts go to one hash per hour
+    (<prefix>:users:h:<hour>) and details to another (<prefix>:users:d:<hour>)
+    with <user>:errors, <user>:latency and <user>:r:<route> fields, so the
+    number of keys does not grow with the number of users.
+    Each batch is folded into a handful of HINCRBY calls in one pipeline.
+
+    Sessions are a sorted set of users by last activity (<prefix>:sessions),
+    hashes of first seen and action counts by user, and a capped list of
+    recent actions per user that expires with the session.
+    """
+
+    def __init__(self, redis_client, retention_hours: int, prefix: str = "analytics"):
+        self.redis_client = redis_client
+        self.retention_hours = retention_hours
+        self.prefix = prefix
+
+    async def record_requests(self, rows: List[RequestRow]):
+        if not rows:
+            return
+        updates: Dict[Tuple[str, int], Counter] = defaultdict(Counter)
+        latency_sums: Dict[Tuple[str, int], Counter] = defaultdict(Counter)
+        rates: Counter = Counter()
+        buckets = np.searchsorted(LATENCY_BOUNDS, [row[3] for row in rows], side="left")
+        for (epoch, route, status, latency, _), bucket in zip(rows, buckets):
+            for key in (
+                (f"{self.prefix}:req:m:{int(epoch // 60)}", MINUTE_SLOTS * 60),
+                (f"{self.prefix}:req:h:{int(epoch // 3600)}", (self.retention_hours + 1) * 3600),
+            ):
+                fields = updates[key]
+                fields[f"c:{route}"] += 1
+                if status >= 500:
+                    fields[f"e:{route}"] += 1
+                fields[f"h:{route}|{bucket}"] += 1
+                fields[f"s:{status}"] += 1
+                latency_sums[key][f"l:{route}"] += latency
+            rates[int(epoch // _RATE_BUCKET_SECONDS)] += 1
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        for (key, ttl), fields in updates.items():
+            for field, amount in fields.items():
+                pipe.hincrby(key, field, amount)
+            for field, amount in latency_sums[(key, ttl)].items():
+                pipe.hincrbyfloat(key, field, amount)
+            pipe.expire(key, ttl)
+        for bucket, amount in rates.items():
+            key = f"{self.prefix}:rate:{bucket}"
+            pipe.incrby(key, amount)
+            pipe.expire(key, 120)
+        ttl = (self.retention_hours + 1) * 3600
+        for hour, (requests, details) in user_fields(rows).items():
+            key = f"{self.prefix}:users:h:{hour}"
+            for user_id, amount in requests.items():
+                pipe.hincrby(key, user_id, amount)
+            pipe.expire(key, ttl)
+            detail_key = f"{self.prefix}:users:d:{hour}"
+            for user_id, fields in details.items():
+                for field, amount in fields.items():
+                    if field == "latency":
+                        pipe.hincrbyfloat(detail_key, f"{user_id}:{field}", amount)
+                    else:
+                        pipe.hincrby(detail_key, f"{user_id}:{field}", amount)
+            pipe.expire(detail_key, ttl)
+        await pipe.execute()
+
+    async def calls_last_minute(self, now: float) -> int:
+        current = int(now // _RATE_BUCKET_SECONDS)
+        keys = [f"{self.prefix}:rate:{bucket}" for bucket in range(current - 60 // _RATE_BUCKET_SECONDS + 1, current + 1)]
+        return sum(int(value) for value in await self.redis_client.mget(keys) if value)
+
+    async def request_metrics(self, hours: float, now: float) -> Dict[str, object]:
+        """Same shape as InProcessStatsBackend.request_metrics
+
+        Short windows read minute hashes. Longer ones read whole hour hashes
+        (the current hour's hash holds everything up to now), matching the
+        in-process buckets.
+        """
+        hours = min(hours, self.retention_hours)
+        last_minute = int(now // 60)
+        first_minute = last_minute - int(hours * 60) + 1
+        if first_minute > last_minute - MINUTE_SLOTS:
+            periods = [(f"{self.prefix}:req:m:{minute}", minute // 60) for minute in range(first_minute, last_minute + 1)]
+        else:
+            periods = [(f"{self.prefix}:req:h:{hour}", hour) for hour in range(first_minute // 60, last_minute // 60 + 1)]
+
+        return await self._read_periods(periods)
+
+    async def hour_metrics(self, hour: int) -> Dict[str, object]:
+        """Same as InProcessStatsBackend.hour_metrics"""
+        return await self._read_periods([(f"{self.prefix}:req:h:{hour}", hour)])
+
+    async def _read_periods(self, periods: List[Tuple[str, int]]) -> Dict[str, object]:
+        """Merge request metric hashes given as (key, hour) pairs"""
+        pipe = self.redis_client.pipeline(transaction=False)
+        for key, _ in periods:
+            pipe.hgetall(key)
+        hashes = await pipe.execute()
+
+        routes, status_counts, hourly = {}, Counter(), Counter()
+        for (_, hour), fields in zip(periods, hashes):
+            for field, value in fields.items():
+                kind, _, name = field.partition(":")
+                if kind == "s":
+                    status_counts[int(name)] += int(value)
+                    continue
+                if kind == "h":
+                    name, _, bucket = name.rpartition("|")
+                    column = HISTOGRAM + int(bucket)
+                else:
+                    column = {"c": COUNT, "e": ERRORS, "l": LATENCY_SUM}[kind]
+                if name not in routes:
+                    routes[name] = np.zeros(COLUMNS)
+                routes[name][column] += float(value)
+                if kind == "c":
+                    hourly[hour] += int(value)
+        return {
+            "routes": routes,
+            "status_counts": dict(status_counts),
+            "hourly": {hour: count for hour, count in sorted(hourly.items()) if count},
+        }
+
+    async def top_users(self, hours: float, now: float, limit: int = 10) -> List[Dict[str, object]]:
+        """Same as InProcessStatsBackend.top_users: per-user counts first, then the top users' details
+
+        A user's route fields can only name routes in that hour's request
+        hash, so the details are read with one HMGET per user and hour.
+        """
+        periods = list(_hour_range(hours, now, self.retention_hours))
+        pipe = self.redis_client.pipeline(transaction=False)
+        for hour in periods:
+            pipe.hgetall(f"{self.prefix}:users:h:{hour}")
+        for hour in periods:
+            pipe.hkeys(f"{self.prefix}:req:h:{hour}")
+        results = await pipe.execute()
+        requests = Counter()
+        for counts in results[:len(periods)]:
+            requests.update({user_id: int(value) for user_id, value in counts.items()})
+        top = requests.most_common(limit)
+        if not top:
+            return []
+
+        detail_fields = [
+            ["errors", "latency"] + [f"r:{field[2:]}" for field in route_fields if field.startswith("c:")]
+            for route_fields in results[len(periods):]
+        ]
+        pipe = self.redis_client.pipeline(transaction=False)
+        for user_id, _ in top:
+            for hour, fields in zip(periods, detail_fields):
+                pipe.hmget(f"{self.prefix}:users:d:{hour}", [f"{user_id}:{field}" for field in fields])
+        values = await pipe.execute()
+        summaries = []
+        for i, (user_id, count) in enumerate(top):
+            details = [
+                {field: value for field, value in zip(fields, hour_values) if value is not None}
+                for fields, hour_values in zip(detail_fields, values[i * len(periods):(i + 1) * len(periods)])
+            ]
+            summaries.append(user_summary(user_id, count, details))
+        return summaries
+
+    async def incr(self, name: str, amounts: Dict[str, int]):
+        if not amounts:
+            return
+        pipe = self.redis_client.pipeline(transaction=False)
+        for field, amount in amounts.items():
+            pipe.hincrby(f"{self.prefix}:{name}", field, amount)
+        await pipe.execute()
+
+    async def counters(self, name: str) -> Dict[str, int]:
+        return {field: int(value) for field, value in (await self.redis_client.hgetall(f"{self.prefix}:{name}")).items()}
+
+    async def record_session_action(self, user_id: str, action: Dict[str, object], now: float):
+        key = f"{self.prefix}:sessions"
+        actions_key = f"{key}:actions:{user_id}"
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zadd(key, {user_id: now})
+        pipe.hsetnx(f"{key}:first_seen", user_id, now)
+        pipe.hincrby(f"{key}:total_actions", user_id, 1)
+        pipe.lpush(actions_key, json.dumps(action, default=str))
+        pipe.ltrim(actions_key, 0, SESSION_ACTIONS - 1)
+        pipe.expire(actions_key, SESSION_TTL_SECONDS)
+        await pipe.execute()
+
+    async def user_session(self, user_id: str) -> Optional[Dict[str, object]]:
+        """Same as InProcessStatsBackend.user_session"""
+        key = f"{self.prefix}:sessions"
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zscore(key, user_id)
+        pipe.hget(f"{key}:first_seen", user_id)
+        pipe.hget(f"{key}:total_actions", user_id)
+        pipe.lrange(f"{key}:actions:{user_id}", 0, -1)
+        last_activity, first_seen, total_actions, actions = await pipe.execute()
+        if last_activity is None:
+            return None
+        return {
+            "user_id": user_id,
+            "first_seen": float(first_seen),
+            "last_activity": float(last_activity),
+            "total_actions": int(total_actions),
+            "actions": [json.loads(action) for action in reversed(actions)],
+        }
+
+    async def expire_sessions(self, cutoff: float) -> int:
+        """Same as InProcessStatsBackend.expire_sessions; action lists expire on their own"""
+        key = f"{self.prefix}:sessions"
+        expired = await self.redis_client.zrangebyscore(key, "-inf", f"({cutoff}")
+        if not expired:
+            return 0
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zrem(key, *expired)
+        pipe.hdel(f"{key}:first_seen", *expired)
+        pipe.hdel(f"{key}:total_actions", *expired)
+        await pipe.execute()
+        return len(expired)
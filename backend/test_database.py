@@ -5,18 +5,12 @@ Test script to check database connectivity and data
 
 import os
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from models import Tournament, User, Base
-from database import DATABASE_URL
-
-# Create database engine
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from database import SessionLocal
 
 def test_database():
     """Test database connectivity and data"""
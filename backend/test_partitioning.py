@@ -0,0 +1,57 @@
+"""
+Archival tests for the partitioned tables
+Run against the throwaway SQLite database from conftest.py, where archival copies rows
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import func, select
+
+import database
+import partitioning
+from models import Payment, User
+
+
+@pytest.fixture(scope="module")
+def user_id():
+    database.create_tables()
+    db = database.SessionLocal()
+    try:
+        # Inactive, so it stays off the leaderboards other tests count
+        user = User(username="archiver", email="archiver@example.com", password_hash="x", is_active=False)
+        db.add(user)
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+def _add_old_payment(user_id: int, now: datetime) -> int:
+    db = database.SessionLocal()
+    try:
+        payment = Payment(
+            user_id=user_id, amount=10.0, type="entry_fee",
+            created_at=now - timedelta(days=partitioning.HOT_RETENTION_DAYS["payments"] + 30)
+        )
+        db.add(payment)
+        db.commit()
+        return payment.id
+    finally:
+        db.close()
+
+
+def test_archived_ids_are_not_reused(user_id):
+    now = datetime.utcnow()
+    first = _add_old_payment(user_id, now)
+    assert partitioning.run_archival(now)["payments"] == 1
+
+    # The hot table is empty again; the next row must not get the archived row's id
+    second = _add_old_payment(user_id, now)
+    assert second != first
+    assert partitioning.run_archival(now)["payments"] == 1
+
+    archive = partitioning.ARCHIVE_TABLES["payments"]
+    with database.engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(Payment.__table__)).scalar() == 0
+        assert sorted(conn.execute(select(archive.c.id)).scalars()) == sorted([first, second])
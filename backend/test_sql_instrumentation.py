@@ -0,0 +1,124 @@
+"""
+Query-count tests for the API
+Drives routers through TestClient under assert_max_queries, so a change that
+adds statements to an endpoint (or a new N+1 loop) fails here first
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from sqlalchemy import func, select
+
+import auth
+import database
+from models import MatchResult, Registration, Tournament, User
+from routers import players, tournaments
+from sql_instrumentation import (
+    N_PLUS_ONE_THRESHOLD, SQLInstrumentationMiddleware, assert_max_queries, statement_shape
+)
+
+# Enough players for the per-player queries to cross the N+1 threshold
+PLAYERS = N_PLUS_ONE_THRESHOLD + 1
+
+
+@pytest.fixture(scope="module")
+def client():
+    database.create_tables()
+    db = database.SessionLocal()
+    try:
+        users = [
+            User(username=f"player{i}", email=f"player{i}@example.com", password_hash="x", xp=100 * i)
+            for i in range(PLAYERS)
+        ]
+        db.add_all(users)
+        db.flush()
+        tournament = Tournament(
+            name="Weekly Cup", game="valorant",
+            date=datetime.utcnow() + timedelta(days=1),
+            registration_end=datetime.utcnow() + timedelta(hours=12),
+            created_by=users[0].id
+        )
+        db.add(tournament)
+        db.flush()
+        for rank, user in enumerate(users, 1):
+            db.add(Registration(user_id=user.id, tournament_id=tournament.id))
+            db.add(MatchResult(user_id=user.id, tournament_id=tournament.id, rank=rank))
+        db.commit()
+    finally:
+        db.close()
+
+    app = FastAPI()
+    app.add_middleware(SQLInstrumentationMiddleware)
+    app.include_router(tournaments.router, prefix="/api/tournaments")
+    app.include_router(players.router, prefix="/api/players")
+    yield TestClient(app)
+    database.engine.dispose()
+    # aiosqlite connections run in their own threads, which keep the interpreter alive until closed
+    asyncio.run(database.async_engine.dispose())
+
+
+@pytest.fixture(scope="module")
+def auth_headers(client):
+    db = database.SessionLocal()
+    try:
+        user = db.query(User).filter(User.email == "player0@example.com").one()
+        token = auth.create_access_token({"sub": user.email, "user_id": user.id})
+    finally:
+        db.close()
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_statement_shape_collapses_in_lists():
+    assert statement_shape("SELECT * FROM users WHERE id IN (?, ?, ?)") == \
+        statement_shape("SELECT  *  FROM users\nWHERE id IN (?)")
+
+
+def test_global_leaderboard_query_count(client, auth_headers):
+    # Current user, top players, the full ranking and the total, plus two stats queries per player
+    with assert_max_queries(4 + 2 * PLAYERS):
+        response = client.get("/api/players/leaderboard/global", headers=auth_headers)
+    assert response.status_code == 200
+    assert len(response.json()["entries"]) == PLAYERS
+
+
+def test_global_leaderboard_per_player_queries_are_flagged(client, auth_headers):
+    with pytest.raises(AssertionError, match="N\\+1 query pattern"):
+        with assert_max_queries(4 + 2 * PLAYERS, allow_n_plus_one=False) as stats:
+            client.get("/api/players/leaderboard/global", headers=auth_headers)
+    assert [count for _, count in stats.n_plus_one()] == [PLAYERS, PLAYERS]
+
+
+def test_public_tournament_list_query_count(client):
+    # Anonymous visitors skip the registration lookup: tournaments plus one count each
+    with assert_max_queries(2, allow_n_plus_one=False):
+        response = client.get("/api/tournaments/")
+    assert response.status_code == 200
+    assert response.json()[0]["is_registered"] is False
+
+
+def test_query_limit_exceeded(client, auth_headers):
+    with pytest.raises(AssertionError, match="Expected at most 3 queries"):
+        with assert_max_queries(3):
+            client.get("/api/players/leaderboard/global", headers=auth_headers)
+
+
+def test_sql_while_streaming_is_counted():
+    app = FastAPI()
+    app.add_middleware(SQLInstrumentationMiddleware)
+
+    @app.get("/stream")
+    async def stream():
+        async def rows():
+            async with database.AsyncSessionLocal() as db:
+                for _ in range(3):
+                    yield f"{await db.scalar(select(func.count(User.id)))}\n"
+        return StreamingResponse(rows())
+
+    before = REGISTRY.get_sample_value("db_queries_per_request_sum", {"route": "/stream"}) or 0
+    assert TestClient(app).get("/stream").status_code == 200
+    assert REGISTRY.get_sample_value("db_queries_per_request_sum", {"route": "/stream"}) - before == 3
@@ -0,0 +1,144 @@
+"""
+HyperLogLog unique-user counting in minute and hour buckets.
+
+Each bucket is a HyperLogLog sketch: Redis PFADD/PFCOUNT keys when Redis is
+available (shared by every worker, since PFCOUNT over several keys merges
+them), otherwise NumPy register arrays in this process. Counting the users
+seen in a window merges a fixed number of buckets, whatever the user count.
+"""
+
+import hashlib
+import math
+from typing import Iterable, List, Tuple
+
+import numpy as np
+
+PRECISION = 12  # 4096 registers, ~1.6% standard error
+_REGISTERS = 1 << PRECISION
+_ALPHA = 0.7213 / (1 + 1.079 / _REGISTERS)
+_MINUTE_SLOTS = 120
+
+
+def hash_ids(ids: Iterable[str]) -> np.ndarray:
+    """64-bit hashes of identifiers"""
+    return np.array(
+        [int.from_bytes(hashlib.blake2b(str(value).encode(), digest_size=8).digest(), "big") for value in ids],
+        dtype=np.uint64
+    )
+
+
+def add_hashes(registers: np.ndarray, hashes: np.ndarray):
+    """Fold hashes into HyperLogLog registers in place"""
+    if not len(hashes):
+        return
+    index = (hashes >> np.uint64(64 - PRECISION)).astype(np.int64)
+    rest = hashes & np.uint64((1 << (64 - PRECISION)) - 1)
+    # frexp gives the bit length exactly here: rest < 2**52 fits a float64 mantissa
+    _, bit_length = np.frexp(rest.astype(np.float64))
+    rank = (64 - PRECISION + 1 - bit_length).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+
+
+def estimate(registers: np.ndarray) -> int:
+    """Cardinality estimate with the small-range (linear counting) correction"""
+    raw = _ALPHA * _REGISTERS * _REGISTERS / float(np.sum(np.ldexp(1.0, -registers.astype(np.int64))))
+    zeros = int(np.count_nonzero(registers == 0))
+    if raw <= 2.5 * _REGISTERS and zeros:
+        return round(_REGISTERS * math.log(_REGISTERS / zeros))
+    return round(raw)
+
+
+class _Tier:
+    def __init__(self, slots: int, width: int):
+        self.width = width
+        self.stamps = np.full(slots, -1, dtype=np.int64)
+        self.registers = np.zeros((slots, _REGISTERS), dtype=np.uint8)
+
+    def add(self, periods: np.ndarray, hashes: np.ndarray):
+        for period in np.unique(periods):
+            slot = period % len(self.stamps)
+            if self.stamps[slot] < period:
+                self.stamps[slot] = period
+                self.registers[slot] = 0
+            if self.stamps[slot] == period:
+                add_hashes(self.registers[slot], hashes[periods == period])
+
+
+class UniqueUserCounter:
+    """Unique ids per minute (last 2 hours) and per hour (last `retention_hours`)"""
+
+    def __init__(self, key_prefix: str, retention_hours: int = 168):
+        self.key_prefix = key_prefix
+        self.retention_hours = retention_hours
+        self.redis_client = None
+        self.minutes = _Tier(_MINUTE_SLOTS, 60)
+        self.hours = _Tier(retention_hours + 1, 3600)
+
+    def bind(self, redis_client):
+        """Count in Redis from now on; None switches back to the in-process sketches"""
+        self.redis_client = redis_client
+
+    def add(self, seen: List[Tuple[float, str]]):
+        """Record (epoch, user id) sightings in the in-process sketches"""
+        if not seen:
+            return
+        epochs = np.array([epoch for epoch, _ in seen], dtype=np.float64)
+        hashes = hash_ids(user_id for _, user_id in seen)
+        for tier in (self.minutes, self.hours):
+            tier.add((epochs // tier.width).astype(np.int64), hashes)
+
+    def add_to_pipeline(self, pipe, seen: List[Tuple[float, str]]):
+        """Queue PFADDs (and expiries) for the sightings on a caller-owned Redis pipeline"""
+        keys = {}
+        for epoch, user_id in seen:
+            for key, ttl in (
+                (f"{self.key_prefix}:m:{int(epoch // 60)}", _MINUTE_SLOTS * 60),
+                (f"{self.key_prefix}:h:{int(epoch // 3600)}", (self.retention_hours + 1) * 3600),
+            ):
+                keys.setdefault((key, ttl), set()).add(user_id)
+        for (key, ttl), user_ids in keys.items():
+            pipe.pfadd(key, *user_ids)
+            pipe.expire(key, ttl)
+
+    async def record(self, seen: List[Tuple[float, str]]):
+        """Record sightings locally and, when bound, in Redis"""
+        self.add(seen)
+        if self.redis_client is not None and seen:
+            pipe = self.redis_client.pipeline(transaction=False)
+            self.add_to_pipeline(pipe, seen)
+            await pipe.execute()
+
+    def _window(self, seconds: float, now: float):
+        """(minute periods, hour periods) covering the last `seconds`
+
+        Like the rolling metric buckets, windows reaching past the minute tier
+        are covered by whole hours.
+        """
+        seconds = min(seconds, self.retention_hours * 3600)
+        last_minute = int(now // 60)
+        first_minute = last_minute - max(int(seconds // 60), 1) + 1
+        if first_minute > last_minute - _MINUTE_SLOTS:
+            return list(range(first_minute, last_minute + 1)), []
+        return [], list(range(first_minute // 60, last_minute // 60 + 1))
+
+    async def count(self, seconds: float, now: float) -> int:
+        """Estimated unique ids seen in the last `seconds`"""
+        return await self._count(*self._window(seconds, now))
+
+    async def count_hours(self, first_hour: int, end_hour: int) -> int:
+        """Estimated unique ids seen in hour periods [first_hour, end_hour)"""
+        return await self._count([], list(range(first_hour, end_hour)))
+
+    async def _count(self, minutes: List[int], hours: List[int]) -> int:
+        if self.redis_client is not None:
+            keys = [f"{self.key_prefix}:m:{minute}" for minute in minutes] + \
+                   [f"{self.key_prefix}:h:{hour}" for hour in hours]
+            return await self.redis_client.pfcount(*keys)
+
+        registers = np.zeros(_REGISTERS, dtype=np.uint8)
+        for tier, periods in ((self.minutes, minutes), (self.hours, hours)):
+            if periods:
+                selected = np.isin(tier.stamps, periods)
+                if selected.any():
+                    registers = np.maximum(registers, tier.registers[selected].max(axis=0))
+        return estimate(registers)
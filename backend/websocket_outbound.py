@@ -0,0 +1,189 @@
+"""
+Per-connection outbound queues for WebSockets.
+
+Broadcasters never await a client: they append the encoded message to the
+connection's bounded queue and a writer task per connection drains it, so
+one slow client only ever delays itself.
+
+Some message types only matter in their latest version (online counts,
+status snapshots, typing indicators). A queued message of such a type is
+replaced in place by a newer one about the same user or tournament, and when
+the queue is full these are dropped first. A consumer whose queue is full of messages that cannot be
+dropped, or whose send does not finish within WS_SEND_TIMEOUT_SECONDS, is
+evicted: the connection is closed with 1013 (try again later) and the client
+reconnects. Send deadlines are checked by one sweeper task per worker rather
+than a timer per send, which would cost about as much as the send itself;
+the sweeper also refreshes the queue depth gauges.
+"""
+
+import asyncio
+import logging
+import os
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket
+from prometheus_client import Counter as PrometheusCounter, Gauge
+
+WS_SEND_TIMEOUT_SECONDS = float(os.getenv("WS_SEND_TIMEOUT_SECONDS", "5"))
+WS_OUTBOUND_QUEUE_SIZE = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "256"))
+
+# Only the newest queued message of these types is delivered, per user or tournament when they name one
+COALESCIBLE_TYPES = frozenset({"user_count_update", "tournament_status", "system_stats", "typing"})
+
+QUEUED_MESSAGES = Gauge(
+    'websocket_outbound_queued_messages', 'Messages waiting in WebSocket outbound queues', multiprocess_mode='livesum'
+)
+MAX_QUEUE_DEPTH = Gauge(
+    'websocket_outbound_queue_depth_max', 'Deepest WebSocket outbound queue', multiprocess_mode='livemax'
+)
+MESSAGES_DROPPED = PrometheusCounter(
+    'websocket_messages_dropped_total', 'Outbound messages coalesced or dropped instead of sent', ['type', 'reason']
+)
+EVICTIONS = PrometheusCounter('websocket_evictions_total', 'Slow WebSocket consumers disconnected', ['reason'])
+
+logger = logging.getLogger(__name__)
+
+# Open queues, watched by the sweeper; close handshakes still in flight, referenced until they finish
+_open_queues: Set["OutboundQueue"] = set()
+_closing: Set[asyncio.Task] = set()
+_sweeper: Optional[asyncio.Task] = None
+
+
+def coalesce_key(message: Dict[str, Any]) -> Optional[str]:
+    """What a newer message replaces a queued one by (type, plus the user or tournament), None if never"""
+    message_type = message.get("type")
+    if message_type not in COALESCIBLE_TYPES:
+        return None
+    for field in ("user_id", "tournament_id"):
+        if message.get(field) is not None:
+            return f"{message_type}:{message[field]}"
+    return message_type
+
+
+async def _sweep_stalled_sends():
+    """Evict consumers whose current send has been pending longer than WS_SEND_TIMEOUT_SECONDS"""
+    loop = asyncio.get_running_loop()
+    while _open_queues:
+        await asyncio.sleep(WS_SEND_TIMEOUT_SECONDS / 4)
+        deadline = loop.time() - WS_SEND_TIMEOUT_SECONDS
+        stalled = [queue for queue in _open_queues if queue.sending_since is not None and queue.sending_since < deadline]
+        for queue in stalled:
+            queue.evict('send_timeout')
+        update_queue_metrics(_open_queues)
+    update_queue_metrics(())
+
+
+class OutboundQueue:
+    """Bounded send queue of one WebSocket, drained by its own writer task"""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        on_close: Callable[[WebSocket], None],
+        size: int = WS_OUTBOUND_QUEUE_SIZE
+    ):
+        self.websocket = websocket
+        self.size = size
+        self.closed = False
+        # Loop time the in-flight send started at, None while idle
+        self.sending_since: Optional[float] = None
+        self._on_close = on_close
+        # [type, coalesce key, text] entries; coalescible ones are also indexed by key to be updated in place
+        self._messages = deque()
+        self._latest: Dict[str, List[str]] = {}
+        self._ready = asyncio.Event()
+        self._writer = asyncio.create_task(self._write())
+        _open_queues.add(self)
+        global _sweeper
+        if _sweeper is None or _sweeper.done():
+            _sweeper = asyncio.create_task(_sweep_stalled_sends())
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def put(self, message_type: Optional[str], text: str, key: Optional[str] = None):
+        """Queue an encoded message; never waits. `key` (see coalesce_key) makes it replaceable"""
+        if self.closed:
+            return
+        if key is not None and key in self._latest:
+            self._latest[key][2] = text
+            MESSAGES_DROPPED.labels(type=message_type, reason='coalesced').inc()
+            return
+        if len(self._messages) >= self.size:
+            victim = next((entry for entry in self._messages if entry[1] is not None), None)
+            if victim is not None:
+                self._messages.remove(victim)
+                del self._latest[victim[1]]
+                MESSAGES_DROPPED.labels(type=victim[0], reason='queue_full').inc()
+            elif key is not None:
+                MESSAGES_DROPPED.labels(type=message_type, reason='queue_full').inc()
+                return
+            else:
+                self.evict('queue_full')
+                return
+        entry = [message_type, key, text]
+        self._messages.append(entry)
+        if key is not None:
+            self._latest[key] = entry
+        self._ready.set()
+
+    async def _write(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                if not self._messages:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+                entry = self._messages.popleft()
+                if entry[1] is not None and self._latest.get(entry[1]) is entry:
+                    del self._latest[entry[1]]
+                self.sending_since = loop.time()
+                await self.websocket.send_text(entry[2])
+                self.sending_since = None
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # The client is gone; the receive loop or the next fan-out notices too
+            logger.debug(f"WebSocket send failed: {e!r}")
+            self.close()
+
+    def evict(self, reason: str):
+        """Disconnect a consumer that cannot keep up"""
+        if self.closed:
+            return
+        EVICTIONS.labels(reason=reason).inc()
+        logger.warning(f"Evicting slow WebSocket consumer ({reason}, {len(self._messages)} messages queued)")
+        self.close(code=1013, reason="Too slow")
+
+    def close(self, code: Optional[int] = None, reason: str = ""):
+        """Stop the writer and drop queued messages; with a code, also close the socket"""
+        if self.closed:
+            return
+        self.closed = True
+        _open_queues.discard(self)
+        self._messages.clear()
+        self._latest.clear()
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+        if code is not None:
+            task = asyncio.create_task(self._close_socket(code, reason))
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        self._on_close(self.websocket)
+
+    async def _close_socket(self, code: int, reason: str):
+        try:
+            await asyncio.wait_for(self.websocket.close(code=code, reason=reason), WS_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            pass
+
+
+def update_queue_metrics(queues) -> Dict[str, int]:
+    """Export total and deepest queue depth over a worker's connections"""
+    depths = [len(queue) for queue in queues]
+    total, deepest = sum(depths), max(depths, default=0)
+    QUEUED_MESSAGES.set(total)
+    MAX_QUEUE_DEPTH.set(deepest)
+    return {'queued_messages': total, 'max_queue_depth': deepest}
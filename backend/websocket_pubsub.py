@@ -0,0 +1,211 @@
+"""
+Cross-worker pub/sub backbone for WebSocket messages.
+
+Each uvicorn worker keeps its own ConnectionManager, so a room message sent
+on one worker has to be relayed to the members connected to the others.
+Messages to a room, a user or everyone are delivered locally right away and
+published once on a channel (ws:room:<room>, ws:user:<id>, ws:all); every
+other worker subscribed to that channel delivers it to its own members.
+
+A worker only subscribes to the room and user channels it has local members
+for. Membership changes are synchronous, subscriptions are network calls:
+the backbone keeps the wanted set and a task applies the difference, so a
+burst of joins becomes one SUBSCRIBE. A message published before a new
+member's subscription is in place is not replayed to it.
+
+Envelopes carry the publishing worker's id, so a worker skips its own
+messages, which it has already delivered locally, and the message's type and
+coalesce key for the receiving workers' outbound queues. RedisBroker is used in
+production; LocalBroker is an in-process stand-in for tests and for running
+without Redis, and several LocalBrokers on one hub behave like workers
+sharing a Redis.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Callable, Dict, Optional, Set
+
+from prometheus_client import Counter as PrometheusCounter
+
+BROADCAST_CHANNEL = "ws:all"
+
+PUBSUB_MESSAGES = PrometheusCounter(
+    'websocket_pubsub_messages_total', 'WebSocket messages relayed between workers', ['direction']
+)
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[str, str], None]
+
+
+def room_channel(room: str) -> str:
+    return f"ws:room:{room}"
+
+
+def user_channel(user_id) -> str:
+    return f"ws:user:{user_id}"
+
+
+class LocalBroker:
+    """In-process pub/sub with the RedisBroker interface"""
+
+    def __init__(self, hub: Optional[Dict[str, Set["LocalBroker"]]] = None):
+        # channel -> subscribed brokers; share one hub between brokers to simulate several workers
+        self.hub = hub if hub is not None else {}
+        self._handler: Optional[Handler] = None
+
+    def start(self, handler: Handler):
+        self._handler = handler
+
+    async def publish(self, channel: str, data: str):
+        loop = asyncio.get_running_loop()
+        for broker in self.hub.get(channel, ()):
+            # Delivered on a later loop iteration, as a network round trip would be
+            loop.call_soon(broker._handler, channel, data)
+
+    async def subscribe(self, *channels: str):
+        for channel in channels:
+            self.hub.setdefault(channel, set()).add(self)
+
+    async def unsubscribe(self, *channels: str):
+        for channel in channels:
+            subscribers = self.hub.get(channel)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del self.hub[channel]
+
+    async def close(self):
+        await self.unsubscribe(*[channel for channel, subscribers in self.hub.items() if self in subscribers])
+
+
+class RedisBroker:
+    """Redis pub/sub over the async client; the PubSub connection re-subscribes by itself after a reconnect"""
+
+    def __init__(self, redis_client):
+        self.redis = redis_client
+        self._pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        self._handler: Optional[Handler] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    def start(self, handler: Handler):
+        """Start reading; call after the first subscribe, a PubSub without channels has no connection"""
+        self._handler = handler
+        self._reader = asyncio.create_task(self._read())
+
+    async def publish(self, channel: str, data: str):
+        await self.redis.publish(channel, data)
+
+    async def subscribe(self, *channels: str):
+        await self._pubsub.subscribe(*channels)
+
+    async def unsubscribe(self, *channels: str):
+        await self._pubsub.unsubscribe(*channels)
+
+    async def _read(self):
+        while True:
+            try:
+                message = await self._pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"WebSocket pub/sub read failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            if message is not None and message["type"] == "message":
+                self._handler(message["channel"], message["data"])
+
+    async def close(self):
+        if self._reader is not None:
+            self._reader.cancel()
+        await self._pubsub.close()
+
+
+class PubSubBackbone:
+    """Relays encoded WebSocket messages between workers through a broker"""
+
+    def __init__(self):
+        self.worker_id = uuid.uuid4().hex
+        self.broker = None
+        self._on_message: Optional[Callable[[str, Optional[str], Optional[str], str], None]] = None
+        self._wanted: Set[str] = {BROADCAST_CHANNEL}
+        self._subscribed: Set[str] = set()
+        self._changed = asyncio.Event()
+        self._syncer: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.broker is not None
+
+    async def start(self, broker, on_message: Callable[[str, Optional[str], Optional[str], str], None]):
+        """Subscribe to the wanted channels and relay other workers' messages to on_message(channel, type, key, text)"""
+        self.broker = broker
+        self._on_message = on_message
+        await self._sync()
+        broker.start(self._receive)
+        self._syncer = asyncio.create_task(self._sync_loop())
+        logger.info(f"WebSocket pub/sub started on {type(broker).__name__} as worker {self.worker_id}")
+
+    async def close(self):
+        if self._syncer is not None:
+            self._syncer.cancel()
+        if self.broker is not None:
+            await self.broker.close()
+        self.broker = None
+        self._subscribed.clear()
+
+    def want(self, channel: str):
+        """Subscribe to a channel once a local member needs it"""
+        if channel not in self._wanted:
+            self._wanted.add(channel)
+            self._changed.set()
+
+    def unwant(self, channel: str):
+        """Unsubscribe once the last local member is gone"""
+        if channel in self._wanted:
+            self._wanted.discard(channel)
+            self._changed.set()
+
+    async def _sync(self):
+        subscribe = self._wanted - self._subscribed
+        unsubscribe = self._subscribed - self._wanted
+        if subscribe:
+            await self.broker.subscribe(*subscribe)
+            self._subscribed |= subscribe
+        if unsubscribe:
+            await self.broker.unsubscribe(*unsubscribe)
+            self._subscribed -= unsubscribe
+
+    async def _sync_loop(self):
+        while True:
+            await self._changed.wait()
+            self._changed.clear()
+            try:
+                await self._sync()
+            except Exception as e:
+                logger.error(f"Error updating WebSocket pub/sub subscriptions: {e}")
+                self._changed.set()
+                await asyncio.sleep(1)
+
+    async def publish(self, channel: str, message_type: Optional[str], key: Optional[str], text: str):
+        """Send an encoded message to the other workers; local delivery is the caller's job"""
+        if self.broker is None:
+            return
+        envelope = json.dumps({"origin": self.worker_id, "type": message_type, "key": key, "text": text})
+        try:
+            await self.broker.publish(channel, envelope)
+            PUBSUB_MESSAGES.labels(direction='published').inc()
+        except Exception as e:
+            logger.error(f"Error publishing WebSocket message to {channel}: {e}")
+
+    def _receive(self, channel: str, data: str):
+        try:
+            envelope = json.loads(data)
+            if envelope["origin"] == self.worker_id:
+                return
+            PUBSUB_MESSAGES.labels(direction='received').inc()
+            self._on_message(channel, envelope["type"], envelope.get("key"), envelope["text"])
+        except Exception as e:
+            logger.error(f"Error relaying WebSocket message from {channel}: {e}")
@@ -12,8 +12,11 @@ from datetime import datetime
 from typing import Dict, List, Set
 from sqlalchemy.orm import Session
 from database import get_db
-from models import User, Tournament, Match
+from models import User, Tournament
 from auth import decode_token
+from resource_sampler import resource_sampler
+from websocket_outbound import OutboundQueue, coalesce_key, update_queue_metrics
+from websocket_pubsub import BROADCAST_CHANNEL, PubSubBackbone, RedisBroker, room_channel, user_channel
 import redis
 
 logger = logging.getLogger(__name__)
@@ -33,15 +36,39 @@ class ConnectionManager:
         # Connection metadata
         self.connection_metadata: Dict[WebSocket, Dict] = {}
         
+        # Per-connection send queues, each drained by its own writer task
+        self.outbound: Dict[WebSocket, OutboundQueue] = {}
+        
+        # Relays room, user and broadcast messages to the other workers
+        self.backbone = PubSubBackbone()
+        
     async def connect(self, websocket: WebSocket, user_id: int = None, room: str = None):
         """Accept WebSocket connection and store metadata"""
         await websocket.accept()
+        self._register(websocket, user_id, room)
+        
+        logger.info(f"WebSocket connected - User: {user_id}, Room: {room}, Total: {len(self.active_connections)}")
+        
+        # Send welcome message
+        await self.send_personal_message(websocket, {
+            "type": "welcome",
+            "message": "Connected to ClutchZone real-time service",
+            "user_id": user_id,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+        
+        # Update online count
+        await self.broadcast_user_count()
+    
+    def _register(self, websocket: WebSocket, user_id: int = None, room: str = None):
         self.active_connections.append(websocket)
+        self.outbound[websocket] = OutboundQueue(websocket, self.disconnect)
         
         # Store connection metadata
         metadata = {
             "user_id": user_id,
             "room": room,
+            "rooms": set(),
             "connected_at": datetime.utcnow(),
             "last_ping": datetime.utcnow()
         }
@@ -50,45 +77,54 @@ class ConnectionManager:
         # Store user-specific connection
         if user_id:
             self.user_connections[user_id] = websocket
+            self.backbone.want(user_channel(user_id))
         
         # Store room-specific connection
         if room:
-            if room not in self.room_connections:
-                self.room_connections[room] = set()
-            self.room_connections[room].add(websocket)
-        
-        logger.info(f"WebSocket connected - User: {user_id}, Room: {room}, Total: {len(self.active_connections)}")
-        
-        # Send welcome message
-        await self.send_personal_message(websocket, {
-            "type": "welcome",
-            "message": "Connected to ClutchZone real-time service",
-            "user_id": user_id,
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        
-        # Update online count
-        await self.broadcast_user_count()
+            self.join_room(websocket, room)
+    
+    def join_room(self, websocket: WebSocket, room: str):
+        """Add a connection to a room; the first local member subscribes this worker to the room"""
+        if room not in self.room_connections:
+            self.room_connections[room] = set()
+            self.backbone.want(room_channel(room))
+        self.room_connections[room].add(websocket)
+        if websocket in self.connection_metadata:
+            self.connection_metadata[websocket]["rooms"].add(room)
+    
+    def leave_room(self, websocket: WebSocket, room: str):
+        """Remove a connection from a room; the last local member unsubscribes this worker"""
+        if room in self.room_connections:
+            self.room_connections[room].discard(websocket)
+            if not self.room_connections[room]:
+                del self.room_connections[room]
+                self.backbone.unwant(room_channel(room))
+        if websocket in self.connection_metadata:
+            self.connection_metadata[websocket]["rooms"].discard(room)
     
     def disconnect(self, websocket: WebSocket):
         """Remove WebSocket connection and clean up"""
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
         
+        # Stop the writer task; no-op when the queue is what closed the connection
+        queue = self.outbound.pop(websocket, None)
+        if queue is not None:
+            queue.close()
+        
         # Get metadata before cleanup
         metadata = self.connection_metadata.get(websocket, {})
         user_id = metadata.get("user_id")
         room = metadata.get("room")
         
         # Remove from user connections
-        if user_id and user_id in self.user_connections:
+        if user_id and self.user_connections.get(user_id) is websocket:
             del self.user_connections[user_id]
+            self.backbone.unwant(user_channel(user_id))
         
-        # Remove from room connections
-        if room and room in self.room_connections:
-            self.room_connections[room].discard(websocket)
-            if not self.room_connections[room]:
-                del self.room_connections[room]
+        # Remove from room connections, including rooms joined later
+        for joined in list(metadata.get("rooms", ())):
+            self.leave_room(websocket, joined)
         
         # Remove metadata
         if websocket in self.connection_metadata:
@@ -98,47 +134,51 @@ class ConnectionManager:
     
     async def send_personal_message(self, websocket: WebSocket, message: Dict):
         """Send message to specific WebSocket connection"""
-        try:
-            await websocket.send_text(json.dumps(message))
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
-            self.disconnect(websocket)
+        queue = self.outbound.get(websocket)
+        if queue is not None:
+            queue.put(message.get("type"), json.dumps(message), coalesce_key(message))
     
     async def send_to_user(self, user_id: int, message: Dict):
-        """Send message to specific user"""
-        if user_id in self.user_connections:
-            await self.send_personal_message(self.user_connections[user_id], message)
+        """Send message to a user, on whichever worker they are connected"""
+        text, key = json.dumps(message), coalesce_key(message)
+        self._deliver_to_user(user_id, message.get("type"), key, text)
+        await self.backbone.publish(user_channel(user_id), message.get("type"), key, text)
     
-    async def send_to_room(self, room: str, message: Dict, exclude: WebSocket = None):
-        """Send message to all connections in a room"""
-        if room in self.room_connections:
-            dead_connections = []
-            for websocket in self.room_connections[room]:
-                if websocket != exclude:
-                    try:
-                        await websocket.send_text(json.dumps(message))
-                    except Exception as e:
-                        logger.error(f"Error sending to room {room}: {e}")
-                        dead_connections.append(websocket)
-            
-            # Clean up dead connections
-            for dead_ws in dead_connections:
-                self.disconnect(dead_ws)
-    
-    async def broadcast(self, message: Dict, exclude: WebSocket = None):
-        """Broadcast message to all active connections"""
-        dead_connections = []
-        for websocket in self.active_connections:
-            if websocket != exclude:
-                try:
-                    await websocket.send_text(json.dumps(message))
-                except Exception as e:
-                    logger.error(f"Error broadcasting: {e}")
-                    dead_connections.append(websocket)
-        
-        # Clean up dead connections
-        for dead_ws in dead_connections:
-            self.disconnect(dead_ws)
+    def _deliver_to_user(self, user_id, message_type: str, key: str, text: str):
+        queue = self.outbound.get(self.user_connections.get(user_id))
+        if queue is not None:
+            queue.put(message_type, text, key)
+    
+    def _fan_out(self, websockets, message_type: str, key: str, text: str, exclude: WebSocket = None):
+        """Queue an encoded message for every connection; slow consumers only delay themselves"""
+        for websocket in list(websockets):
+            queue = self.outbound.get(websocket)
+            if queue is not None and websocket != exclude:
+                queue.put(message_type, text, key)
+    
+    async def send_to_room(self, room: str, message: Dict, exclude: WebSocket = None, local: bool = False):
+        """Send message to all connections in a room, on every worker unless `local`"""
+        text, key = json.dumps(message), coalesce_key(message)
+        self._fan_out(self.room_connections.get(room, ()), message.get("type"), key, text, exclude)
+        if not local:
+            await self.backbone.publish(room_channel(room), message.get("type"), key, text)
+    
+    async def broadcast(self, message: Dict, exclude: WebSocket = None, local: bool = False):
+        """Broadcast message to all active connections, on every worker unless `local`"""
+        text, key = json.dumps(message), coalesce_key(message)
+        self._fan_out(self.active_connections, message.get("type"), key, text, exclude)
+        if not local:
+            await self.backbone.publish(BROADCAST_CHANNEL, message.get("type"), key, text)
+    
+    def _relay(self, channel: str, message_type: str, key: str, text: str):
+        """Deliver a message published by another worker to the local members of its channel"""
+        kind, _, name = channel.partition(":")[2].partition(":")
+        if kind == "room":
+            self._fan_out(self.room_connections.get(name, ()), message_type, key, text)
+        elif kind == "user":
+            self._deliver_to_user(name, message_type, key, text)
+        elif channel == BROADCAST_CHANNEL:
+            self._fan_out(self.active_connections, message_type, key, text)
     
     async def broadcast_user_count(self):
         """Broadcast current online user count"""
@@ -147,7 +187,8 @@ class ConnectionManager:
             "count": len(self.active_connections),
             "timestamp": datetime.utcnow().isoformat()
         }
-        await self.broadcast(message)
+        # Each worker only knows its own connections
+        await self.broadcast(message, local=True)
     
     def get_room_user_count(self, room: str) -> int:
         """Get number of users in a specific room"""
@@ -156,6 +197,14 @@ class ConnectionManager:
     def get_online_users(self) -> List[int]:
         """Get list of online user IDs"""
         return list(self.user_connections.keys())
+    
+    def queue_stats(self) -> Dict[str, int]:
+        """Outbound queue depth over this worker's connections (also exported to Prometheus)
+
+        The outbound sweeper refreshes the gauges too; fan-outs do not, a pass
+        over every queue per message would cost more than the fan-out.
+        """
+        return update_queue_metrics(self.outbound.values())
 
 # Global connection manager
 manager = ConnectionManager()
@@ -276,10 +325,7 @@ async def handle_websocket_message(websocket: WebSocket, message: Dict, user_id:
         # Handle room joining
         room = message.get("room")
         if room:
-            # Add to room
-            if room not in manager.room_connections:
-                manager.room_connections[room] = set()
-            manager.room_connections[room].add(websocket)
+            manager.join_room(websocket, room)
             
             await manager.send_personal_message(websocket, {
                 "type": "room_joined",
@@ -291,9 +337,7 @@ async def handle_websocket_message(websocket: WebSocket, message: Dict, user_id:
         # Handle room leaving
         room = message.get("room")
         if room and room in manager.room_connections:
-            manager.room_connections[room].discard(websocket)
-            if not manager.room_connections[room]:
-                del manager.room_connections[room]
+            manager.leave_room(websocket, room)
             
             await manager.send_personal_message(websocket, {
                 "type": "room_left",
@@ -368,7 +412,8 @@ async def tournament_status_updater():
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            await manager.broadcast(message)
+            # Every worker runs this updater, so it only feeds its own clients
+            await manager.broadcast(message, local=True)
             
         except Exception as e:
             logger.error(f"Error in tournament status updater: {e}")
@@ -379,19 +424,20 @@ async def system_stats_updater():
     """Background task to send system statistics"""
     while True:
         try:
-            import psutil
+            sample = resource_sampler.snapshot()
             
             stats = {
                 "type": "system_stats",
                 "online_users": len(manager.active_connections),
-                "cpu_usage": psutil.cpu_percent(),
-                "memory_usage": psutil.virtual_memory().percent,
+                "cpu_usage": sample['cpu_percent'],
+                "memory_usage": sample['memory_percent'],
                 "active_rooms": len(manager.room_connections),
+                **manager.queue_stats(),
                 "timestamp": datetime.utcnow().isoformat()
             }
             
-            # Send to admin room only
-            await manager.send_to_room("admin", stats)
+            # Send to admin room only; these are this worker's figures
+            await manager.send_to_room("admin", stats, local=True)
             
         except Exception as e:
             logger.error(f"Error in system stats updater: {e}")
@@ -428,6 +474,17 @@ async def send_global_announcement(announcement: Dict):
     }
     await manager.broadcast(message)
 
+async def start_pubsub(redis_client=None):
+    """Relay room, user and broadcast messages between workers through Redis"""
+    if redis_client is None:
+        logger.warning("Redis unavailable: WebSocket messages reach this worker's clients only")
+        return
+    broker = RedisBroker(redis_client)
+    await manager.backbone.start(broker, manager._relay)
+
+async def stop_pubsub():
+    await manager.backbone.close()
+
 # Export the manager for use in other modules
 def get_connection_manager():
     return manager